@@ -39,6 +39,20 @@ def test(session: nox.Session):
     )
 
 
+@nox.session()
+def importtime(session: nox.Session):
+    session.install(".")
+
+    session.run("python", "./scripts/importtime.py", *session.posargs)
+
+
+@nox.session()
+def benchmark(session: nox.Session):
+    session.install(".")
+
+    session.run("python", "./scripts/benchmark.py", *session.posargs)
+
+
 @nox.session()
 def download_pip(session: nox.Session):
     session.install("packaging", "gidgethub", "aiohttp")
@@ -0,0 +1,478 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+End-to-end benchmark of rez-pip against a local index of synthetic wheels.
+
+Each scenario generates wheels (number of packages, number of files and size of each
+wheel), serves them over HTTP and times each step of an ingest separately: resolve,
+download, install, cleanup/patch and the creation of the rez packages (in a
+temporary rez repository). Results are written as JSON so that they can be
+compared between commits.
+
+Usage: python scripts/benchmark.py [--scenario <name>] [--output <file>] [--compare <file>]
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import shutil
+import typing
+import hashlib
+import logging
+import zipfile
+import argparse
+import platform
+import tempfile
+import functools
+import contextlib
+import subprocess
+import dataclasses
+import http.server
+import threading
+
+KiB = 1024
+MiB = 1024 * KiB
+
+#: Stages that are timed, in the order they run.
+STAGES = ("resolve", "download", "install", "cleanup_patch", "create")
+
+
+@dataclasses.dataclass(frozen=True)
+class Scenario:
+    #: Number of packages.
+    packages: int
+
+    #: Number of files in each wheel.
+    files: int
+
+    #: Uncompressed size (in bytes) of each wheel.
+    size: int
+
+
+SCENARIOS = {
+    "tiny-10": Scenario(packages=10, files=10, size=10 * KiB),
+    "tiny-200": Scenario(packages=200, files=10, size=10 * KiB),
+    "tiny-2000": Scenario(packages=2000, files=10, size=10 * KiB),
+    "medium-50": Scenario(packages=50, files=500, size=5 * MiB),
+    "files-50k": Scenario(packages=1, files=50000, size=50 * MiB),
+    "large-500mb": Scenario(packages=1, files=5000, size=500 * MiB),
+}
+
+#: Scenarios that run when none are given. They take about a minute.
+DEFAULT_SCENARIOS = ("tiny-10", "tiny-200", "medium-50")
+
+
+def _recordHash(data: bytes) -> str:
+    digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest())
+    return f"sha256={digest.rstrip(b'=').decode()}"
+
+
+def buildWheel(dest: str, name: str, scenario: Scenario, seed: int) -> str:
+    """
+    Write a pure python wheel with the number of files and size of the scenario.
+    Half of each file is random (incompressible) and the other half is repeated
+    text, which roughly compresses like real code.
+
+    :returns: Path to the wheel.
+    """
+    version = "1.0.0"
+    distInfo = f"{name}-{version}.dist-info"
+    path = os.path.join(dest, f"{name}-{version}-py3-none-any.whl")
+
+    rng = random.Random(seed)
+    fileSize = max(scenario.size // scenario.files, 2)
+    records: list[str] = []
+
+    def write(archive: zipfile.ZipFile, arcname: str, data: bytes) -> None:
+        archive.writestr(arcname, data)
+        records.append(f"{arcname},{_recordHash(data)},{len(data)}")
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        write(archive, f"{name}/__init__.py", b"")
+        for index in range(scenario.files - 1):
+            randomPart = rng.getrandbits(fileSize // 2 * 8).to_bytes(
+                fileSize // 2, "little"
+            )
+            textPart = b"# rez-pip benchmark\n" * (fileSize // 40)
+            # At most 1000 files per directory, like big real world packages.
+            write(
+                archive,
+                f"{name}/sub{index // 1000}/module_{index}.py",
+                randomPart + textPart,
+            )
+
+        write(
+            archive,
+            f"{distInfo}/METADATA",
+            f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n".encode(),
+        )
+        write(
+            archive,
+            f"{distInfo}/WHEEL",
+            b"Wheel-Version: 1.0\nGenerator: rez-pip-benchmark\n"
+            b"Root-Is-Purelib: true\nTag: py3-none-any\n",
+        )
+        records.append(f"{distInfo}/RECORD,,")
+        archive.writestr(f"{distInfo}/RECORD", "\n".join(records) + "\n")
+
+    return path
+
+
+def buildIndex(root: str, scenarioName: str, scenario: Scenario) -> list[str]:
+    """
+    Generate the wheels of a scenario and an HTML page that links to them (with their
+    hash, like PyPI). Wheels are reused if they already exist.
+
+    :returns: Names of the packages.
+    """
+    import rez_pip.download
+
+    names = [
+        f"bench_{scenarioName.replace('-', '_')}_{index}"
+        for index in range(scenario.packages)
+    ]
+
+    os.makedirs(root, exist_ok=True)
+    indexPath = os.path.join(root, "index.html")
+    if os.path.exists(indexPath):
+        return names
+
+    links = []
+    for index, name in enumerate(names):
+        wheel = buildWheel(root, name, scenario, seed=index)
+        digest = rez_pip.download.getSHA256(wheel)
+        filename = os.path.basename(wheel)
+        links.append(f'<a href="{filename}#sha256={digest}">{filename}</a><br/>')
+
+    with open(indexPath, "w") as fd:
+        fd.write("<html><body>\n" + "\n".join(links) + "\n</body></html>\n")
+    return names
+
+
+@contextlib.contextmanager
+def serve(root: str) -> typing.Generator[str, None, None]:
+    """Serve a directory over HTTP and return its URL."""
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, format: str, *args: typing.Any) -> None:
+            pass
+
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(Handler, directory=root)
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def runScenario(names: list[str], url: str, workDir: str) -> dict[str, float]:
+    """
+    Ingest the given packages into a temporary rez repository.
+
+    :returns: Duration (in seconds) of each stage.
+    """
+    import rez.version
+
+    import rez_pip.pip
+    import rez_pip.rez
+    import rez_pip.patch
+    import rez_pip.install
+    import rez_pip.download
+
+    pythonVersion = ".".join(str(part) for part in sys.version_info[:3])
+    wheelsDir = os.path.join(workDir, "wheels")
+    installedDir = os.path.join(workDir, "installed")
+    repo = os.path.join(workDir, "repo")
+
+    timings: dict[str, float] = {}
+
+    start = time.perf_counter()
+    packages = rez_pip.pip.getPackages(
+        names,
+        rez_pip.pip.getBundledPip(),
+        pythonVersion,
+        sys.executable,
+        [],
+        [],
+        ["--no-index", "--find-links", f"{url}/index.html"],
+    )
+    timings["resolve"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    groups = rez_pip.download.downloadPackages(
+        [rez_pip.pip.PackageGroup((package,)) for package in packages], wheelsDir
+    )
+    timings["download"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for group in groups:
+        for package in group.packages:
+            group.wheels.append(rez_pip.install.readWheelMetadata(package.path))
+            group.dists.append(
+                rez_pip.install.installWheel(
+                    package, package.path, os.path.join(installedDir, package.name)
+                )
+            )
+    timings["install"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for group in groups:
+        for package, dist in zip(group.packages, group.dists):
+            targetPath = os.path.join(installedDir, package.name)
+            record = rez_pip.install.Record(dist, targetPath)
+            rez_pip.install.cleanup(dist, targetPath, record=record)
+            rez_pip.patch.patch(dist, targetPath, record=record)
+            record.write()
+            group.manifests.append(rez_pip.install.buildFileManifest(dist, targetPath))
+    timings["cleanup_patch"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for group in groups:
+        rez_pip.rez.createPackage(
+            group, rez.version.Version(pythonVersion), installedDir, prefix=repo
+        )
+    timings["create"] = time.perf_counter() - start
+
+    return timings
+
+
+def runMicrobenchmark(
+    distributions: int = 2000, requires: int = 20
+) -> dict[str, float]:
+    """
+    Convert the requirements of a synthetic set of distributions to rez requirements,
+    for multiple python versions, like a large ingest does. The conversion runs once
+    without the conversion caches of :mod:`rez_pip.utils`, once with empty caches
+    and once with warm caches.
+
+    :param distributions: Number of distributions.
+    :param requires: Number of requirements of each distribution.
+    :returns: Duration (in seconds) of each run.
+    """
+    import unittest.mock
+
+    import rez.version
+
+    import rez_pip.utils
+
+    rng = random.Random(0)
+    specifiers = [
+        "",
+        ">=1.21",
+        "<3",
+        ">=2.0,<3",
+        "~=1.4",
+        "!=1.5.*",
+        "==2.*",
+        ">1.0.post1",
+    ]
+    markers = [
+        "",
+        "",
+        "",
+        ' ; python_version < "3.10"',
+        ' ; sys_platform == "win32"',
+        ' ; platform_machine == "x86_64" and python_version >= "3.8"',
+        ' ; extra == "test"',
+    ]
+    # Real dependency sets share most of their requirements (numpy, six, etc).
+    pool = [
+        f"dep_{index}{rng.choice(specifiers)}{rng.choice(markers)}"
+        for index in range(500)
+    ]
+    requirementSets = [rng.sample(pool, requires) for _ in range(distributions)]
+    pythonVersions = [rez.version.Version(v) for v in ("3.9.18", "3.10.13", "3.11.7")]
+
+    def convert() -> float:
+        start = time.perf_counter()
+        for pythonVersion in pythonVersions:
+            for index, requirements in enumerate(requirementSets):
+                rez_pip.utils._convertRequirements(
+                    f"dist_{index}",
+                    requirements,
+                    [],
+                    ">=3.8",
+                    True,
+                    False,
+                    pythonVersion,
+                    None,
+                )
+        return time.perf_counter() - start
+
+    timings: dict[str, float] = {}
+
+    # Requirements conditional on extras are logged.
+    logging.getLogger("rez_pip").setLevel(logging.ERROR)
+
+    with contextlib.ExitStack() as stack:
+        for function in rez_pip.utils._CACHED_FUNCTIONS:
+            stack.enter_context(
+                unittest.mock.patch.object(
+                    rez_pip.utils, function.__name__, function.__wrapped__
+                )
+            )
+        timings["uncached"] = convert()
+
+    rez_pip.utils.clearCaches()
+    timings["cold"] = convert()
+    timings["warm"] = convert()
+    return timings
+
+
+def _getCommit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict[str, typing.Any], baseline: dict[str, typing.Any]) -> None:
+    """Print the difference between two results."""
+    print(f"\nCompared to {baseline.get('commit') or 'baseline'}:")
+    for run, new in results.get("micro", {}).items():
+        old = baseline.get("micro", {}).get(run)
+        if old:
+            print(
+                f"  {'micro':<12} {run:<14} {old:9.3f}s -> {new:9.3f}s ({(new - old) / old:+.1%})"
+            )
+
+    for name, scenario in results["scenarios"].items():
+        baseScenario = baseline["scenarios"].get(name)
+        if not baseScenario:
+            continue
+
+        for stage in (*STAGES, "total"):
+            old = baseScenario["stages"].get(stage)
+            new = scenario["stages"][stage]
+            if not old:
+                continue
+            print(
+                f"  {name:<12} {stage:<14} {old:9.3f}s -> {new:9.3f}s ({(new - old) / old:+.1%})"
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=[*SCENARIOS, "all"],
+        help=f"Scenario to run. This option can be used multiple times (default: {', '.join(DEFAULT_SCENARIOS)}).",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=1,
+        help="Number of runs of each scenario. The fastest run of each stage is kept.",
+    )
+    parser.add_argument(
+        "--work-dir",
+        help="Directory where the wheels are generated. Reuse it to not generate them again (default: temporary directory).",
+    )
+    parser.add_argument(
+        "--micro",
+        action="store_true",
+        help="Also run the requirement conversion microbenchmark.",
+    )
+    parser.add_argument("--output", help="Write the results to the given JSON file.")
+    parser.add_argument("--compare", help="Compare the results to the given JSON file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    scenarios = args.scenario or list(DEFAULT_SCENARIOS)
+    if "all" in scenarios:
+        scenarios = list(SCENARIOS)
+
+    workDir = args.work_dir or tempfile.mkdtemp(prefix="rez-pip-benchmark-")
+    cwd = os.getcwd()
+
+    from rez_pip.compat import importlib_metadata
+
+    results: dict[str, typing.Any] = {
+        "rez_pip_version": importlib_metadata.version("rez-pip"),
+        "commit": _getCommit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": {},
+    }
+
+    try:
+        for name in scenarios:
+            scenario = SCENARIOS[name]
+            print(f"{name}: generating wheels...", flush=True)
+            indexDir = os.path.join(workDir, "indexes", name)
+            names = buildIndex(indexDir, name, scenario)
+
+            stages: dict[str, float] = {}
+            with serve(indexDir) as url:
+                for run in range(args.runs):
+                    runDir = tempfile.mkdtemp(prefix=f"{name}-", dir=workDir)
+                    try:
+                        timings = runScenario(names, url, runDir)
+                    finally:
+                        # createPackage changes the current directory.
+                        os.chdir(cwd)
+                        shutil.rmtree(runDir, ignore_errors=True)
+
+                    for stage, duration in timings.items():
+                        stages[stage] = min(stages.get(stage, duration), duration)
+
+            stages["total"] = sum(stages[stage] for stage in STAGES)
+            results["scenarios"][name] = {
+                **dataclasses.asdict(scenario),
+                "stages": stages,
+            }
+            print(
+                f"{name}: "
+                + ", ".join(
+                    f"{stage} {duration:.3f}s" for stage, duration in stages.items()
+                ),
+                flush=True,
+            )
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(workDir, ignore_errors=True)
+
+    if args.micro:
+        print("micro: converting requirements...", flush=True)
+        results["micro"] = runMicrobenchmark()
+        print(
+            "micro: "
+            + ", ".join(
+                f"{run} {duration:.3f}s" for run, duration in results["micro"].items()
+            ),
+            flush=True,
+        )
+
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(results, fd, indent=4)
+
+    if args.compare:
+        with open(args.compare) as fd:
+            compare(results, json.load(fd))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
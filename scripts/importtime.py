@@ -0,0 +1,89 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Check that importing rez-pip stays within its time budget, using ``python -X importtime``.
+
+rez imports the rez_pip package every time it loads its plugins (for any rez command),
+and rez_pip.cli is imported before the command line is even parsed. Anything slow
+to import (rich, aiohttp, installer, rez, etc) must be imported by the functions
+that need it instead.
+
+Usage: python scripts/importtime.py [--runs <number>] [--top <number>]
+"""
+
+from __future__ import annotations
+
+import sys
+import argparse
+import subprocess
+
+#: Maximum cumulative import time (in milliseconds) of each module. The best run
+#: is compared to the budget to reduce the noise.
+BUDGETS = {
+    "rez_pip": 50,
+    "rez_pip.cli": 250,
+}
+
+
+def measure(module: str) -> dict[str, int]:
+    """
+    Import a module in a new interpreter.
+
+    :returns: Cumulative import time (in microseconds) of each imported module.
+    """
+    completedProcess = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+
+    times: dict[str, int] = {}
+    for line in completedProcess.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:"):
+            continue
+
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs.")
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=15,
+        help="Number of slowest imports to show when a budget is exceeded.",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in BUDGETS.items():
+        # Warm up (writes the bytecode caches).
+        measure(module)
+
+        best = min((measure(module) for _ in range(args.runs)), key=lambda x: x[module])
+        elapsed = best[module] / 1000
+
+        print(f"{module}: {elapsed:.1f}ms (budget: {budget}ms)")
+        if elapsed <= budget:
+            continue
+
+        failed = True
+        print(f"  {module} is over budget. Slowest imports:")
+        slowest = sorted(best.items(), key=lambda x: x[1], reverse=True)
+        for name, cumulative in slowest[1 : args.top + 1]:
+            print(f"    {cumulative / 1000:8.1f}ms {name}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
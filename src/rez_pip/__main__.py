@@ -4,4 +4,6 @@
 
 import rez_pip.cli
 
-rez_pip.cli.run()
+# Guard against re-execution when worker processes are spawned (see --jobs).
+if __name__ == "__main__":
+    rez_pip.cli.run()
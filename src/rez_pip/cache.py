@@ -0,0 +1,718 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Persistent caches. They are used to avoid doing the same work over and
+over again across multiple runs.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import html
+import json
+import time
+import typing
+import hashlib
+import logging
+import shutil
+import pathlib
+import platform
+import tempfile
+import dataclasses
+
+import rez_pip.download
+
+_LOG = logging.getLogger(__name__)
+
+# Bump when the format of what we store changes.
+_RESOLVE_CACHE_VERSION = 1
+
+#: Partial downloads older than this (in seconds) are removed when the wheel cache is pruned.
+PARTIAL_DOWNLOAD_MAX_AGE = 7 * 24 * 3600
+
+#: Interpreter cache entries not used for this long (in seconds) are removed when pruning.
+INTERPRETER_CACHE_MAX_AGE = 30 * 24 * 3600
+
+#: Find-links pages of the wheel cache not used for this long (in seconds) are removed
+#: when a new page is written (see :meth:`WheelCache.writeFindLinks`).
+FIND_LINKS_MAX_AGE = 24 * 3600
+
+
+_SIZE_UNITS = {
+    "": 1,
+    "K": 1000,
+    "M": 1000**2,
+    "G": 1000**3,
+    "T": 1000**4,
+    "KI": 1024,
+    "MI": 1024**2,
+    "GI": 1024**3,
+    "TI": 1024**4,
+}
+
+
+def parseSize(value: str) -> int:
+    """
+    Parse a human readable size (``500MB``, ``10GiB``, ``1024``, etc) into a number of bytes.
+
+    :raises ValueError: If the value can't be parsed.
+    """
+    text = value.strip().upper()
+    if text.endswith("B"):
+        text = text[:-1]
+
+    number = text.rstrip("KMGTI")
+    unit = text[len(number) :]
+    if not number or unit not in _SIZE_UNITS:
+        raise ValueError(f"invalid size: {value!r}")
+
+    return int(float(number) * _SIZE_UNITS[unit])
+
+
+def formatSize(size: int) -> str:
+    """Format a number of bytes into a human readable size."""
+    value = float(size)
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if value < 1024:
+            return f"{value:.1f} {unit}" if unit != "B" else f"{size} B"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def getDefaultCacheDir() -> str:
+    """Get the default (platform specific) root directory of the caches."""
+    if platform.system() == "Windows":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "rez-pip", "Cache")
+
+    if sys.platform == "darwin":
+        return os.path.expanduser(os.path.join("~", "Library", "Caches", "rez-pip"))
+
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(
+        os.path.join("~", ".cache")
+    )
+    return os.path.join(base, "rez-pip")
+
+
+def _getPipConfigFiles(pythonExecutable: str) -> list[str]:
+    """
+    Get the paths of the configuration files that pip could load. This is best
+    effort and mirrors https://pip.pypa.io/en/stable/topics/configuration/#location.
+    """
+    home = os.path.expanduser("~")
+    # The "site" config file lives in sys.prefix of the interpreter used to run pip.
+    prefix = os.path.dirname(os.path.dirname(os.path.abspath(pythonExecutable)))
+
+    if platform.system() == "Windows":
+        directories = [
+            os.path.join(os.environ.get("PROGRAMDATA", r"C:\ProgramData"), "pip"),
+            os.path.join(os.environ.get("APPDATA", home), "pip"),
+            os.path.join(home, "pip"),
+            os.path.dirname(os.path.abspath(pythonExecutable)),
+        ]
+        names = ["pip.ini"]
+    else:
+        directories = [
+            "/etc",
+            "/etc/xdg/pip",
+            os.path.join(home, "Library", "Application Support", "pip"),
+            os.path.join(home, ".pip"),
+            os.path.join(
+                os.environ.get("XDG_CONFIG_HOME") or os.path.join(home, ".config"),
+                "pip",
+            ),
+            prefix,
+        ]
+        names = ["pip.conf"]
+
+    paths = [
+        os.path.join(directory, name) for directory in directories for name in names
+    ]
+    if os.environ.get("PIP_CONFIG_FILE"):
+        paths.append(os.environ["PIP_CONFIG_FILE"])
+
+    return paths
+
+
+def _hashFileContent(digest: typing.Any, path: str, label: str = "") -> None:
+    """Feed the path and content of a file (if it exists) into digest."""
+    digest.update(f"{label}{path}\0".encode("utf-8"))
+    try:
+        with open(path, "rb") as fd:
+            digest.update(fd.read())
+    except OSError:
+        digest.update(b"<missing>")
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheEntry:
+    """A file stored in a cache."""
+
+    #: Path to the file.
+    path: str
+
+    #: Size of the file, in bytes.
+    size: int
+
+    #: Last time the file was accessed (timestamp).
+    lastAccess: float
+
+
+def _listEntries(root: str) -> list[CacheEntry]:
+    entries: list[CacheEntry] = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(".tmp"):
+                continue
+
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Removed by someone else in the meantime.
+                continue
+            entries.append(CacheEntry(path, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def _writeText(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write to a temporary file first so that concurrent readers
+    # never see a partially written entry.
+    fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fileObj:
+            fileObj.write(text)
+        os.replace(tmpPath, path)
+    except BaseException:
+        os.remove(tmpPath)
+        raise
+
+
+def _writeJSON(path: str, data: typing.Any) -> None:
+    _writeText(path, json.dumps(data))
+
+
+def _formatLinksPage(title: str, links: list[tuple[str, str, str]]) -> str:
+    """
+    Format an HTML page of links, like the pages of a PEP 503 simple repository.
+
+    :param links: URL, sha256 (can be empty) and text of each link.
+    """
+    lines = [
+        f'<a href="{html.escape(url)}{f"#sha256={sha256}" if sha256 else ""}">'
+        f"{html.escape(text)}</a><br/>"
+        for url, sha256, text in links
+    ]
+    return (
+        "<!DOCTYPE html>\n<html>\n"
+        f"<head><title>{html.escape(title)}</title></head>\n<body>\n"
+        + "\n".join(lines)
+        + "\n</body>\n</html>\n"
+    )
+
+
+def _removeEmptyDirectories(root: str) -> None:
+    for dirpath, _, _ in sorted(os.walk(root), key=lambda x: x[0], reverse=True):
+        if dirpath == root:
+            continue
+        try:
+            os.rmdir(dirpath)
+        except OSError:
+            # Not empty.
+            pass
+
+
+class ResolveCache:
+    """
+    On-disk cache of the packages resolved by pip (the ``install`` section
+    of the pip report).
+
+    :param path: Directory where the cache entries are stored.
+    :param ttl: Time (in seconds) after which an entry is considered stale.
+    """
+
+    def __init__(self, path: str, ttl: float) -> None:
+        self.path = path
+        self.ttl = ttl
+
+    def getKey(
+        self,
+        packageNames: list[str],
+        pip: str,
+        pythonVersion: str,
+        pythonExecutable: str,
+        requirements: list[str],
+        constraints: list[str],
+        extraArgs: list[str],
+    ) -> str:
+        """
+        Compute the key of a resolve. Every input that can change the result
+        of the resolve is part of the key.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"version={_RESOLVE_CACHE_VERSION}\0".encode("utf-8"))
+        digest.update(json.dumps(packageNames).encode("utf-8"))
+        digest.update(f"\0python={pythonVersion}\0".encode("utf-8"))
+
+        # The interpreter is used to evaluate the markers. A different interpreter
+        # at the same path should not reuse the entries.
+        executable = os.path.realpath(pythonExecutable)
+        try:
+            stat = os.stat(executable)
+            digest.update(
+                f"{executable}:{stat.st_size}:{stat.st_mtime_ns}\0".encode("utf-8")
+            )
+        except OSError:
+            digest.update(f"{executable}\0".encode("utf-8"))
+
+        digest.update(json.dumps(extraArgs).encode("utf-8"))
+        digest.update(f"\0pip={rez_pip.download.getSHA256(pip)}\0".encode("utf-8"))
+
+        for path in requirements:
+            _hashFileContent(digest, path, label="-r:")
+        for path in constraints:
+            _hashFileContent(digest, path, label="-c:")
+
+        # Index configuration.
+        for name in sorted(os.environ):
+            if name.startswith("PIP_"):
+                digest.update(f"{name}={os.environ[name]}\0".encode("utf-8"))
+
+        for path in _getPipConfigFiles(pythonExecutable):
+            _hashFileContent(digest, path)
+
+        return digest.hexdigest()
+
+    def _getEntryPath(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> list[dict[str, typing.Any]] | None:
+        """
+        Get the packages stored for the given key.
+
+        :returns: The raw packages or ``None`` if there is no entry or if it expired.
+        """
+        entryPath = self._getEntryPath(key)
+        try:
+            with open(entryPath, encoding="utf-8") as fd:
+                entry = json.load(fd)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            _LOG.debug(f"Ignoring unreadable resolve cache entry {entryPath!r}: {exc}")
+            return None
+
+        if time.time() - entry["created"] > self.ttl:
+            _LOG.debug(f"Resolve cache entry {entryPath!r} expired")
+            return None
+
+        return typing.cast(typing.List[typing.Dict[str, typing.Any]], entry["install"])
+
+    def entries(self) -> list[CacheEntry]:
+        """List the entries in the cache."""
+        return [
+            entry for entry in _listEntries(self.path) if entry.path.endswith(".json")
+        ]
+
+    def prune(self) -> list[CacheEntry]:
+        """
+        Remove the expired entries.
+
+        :returns: The removed entries.
+        """
+        now = time.time()
+        removed: list[CacheEntry] = []
+        for entry in self.entries():
+            if now - entry.lastAccess <= self.ttl:
+                continue
+
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            removed.append(entry)
+
+        if removed:
+            _removeEmptyDirectories(self.path)
+
+        return removed
+
+    def clear(self) -> None:
+        """Remove all the entries."""
+        for entry in self.entries():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        _removeEmptyDirectories(self.path)
+
+    def set(self, key: str, packages: list[dict[str, typing.Any]]) -> None:
+        """Store the packages for the given key."""
+        _writeJSON(
+            self._getEntryPath(key), {"created": time.time(), "install": packages}
+        )
+
+
+class InterpreterCache:
+    """
+    On-disk cache of the python executables found in the python rez packages.
+    Entries are keyed on the package repositories and on the state of the python
+    packages, so that adding, removing or re-releasing a package invalidates them.
+
+    :param path: Directory where the cache entries are stored.
+    :param maxAge: Time (in seconds) after which an unused entry is removed when pruning.
+    """
+
+    def __init__(self, path: str, maxAge: float = INTERPRETER_CACHE_MAX_AGE) -> None:
+        self.path = path
+        self.maxAge = maxAge
+
+    def getKey(
+        self, packageFamily: str, packagesPaths: list[str], packages: list[str]
+    ) -> str:
+        """
+        Compute the key of a lookup.
+
+        :param packageFamily: Name of the python package family.
+        :param packagesPaths: Rez package repositories.
+        :param packages: Stamps of the python packages that matched.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{packageFamily}\0".encode("utf-8"))
+        digest.update(json.dumps(list(packagesPaths)).encode("utf-8"))
+        digest.update(json.dumps(sorted(packages)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _getEntryPath(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> dict[str, str] | None:
+        """
+        Get the executables stored for the given key.
+
+        :returns: The executables (python version -> path) or ``None`` if there is
+            no entry or if one of the executables doesn't exist anymore.
+        """
+        entryPath = self._getEntryPath(key)
+        try:
+            with open(entryPath, encoding="utf-8") as fd:
+                executables = typing.cast(typing.Dict[str, str], json.load(fd))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            _LOG.debug(
+                f"Ignoring unreadable interpreter cache entry {entryPath!r}: {exc}"
+            )
+            return None
+
+        for path in executables.values():
+            if not os.path.exists(path):
+                _LOG.debug(f"{path!r} doesn't exist anymore, ignoring {entryPath!r}")
+                return None
+
+        try:
+            # Used when pruning.
+            os.utime(entryPath)
+        except OSError:
+            pass
+
+        return executables
+
+    def set(self, key: str, executables: dict[str, str]) -> None:
+        """Store the executables for the given key."""
+        _writeJSON(self._getEntryPath(key), executables)
+
+    def entries(self) -> list[CacheEntry]:
+        """List the entries in the cache."""
+        return [
+            entry for entry in _listEntries(self.path) if entry.path.endswith(".json")
+        ]
+
+    def prune(self) -> list[CacheEntry]:
+        """
+        Remove the entries that were not used recently.
+
+        :returns: The removed entries.
+        """
+        now = time.time()
+        removed: list[CacheEntry] = []
+        for entry in self.entries():
+            if now - entry.lastAccess <= self.maxAge:
+                continue
+
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            removed.append(entry)
+
+        if removed:
+            _removeEmptyDirectories(self.path)
+
+        return removed
+
+    def clear(self) -> None:
+        """Remove all the entries."""
+        for entry in self.entries():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        _removeEmptyDirectories(self.path)
+
+
+class WheelCache:
+    """
+    Persistent content-addressed cache of wheels. Wheels are stored using their sha256
+    digest and their file name is preserved (installers need it). The total size of
+    the cache is bounded by evicting the least recently used wheels.
+
+    :param path: Directory where the wheels are stored.
+    :param maxSize: Maximum size of the cache, in bytes.
+    """
+
+    def __init__(self, path: str, maxSize: int) -> None:
+        self.path = path
+        self.maxSize = maxSize
+
+    def _getWheelPath(self, sha256: str, wheelName: str) -> str:
+        return os.path.join(self.path, sha256[:2], sha256, wheelName)
+
+    def getPartialPath(self, sha256: str, wheelName: str) -> str:
+        """Get where to keep the partial download of a wheel so that it can be resumed."""
+        return os.path.join(
+            self.path, "partial", sha256[:2], sha256, f"{wheelName}.part"
+        )
+
+    def get(self, sha256: str, wheelName: str) -> str | None:
+        """
+        Get a wheel from the cache.
+
+        :returns: The path of the cached wheel or ``None`` if it's not in the cache.
+        """
+        path = self._getWheelPath(sha256, wheelName)
+        try:
+            # Record the access. The modification time is used for the LRU eviction
+            # because the access time is not reliable (noatime, relatime, etc).
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def add(self, path: str, sha256: str, wheelName: str | None = None) -> str:
+        """
+        Move a wheel into the cache. The caller is responsible for verifying that
+        the content of the file matches the digest.
+
+        :param path: Path of the wheel to add. The file is moved.
+        :param sha256: sha256 digest of the wheel.
+        :param wheelName: File name of the wheel. Defaults to the name of path.
+        :returns: The path of the cached wheel.
+        """
+        wheelPath = self._getWheelPath(sha256, wheelName or os.path.basename(path))
+        os.makedirs(os.path.dirname(wheelPath), exist_ok=True)
+
+        # Move through a temporary file in the cache so that other processes
+        # never see a partially written wheel, even across file systems.
+        fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(wheelPath), suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.move(path, tmpPath)
+            os.replace(tmpPath, wheelPath)
+        except BaseException:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+            raise
+
+        return wheelPath
+
+    def entries(self) -> list[CacheEntry]:
+        """List the wheels in the cache."""
+        return [
+            entry
+            for entry in _listEntries(self.path)
+            if entry.path.endswith(".whl")
+            and not entry.path.startswith(os.path.join(self.path, "partial", ""))
+        ]
+
+    def partialEntries(self) -> list[CacheEntry]:
+        """List the partial downloads (and their metadata) in the cache."""
+        return _listEntries(os.path.join(self.path, "partial"))
+
+    def _prunePartials(self, maxAge: float) -> None:
+        """Remove partial downloads that were not touched for maxAge seconds."""
+        now = time.time()
+        removed = False
+        for entry in self.partialEntries():
+            if now - entry.lastAccess < maxAge:
+                continue
+            try:
+                os.remove(entry.path)
+                removed = True
+            except OSError as exc:
+                _LOG.debug(f"Failed to remove partial download {entry.path!r}: {exc}")
+
+        if removed:
+            _removeEmptyDirectories(os.path.join(self.path, "partial"))
+
+    def prune(self, maxSize: int | None = None) -> list[CacheEntry]:
+        """
+        Evict the least recently used wheels until the cache fits within maxSize.
+
+        :param maxSize: Size to fit in. Defaults to the maximum size of the cache.
+        :returns: The evicted entries.
+        """
+        if maxSize is None:
+            maxSize = self.maxSize
+
+        # Partial downloads are only useful for a while. Drop them all when
+        # clearing the cache.
+        self._prunePartials(PARTIAL_DOWNLOAD_MAX_AGE if maxSize else 0)
+
+        entries = sorted(self.entries(), key=lambda entry: entry.lastAccess)
+        total = sum(entry.size for entry in entries)
+
+        evicted: list[CacheEntry] = []
+        for entry in entries:
+            if total <= maxSize:
+                break
+
+            try:
+                os.remove(entry.path)
+            except OSError as exc:
+                _LOG.debug(
+                    f"Failed to evict {entry.path!r} from the wheel cache: {exc}"
+                )
+                continue
+
+            _LOG.debug(f"Evicted {entry.path!r} from the wheel cache")
+            total -= entry.size
+            evicted.append(entry)
+
+        if evicted:
+            _removeEmptyDirectories(self.path)
+
+        return evicted
+
+    def clear(self) -> None:
+        """Remove all the wheels from the cache."""
+        self.prune(maxSize=0)
+
+    def wheels(self) -> list[tuple[str, str]]:
+        """
+        List the wheels in the cache.
+
+        :returns: The sha256 digest and the path of each wheel.
+        """
+        return [
+            (os.path.basename(os.path.dirname(entry.path)), entry.path)
+            for entry in self.entries()
+        ]
+
+    def writeFindLinks(self) -> str:
+        """
+        Write an HTML page that links to all the wheels of the cache. When it's passed to
+        pip with ``--find-links``, pip reports the cached wheels it picks as local files
+        (``file://`` URLs) and they are used in place instead of being downloaded.
+        For the same file, pip prefers links found with ``--find-links`` over
+        the ones from the index.
+
+        The name of the page is derived from its content. Resolves cached while
+        using a page are not reused once wheels are added to or evicted from the cache.
+
+        :returns: Path of the page.
+        """
+        wheels = sorted(self.wheels(), key=lambda wheel: os.path.basename(wheel[1]))
+        content = _formatLinksPage(
+            "rez-pip wheel cache",
+            [
+                (
+                    pathlib.Path(os.path.abspath(path)).as_uri(),
+                    sha256,
+                    os.path.basename(path),
+                )
+                for sha256, path in wheels
+            ],
+        )
+
+        pagesDir = os.path.join(self.path, "find-links")
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        page = os.path.join(pagesDir, f"{digest[:16]}.html")
+        if not os.path.exists(page):
+            _writeText(page, content)
+
+        now = time.time()
+        os.utime(page)
+        for entry in _listEntries(pagesDir):
+            if entry.path != page and now - entry.lastAccess > FIND_LINKS_MAX_AGE:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+        _LOG.debug(f"Wrote the links to {len(wheels)} cached wheels in {page!r}")
+        return page
+
+    def export(self, dest: str) -> list[str]:
+        """
+        Copy the wheels of the cache to a self-contained wheelhouse, for sites that
+        don't have access to the package index. The wheelhouse contains the wheels
+        and an ``index.html`` page that links to them (``pip --no-index --find-links
+        <dest>``). It also contains a PEP 503 simple repository in ``simple/``, for
+        when the wheelhouse is served over HTTP (``pip --index-url <url>/simple/``).
+
+        :param dest: Directory to export the wheels to. Existing files are overwritten.
+        :returns: Paths of the exported wheels.
+        """
+        import packaging.utils
+
+        os.makedirs(dest, exist_ok=True)
+
+        # The same file name can be cached with different content (for example a
+        # wheel that was rebuilt). Keep the most recently used one.
+        wheels: dict[str, tuple[str, str]] = {}
+        for entry in sorted(self.entries(), key=lambda entry: entry.lastAccess):
+            sha256 = os.path.basename(os.path.dirname(entry.path))
+            wheels[os.path.basename(entry.path)] = (sha256, entry.path)
+
+        exported: list[str] = []
+        projects: dict[str, list[tuple[str, str, str]]] = {}
+        for name, (sha256, path) in sorted(wheels.items()):
+            exportedPath = os.path.join(dest, name)
+            shutil.copyfile(path, exportedPath)
+            exported.append(exportedPath)
+
+            try:
+                project = str(packaging.utils.parse_wheel_filename(name)[0])
+            except packaging.utils.InvalidWheelFilename:
+                _LOG.warning(f"{name!r} is not a valid wheel name, skipping it")
+                continue
+            projects.setdefault(project, []).append((f"../../{name}", sha256, name))
+
+        _writeText(
+            os.path.join(dest, "index.html"),
+            _formatLinksPage(
+                "Links",
+                [(name, sha256, name) for name, (sha256, _) in sorted(wheels.items())],
+            ),
+        )
+
+        for project, links in projects.items():
+            _writeText(
+                os.path.join(dest, "simple", project, "index.html"),
+                _formatLinksPage(f"Links for {project}", links),
+            )
+
+        _writeText(
+            os.path.join(dest, "simple", "index.html"),
+            _formatLinksPage(
+                "Simple index",
+                [(f"{project}/", "", project) for project in sorted(projects)],
+            ),
+        )
+        return exported
@@ -7,41 +7,123 @@ from __future__ import annotations
 import os
 import sys
 import json
+import math
+import time
 import shutil
+import typing
 import logging
+import pathlib
 import argparse
 import textwrap
 import tempfile
 import itertools
+import contextlib
 import subprocess
+import multiprocessing
+import logging.handlers
+import concurrent.futures
 
-import rich.text
-import rich.panel
-import rich.table
-import rez.version
-import rich.markup
-import rich.logging
-
-import rez_pip.pip
-import rez_pip.rez
-import rez_pip.data
-import rez_pip.patch
-import rez_pip.utils
-import rez_pip.plugins
-import rez_pip.install
+import rez_pip.cache
+import rez_pip.trace
 import rez_pip.download
+import rez_pip.transfer
 import rez_pip.exceptions
-from rez_pip.compat import importlib_metadata
+
+if typing.TYPE_CHECKING:
+    import rich.console
+
+    import rez_pip.pip
+    import rez_pip.manifest
+
+# Only light modules are imported at the top. rich, rez, pip, installer, plugins,
+# etc are imported by the functions that need them, so that --help, --noop,
+# --plugin-version, etc don't have to pay for them. See scripts/importtime.py.
 
 _LOG = logging.getLogger("rez_pip.cli")
 
 __all__ = ["run"]
 
+#: Lock shared by the worker processes (see ``--jobs``) to serialize the creation of
+#: rez packages. Two Python versions can create variants of the same package family.
+_createPackageLock: typing.ContextManager[typing.Any] | None = None
+
+#: Queue used by the worker processes (see ``--jobs``) to send the progress of
+#: their Python version to the parent process.
+_progressQueue: (
+    multiprocessing.SimpleQueue[tuple[str, str, float, float | None]] | None
+) = None
+
 
 def __dir__() -> list[str]:
     return __all__
 
 
+def _size(value: str) -> int:
+    try:
+        return rez_pip.cache.parseSize(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc)) from None
+
+
+def _positiveInt(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a positive integer")
+    return number
+
+
+def _nonNegativeInt(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a non-negative integer")
+    return number
+
+
+def _positiveFloat(value: str) -> float:
+    number = float(value)
+    if not (number > 0 and math.isfinite(number)):
+        raise argparse.ArgumentTypeError(f"{value!r} is not a positive number")
+    return number
+
+
+def _pythonExecutable(value: str) -> tuple[str, str]:
+    version, sep, path = value.partition("=")
+    if not sep or not version or not path:
+        raise argparse.ArgumentTypeError(f"{value!r} is not of the form VERSION=PATH")
+    return version, path
+
+
+class _PluginVersionAction(argparse.Action):
+    """Same as the "version" action, but the version is only looked up when used."""
+
+    def __init__(
+        self,
+        option_strings: list[str],
+        dest: str = argparse.SUPPRESS,
+        default: str = argparse.SUPPRESS,
+        help: str | None = None,
+    ) -> None:
+        super().__init__(
+            option_strings=option_strings,
+            dest=dest,
+            default=default,
+            nargs=0,
+            help=help,
+        )
+
+    def __call__(
+        self,
+        parser: argparse.ArgumentParser,
+        namespace: argparse.Namespace,
+        values: typing.Any,
+        option_string: str | None = None,
+    ) -> None:
+        from rez_pip.compat import importlib_metadata
+
+        print(importlib_metadata.version(__package__))
+        parser.exit()
+
+
 def _setupParser(
     parser: argparse.ArgumentParser, fromRez: bool = False
 ) -> argparse.ArgumentParser:
@@ -74,6 +156,20 @@ def _setupParser(
         help="Release the converted packages (default: configured release_packages_path)",
     )
 
+    generalGroup.add_argument(
+        "--manifest",
+        metavar="<file>",
+        help=(
+            "Ingest the requirement sets listed in the given manifest (TOML, or JSON if the "
+            "file ends with .json) in one invocation. Options not set by an entry are taken from the command line."
+        ),
+    )
+    generalGroup.add_argument(
+        "--manifest-report",
+        metavar="<file>",
+        help="Write the result of each entry of the manifest to the given JSON file.",
+    )
+
     generalGroup.add_argument(
         "--python-version",
         # 3.7+ because that's what pip supports
@@ -81,12 +177,60 @@ def _setupParser(
         metavar="<version>",
         help="Range of python versions. It can also be a single version, any valid rez version specifier or range or 'latest' (default: 3.7+)",
     )
+    generalGroup.add_argument(
+        "--python-executable",
+        action="append",
+        type=_pythonExecutable,
+        metavar="<version>=<path>",
+        help=(
+            "Use the given python executable for the given python version instead of looking "
+            "for python rez packages. This option can be used multiple times. --python-version is ignored."
+        ),
+    )
     generalGroup.add_argument(
         "--pip",
-        default=rez_pip.pip.getBundledPip(),
         metavar="<path>",
         help="Standalone pip (https://pip.pypa.io/en/stable/installation/#standalone-zip-application) (default: bundled).",
     )
+    generalGroup.add_argument(
+        "--pip-timeout",
+        type=_positiveFloat,
+        metavar="<seconds>",
+        help="Maximum time pip has to resolve the packages for a python version (default: no limit).",
+    )
+
+    generalGroup.add_argument(
+        "-j",
+        "--jobs",
+        default=1,
+        type=_positiveInt,
+        metavar="<number>",
+        help="Number of Python versions to process in parallel. Each Python version is processed in its own process (default: 1).",
+    )
+    generalGroup.add_argument(
+        "--install-workers",
+        default=4,
+        type=_positiveInt,
+        metavar="<number>",
+        help="Number of wheels to install (extract) in parallel (default: 4).",
+    )
+    generalGroup.add_argument(
+        "--file-transfer",
+        default="auto",
+        choices=rez_pip.transfer.STRATEGIES,
+        help=(
+            "How installed files are transferred into the rez packages. "
+            '"auto" uses reflinks or hard links when possible and falls back to copying (default: auto).'
+        ),
+    )
+    generalGroup.add_argument(
+        "--direct-install",
+        action="store_true",
+        help=(
+            "Install wheels directly into the rez package variants instead of installing "
+            "them in a temporary directory and copying them. Halves the amount of data written."
+        ),
+    )
 
     # Only needed to tests
     generalGroup.add_argument("--noop", action="store_true", help=argparse.SUPPRESS)
@@ -101,8 +245,86 @@ def _setupParser(
 
     generalGroup.add_argument(
         "--plugin-version",
-        action="version",
-        version=importlib_metadata.version(__package__),
+        action=_PluginVersionAction,
+        help="Show the version of rez-pip and exit.",
+    )
+
+    downloadGroup = parser.add_argument_group(title="download options")
+    downloadGroup.add_argument(
+        "--max-connections",
+        default=rez_pip.download.DownloadSettings.maxConnections,
+        type=_positiveInt,
+        metavar="<number>",
+        help="Maximum number of simultaneous download connections (default: %(default)s).",
+    )
+    downloadGroup.add_argument(
+        "--max-connections-per-host",
+        default=rez_pip.download.DownloadSettings.maxConnectionsPerHost,
+        type=_positiveInt,
+        metavar="<number>",
+        help="Maximum number of simultaneous download connections to a single host (default: %(default)s).",
+    )
+    downloadGroup.add_argument(
+        "--download-retries",
+        default=rez_pip.download.DownloadSettings.retries,
+        type=_nonNegativeInt,
+        metavar="<number>",
+        help="Number of times a download is retried after a transient failure (default: %(default)s).",
+    )
+    downloadGroup.add_argument(
+        "--download-connect-timeout",
+        default=rez_pip.download.DownloadSettings.connectTimeout,
+        type=_positiveFloat,
+        metavar="<seconds>",
+        help="Timeout to connect to the server (default: %(default)s).",
+    )
+    downloadGroup.add_argument(
+        "--download-read-timeout",
+        default=rez_pip.download.DownloadSettings.readTimeout,
+        type=_positiveFloat,
+        metavar="<seconds>",
+        help="Timeout between two reads of a download (default: %(default)s).",
+    )
+
+    cacheGroup = parser.add_argument_group(title="cache options")
+    cacheGroup.add_argument(
+        "--cache-dir",
+        metavar="<path>",
+        help="Root directory of the persistent caches (default: platform specific user cache directory).",
+    )
+    cacheGroup.add_argument(
+        "--no-resolve-cache",
+        action="store_true",
+        help="Always resolve with pip and don't store the result in the resolve cache.",
+    )
+    cacheGroup.add_argument(
+        "--resolve-cache-ttl",
+        default=3600,
+        type=_positiveFloat,
+        metavar="<seconds>",
+        help="Time after which a cached resolve is considered stale (default: 3600).",
+    )
+    cacheGroup.add_argument(
+        "--no-interpreter-cache",
+        action="store_true",
+        help="Always look for the python executables in the python rez packages and don't cache them.",
+    )
+    cacheGroup.add_argument(
+        "--no-wheel-cache",
+        action="store_true",
+        help="Don't use the persistent wheel cache.",
+    )
+    cacheGroup.add_argument(
+        "--wheel-cache-max-size",
+        default=10 * 1024**3,
+        type=_size,
+        metavar="<size>",
+        help="Maximum size of the wheel cache (for example 500MB or 20GiB). Least recently used wheels are evicted (default: 10GiB).",
+    )
+    cacheGroup.add_argument(
+        "--prefer-cached-wheels",
+        action="store_true",
+        help="Pass the wheels of the wheel cache to pip (with --find-links). pip then picks cached wheels over the same files from the index, and they are never downloaded. The rez packages record the path of the cached wheels instead of their URL.",
     )
 
     debugGroup = parser.add_argument_group(title="debug options")
@@ -130,10 +352,18 @@ def _setupParser(
         "--list-plugins", action="store_true", help="List all registered plugins"
     )
 
+    debugGroup.add_argument(
+        "--trace",
+        metavar="<file>",
+        help="Write a timing trace of the run to the given file, in the Chrome trace event format. Open it with https://ui.perfetto.dev.",
+    )
+
     parser.usage = f"""
 
   %(prog)s [options] <package(s)>
   %(prog)s <package(s)> [-- [pip options]]
+  %(prog)s cache [info|prune|clear] [cache options]
+  %(prog)s cache export <directory> [cache options]
 """
     return parser
 
@@ -178,122 +408,824 @@ def _validateArgs(args: argparse.Namespace) -> None:
     if not os.path.exists(args.pip):
         raise rez_pip.exceptions.RezPipError(rf"zipapp at {args.pip!r} does not exist")
 
+    if getattr(args, "manifest", None):
+        if args.packages or args.requirement:
+            raise rez_pip.exceptions.RezPipError(
+                "packages and --requirement can't be used with --manifest. Set them in the manifest entries instead."
+            )
+        return
+
     if not args.packages and not args.requirement:
         raise rez_pip.exceptions.RezPipError(
             "no packages were passed and --requirements was not used. At least one of them must be passed."
         )
 
 
-def _run(args: argparse.Namespace, pipArgs: list[str], pipWorkArea: str) -> None:
-    pythonVersions = rez_pip.rez.getPythonExecutables(
-        args.python_version, packageFamily="python"
+def _getCacheDir(args: argparse.Namespace) -> str:
+    # Paths of the caches are used while the current directory changes (rez and
+    # patches change it while creating the packages), so they must be absolute.
+    return os.path.abspath(
+        os.path.expanduser(args.cache_dir or rez_pip.cache.getDefaultCacheDir())
+    )
+
+
+def _getResolveCache(args: argparse.Namespace) -> rez_pip.cache.ResolveCache:
+    return rez_pip.cache.ResolveCache(
+        os.path.join(_getCacheDir(args), "resolve"), args.resolve_cache_ttl
     )
 
+
+def _getWheelCache(args: argparse.Namespace) -> rez_pip.cache.WheelCache:
+    return rez_pip.cache.WheelCache(
+        os.path.join(_getCacheDir(args), "wheels"), args.wheel_cache_max_size
+    )
+
+
+def _getInterpreterCache(args: argparse.Namespace) -> rez_pip.cache.InterpreterCache:
+    return rez_pip.cache.InterpreterCache(
+        os.path.join(_getCacheDir(args), "interpreters")
+    )
+
+
+def _getPythonExecutables(args: argparse.Namespace) -> dict[str, pathlib.Path]:
+    if args.python_executable:
+        return {version: pathlib.Path(path) for version, path in args.python_executable}
+
+    import rez_pip.rez
+
+    with rez_pip.trace.span(
+        "find python executables", "python", range=args.python_version
+    ):
+        return rez_pip.rez.getPythonExecutables(
+            args.python_version,
+            packageFamily="python",
+            cache=None if args.no_interpreter_cache else _getInterpreterCache(args),
+        )
+
+
+def _getDownloadSettings(
+    args: argparse.Namespace,
+) -> rez_pip.download.DownloadSettings:
+    return rez_pip.download.DownloadSettings(
+        maxConnections=args.max_connections,
+        maxConnectionsPerHost=args.max_connections_per_host,
+        retries=args.download_retries,
+        connectTimeout=args.download_connect_timeout,
+        readTimeout=args.download_read_timeout,
+    )
+
+
+def _run(args: argparse.Namespace, pipArgs: list[str], pipWorkArea: str) -> None:
+    pythonVersions = _getPythonExecutables(args)
+    _runForPythonVersions(args, pipArgs, pipWorkArea, pythonVersions)
+    _pruneWheelCache(args)
+
+
+def _runForPythonVersions(
+    args: argparse.Namespace,
+    pipArgs: list[str],
+    pipWorkArea: str,
+    pythonVersions: dict[str, pathlib.Path],
+) -> dict[str, int]:
+    """
+    Process each Python version, in parallel if requested (see ``--jobs``).
+
+    :returns: Number of rez packages created for each Python version.
+    """
     if not pythonVersions:
         raise rez_pip.exceptions.RezPipError(
             f'No "python" package found within the range {args.python_version!r}.'
         )
 
-    for pythonVersion, pythonExecutable in pythonVersions.items():
-        _LOG.info(
-            f"[bold underline]Installing requested packages for Python {pythonVersion}"
-        )
+    if args.jobs > 1 and len(pythonVersions) > 1:
+        return _runParallel(args, pipArgs, pipWorkArea, pythonVersions)
 
-        wheelsDir = os.path.join(pipWorkArea, "wheels")
-        os.makedirs(wheelsDir, exist_ok=True)
+    import rez_pip.pip
 
-        # Suffix with the python version because we loop over multiple versions,
-        # and package versions, content, etc can differ for each Python version.
-        installedWheelsDir = os.path.join(pipWorkArea, "installed", pythonVersion)
-        os.makedirs(installedWheelsDir, exist_ok=True)
+    executables = [os.fspath(executable) for executable in pythonVersions.values()]
 
-        with rez_pip.utils.CONSOLE.status(
-            f"[bold]Resolving dependencies for {rich.markup.escape(', '.join(args.packages))} (python-{pythonVersion})"
-        ):
-            packages = rez_pip.pip.getPackages(
-                args.packages,
-                args.pip,
-                pythonVersion,
-                os.fspath(pythonExecutable),
-                args.requirement or [],
-                args.constraint or [],
-                pipArgs,
+    created: dict[str, int] = {}
+    for index, pythonVersion in enumerate(pythonVersions):
+        # Importing pip takes a while. Start pip for the next version while
+        # this one is processed.
+        if index + 1 < len(executables):
+            rez_pip.pip.startPipProcess(args.pip, executables[index + 1])
+
+        with rez_pip.trace.span(f"python-{pythonVersion}", "python"):
+            created[pythonVersion] = _runForPythonVersion(
+                args, pipArgs, pipWorkArea, pythonVersion, executables[index]
             )
 
-        _LOG.info(f"Resolved {len(packages)} dependencies for python {pythonVersion}")
-        _packageGroups: list[rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo]] = list(
-            itertools.chain(*rez_pip.plugins.getHook().groupPackages(packages=packages))  # type: ignore[arg-type]
-        )
+        # The next entries of a manifest usually use the same versions.
+        if args.manifest:
+            rez_pip.pip.startPipProcess(args.pip, executables[index])
+    return created
 
-        # TODO: Verify that no packages are in two or more groups? It should theorically
-        # not be possible since plugins are called one after the other? But it could happen
-        # if a plugin forgets to pop items from the package list... The problem is that we
-        # can't know which plugin did what, so we could only say "something went wrong"
-        # and can't point to which plugin is at fault.
 
-        # Remove empty groups
-        _packageGroups = [group for group in _packageGroups if group]
+def _pruneWheelCache(args: argparse.Namespace) -> None:
+    if not args.no_wheel_cache:
+        evicted = _getWheelCache(args).prune()
+        if evicted:
+            _LOG.info(
+                f"Evicted {len(evicted)} wheels ({rez_pip.cache.formatSize(sum(entry.size for entry in evicted))}) from the wheel cache"
+            )
 
-        # Add packages that were not grouped.
-        _packageGroups += [
-            rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo](tuple([package]))
-            for package in packages
-        ]
 
-        # TODO: Should we postpone downloading to the last minute if we can?
-        _LOG.info("[bold]Downloading...")
+def _runManifest(
+    args: argparse.Namespace, pipArgs: list[str], pipWorkArea: str
+) -> list[rez_pip.manifest.EntryResult]:
+    """
+    Process the entries of a manifest (see ``--manifest``) one after the other.
 
-        packageGroups: list[
-            rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]
-        ] = rez_pip.download.downloadPackages(_packageGroups, wheelsDir)
+    The entries share the process and its resources: the plugin manager, the python
+    executables lookups, the downloaded wheels and the caches. An entry that fails
+    doesn't stop the other entries.
 
-        foundLocally = downloaded = 0
-        for group in packageGroups:
-            for package in group.packages:
-                if not package.isDownloadRequired():
-                    foundLocally += 1
+    :returns: The result of each entry.
+    """
+    import rez_pip.manifest
+
+    entries = rez_pip.manifest.loadManifest(args.manifest)
+    _LOG.info(f"[bold]Processing {len(entries)} entries from {args.manifest!r}")
+
+    # Entries often use the same python versions. Only look them up once.
+    pythonExecutables: dict[typing.Any, dict[str, pathlib.Path]] = {}
+
+    results: list[rez_pip.manifest.EntryResult] = []
+    for index, entry in enumerate(entries):
+        _LOG.info(f"[bold]Processing entry {entry.name!r} ({index + 1}/{len(entries)})")
+        entryArgs = argparse.Namespace(**{**vars(args), **entry.options})
+        entryArgs.packages = entryArgs.packages or []
+
+        start = time.perf_counter()
+        result = rez_pip.manifest.EntryResult(entry.name, succeeded=False, duration=0)
+        try:
+            key = (
+                entryArgs.python_version,
+                tuple(entryArgs.python_executable or ()),
+            )
+            if key not in pythonExecutables:
+                pythonExecutables[key] = _getPythonExecutables(entryArgs)
+
+            with rez_pip.trace.span(entry.name, "manifest"):
+                result.packages = _runForPythonVersions(
+                    entryArgs,
+                    pipArgs + entry.pipArgs,
+                    pipWorkArea,
+                    pythonExecutables[key],
+                )
+            result.succeeded = True
+        except Exception as exc:
+            _LOG.error(f"Entry {entry.name!r} failed: {exc}")
+            _LOG.debug(f"Entry {entry.name!r} failed", exc_info=True)
+            result.error = getattr(exc, "message", None) or str(exc) or repr(exc)
+        finally:
+            result.duration = time.perf_counter() - start
+
+            # Packages installed by an entry have been copied to their rez package. Another
+            # entry can install different versions of the same packages.
+            installedDir = os.path.join(pipWorkArea, "installed")
+            if os.path.exists(installedDir):
+                if args.keep_tmp_dirs:
+                    os.replace(installedDir, f"{installedDir}-{index}")
                 else:
-                    downloaded += 1
+                    shutil.rmtree(installedDir)
 
-        message = f"Downloaded {downloaded} wheels"
-        if foundLocally:
-            message += f"skipped {foundLocally} because they resolved to local files"
+        results.append(result)
 
-        _LOG.info(f"[bold]{message}")
+    _pruneWheelCache(args)
+    return results
 
-        with rez_pip.utils.CONSOLE.status(
-            f"[bold]Installing wheels into {installedWheelsDir!r}"
-        ):
-            for group in packageGroups:
-                for package in group.packages:
-                    _LOG.info(f"[bold]Installing {package.name!r} {package.path!r}")
-                    targetPath = os.path.join(installedWheelsDir, package.name)
-                    dist = rez_pip.install.installWheel(
-                        package,
-                        package.path,
-                        targetPath,
+
+def _printManifestResults(results: list[rez_pip.manifest.EntryResult]) -> None:
+    import rich.table
+
+    import rez_pip.utils
+
+    table = rich.table.Table("Entry", "Result", "Packages", "Duration", box=None)
+    for result in results:
+        table.add_row(
+            result.name,
+            "[green]succeeded[/]" if result.succeeded else "[red]failed[/]",
+            ", ".join(
+                f"{count} (python-{version})"
+                for version, count in result.packages.items()
+            ),
+            f"{result.duration:.1f}s",
+        )
+    rez_pip.utils.CONSOLE.print(table)
+
+    for result in results:
+        if result.error:
+            rez_pip.utils.CONSOLE.print(f"[bold]{result.name}[/]: {result.error}")
+
+
+def _runParallel(
+    args: argparse.Namespace,
+    pipArgs: list[str],
+    pipWorkArea: str,
+    pythonVersions: dict[str, pathlib.Path],
+) -> dict[str, int]:
+    """
+    Run the pipeline of each Python version in a pool of worker processes.
+
+    The workers share the wheels download directory. Their logs are sent back to
+    this process and are prefixed with the Python version they belong to.
+    """
+    import rez_pip.utils
+
+    context = multiprocessing.get_context("spawn")
+    logQueue = context.Queue()
+    # Progress is sent synchronously, so it's never received after the result.
+    progressQueue: multiprocessing.SimpleQueue[tuple[str, str, float, float | None]] = (
+        context.SimpleQueue()
+    )
+    lock = context.Lock()
+
+    # Get rid of non picklable values injected by rez.
+    workerArgs = argparse.Namespace(
+        **{
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("parser", "func", "formatter_class")
+        }
+    )
+
+    rootLogger = logging.getLogger("rez_pip")
+    listener = logging.handlers.QueueListener(
+        logQueue, *rootLogger.handlers, respect_handler_level=True
+    )
+    listener.start()
+
+    numWorkers = min(args.jobs, len(pythonVersions))
+    _LOG.info(
+        f"[bold]Processing {len(pythonVersions)} Python versions using {numWorkers} workers"
+    )
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=numWorkers,
+            mp_context=context,
+            initializer=_initWorker,
+            initargs=(
+                logQueue,
+                progressQueue,
+                lock,
+                rootLogger.level,
+                rez_pip.trace.isEnabled(),
+            ),
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _runWorker,
+                    workerArgs,
+                    pipArgs,
+                    pipWorkArea,
+                    pythonVersion,
+                    os.fspath(pythonExecutable),
+                ): pythonVersion
+                for pythonVersion, pythonExecutable in pythonVersions.items()
+            }
+
+            completed = 0
+            created: dict[str, int] = {}
+            pending = set(futures)
+            with _WorkersProgress(list(pythonVersions)) as progress:
+                while pending:
+                    done, pending = concurrent.futures.wait(
+                        pending,
+                        timeout=0.1,
+                        return_when=concurrent.futures.FIRST_COMPLETED,
                     )
+                    progress.drain(progressQueue)
+
+                    for future in done:
+                        try:
+                            created[futures[future]], events = future.result()
+                            rez_pip.trace.addEvents(events)
+                        except BaseException:
+                            # Stop as soon as one of the versions fails, like we
+                            # do when running sequentially.
+                            for future in pending:
+                                future.cancel()
+                            raise
+
+                        completed += 1
+                        progress.finish(futures[future])
+                        _LOG.info(
+                            f"[bold]Finished processing Python {futures[future]} ({completed}/{len(futures)})"
+                        )
+    finally:
+        listener.stop()
+
+    return created
 
-                    rez_pip.install.cleanup(dist, targetPath)
-                    rez_pip.patch.patch(dist, targetPath)
 
-                    group.dists.append(dist)
+class _WorkersProgress:
+    """
+    Progress of the Python versions processed by the worker processes, one line
+    per Python version (see :func:`_runParallel` and :func:`_reportProgress`).
+    """
 
-        with rez_pip.utils.CONSOLE.status("[bold]Creating rez packages..."):
-            for group in packageGroups:
-                rez_pip.rez.createPackage(
-                    group,
-                    rez.version.Version(pythonVersion),
-                    installedWheelsDir,
-                    prefix=args.prefix,
-                    release=args.release,
+    def __init__(self, pythonVersions: list[str]) -> None:
+        import rich.progress
+
+        import rez_pip.utils
+
+        self._progress = rich.progress.Progress(
+            "[progress.description]{task.description}",
+            rich.progress.BarColumn(),
+            transient=True,
+            console=rez_pip.utils.CONSOLE,
+        )
+        self._tasks = {
+            pythonVersion: self._progress.add_task(
+                f"[bold]python-{pythonVersion}[/]: waiting", total=None
+            )
+            for pythonVersion in pythonVersions
+        }
+
+    def __enter__(self) -> _WorkersProgress:
+        self._progress.start()
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self._progress.stop()
+
+    def update(
+        self,
+        pythonVersion: str,
+        description: str,
+        completed: float,
+        total: float | None,
+    ) -> None:
+        import rich.markup
+
+        self._progress.update(
+            self._tasks[pythonVersion],
+            description=f"[bold]python-{pythonVersion}[/]: {rich.markup.escape(description)}",
+            completed=completed,
+            total=total,
+        )
+
+    def finish(self, pythonVersion: str) -> None:
+        self.update(pythonVersion, "done", 1, 1)
+
+    def drain(
+        self,
+        progressQueue: multiprocessing.SimpleQueue[
+            tuple[str, str, float, float | None]
+        ],
+    ) -> None:
+        """Apply the progress sent by the workers so far."""
+        while not progressQueue.empty():
+            self.update(*progressQueue.get())
+
+
+#: Last progress sent by _reportProgress (completed, total and time).
+_lastProgress: tuple[float | None, float | None, float] = (None, None, 0.0)
+
+
+def _reportProgress(
+    description: str, completed: float = 0, total: float | None = None
+) -> None:
+    """
+    Send the progress of the Python version processed by the current worker process
+    to the parent process (see ``--jobs``). Does nothing outside of worker processes.
+
+    :param description: What the worker is doing.
+    :param completed: Number of steps completed.
+    :param total: Number of steps. None if unknown.
+    """
+    global _lastProgress
+
+    pythonVersion = _pythonVersionFilter.pythonVersion
+    if _progressQueue is None or pythonVersion is None:
+        return
+
+    # The description changes for every chunk that is downloaded. Don't flood the queue.
+    now = time.monotonic()
+    if (completed, total) == _lastProgress[:2] and now - _lastProgress[2] < 0.1:
+        return
+    _lastProgress = (completed, total, now)
+
+    _progressQueue.put((pythonVersion, description, completed, total))
+
+
+class _PythonVersionFilter(logging.Filter):
+    """Prefix log records with the Python version being processed by a worker."""
+
+    pythonVersion: str | None = None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        import rich.markup
+
+        if self.pythonVersion:
+            record.msg = rich.markup.escape(f"[python-{self.pythonVersion}] ") + str(
+                record.msg
+            )
+        return True
+
+
+_pythonVersionFilter = _PythonVersionFilter()
+
+
+def _initWorker(
+    logQueue: multiprocessing.Queue[logging.LogRecord],
+    progressQueue: multiprocessing.SimpleQueue[tuple[str, str, float, float | None]],
+    lock: typing.ContextManager[typing.Any],
+    logLevel: int,
+    trace: bool,
+) -> None:
+    """Initialize a worker process. See :func:`_runParallel`."""
+    import rez_pip.utils
+    import rez_pip.plugins
+
+    if trace:
+        rez_pip.trace.start()
+
+    global _createPackageLock, _progressQueue
+    _createPackageLock = lock
+    _progressQueue = progressQueue
+
+    # The parent process owns the terminal, so don't draw status spinners or progress
+    # bars from the workers. Their progress is sent to the parent (see _reportProgress).
+    rez_pip.utils.CONSOLE.quiet = True
+
+    handler = logging.handlers.QueueHandler(logQueue)
+    handler.addFilter(_pythonVersionFilter)
+
+    rootLogger = logging.getLogger("rez_pip")
+    for existingHandler in list(rootLogger.handlers):
+        rootLogger.removeHandler(existingHandler)
+    rootLogger.addHandler(handler)
+    rootLogger.setLevel(logLevel)
+
+    # Initialize the plugin system
+    rez_pip.plugins.getManager()
+
+
+def _runWorker(
+    args: argparse.Namespace,
+    pipArgs: list[str],
+    pipWorkArea: str,
+    pythonVersion: str,
+    pythonExecutable: str,
+) -> tuple[int, list[dict[str, typing.Any]]]:
+    """
+    :returns: The number of rez packages created and the trace events recorded
+        by the worker (see ``--trace``).
+    """
+    _pythonVersionFilter.pythonVersion = pythonVersion
+    try:
+        with rez_pip.trace.span(f"python-{pythonVersion}", "python"):
+            created = _runForPythonVersion(
+                args, pipArgs, pipWorkArea, pythonVersion, pythonExecutable
+            )
+        return created, rez_pip.trace.collect()
+    finally:
+        _pythonVersionFilter.pythonVersion = None
+
+
+def _claimPurePackageGroup(pipWorkArea: str, key: str) -> bool:
+    """
+    Claim a group of pure python packages (see :func:`rez_pip.rez.getPurePackageGroupKey`)
+    for the current python version. Python versions can be processed by different
+    processes (see ``--jobs``), so claims are files created in the work area.
+
+    Claims are removed with the installed wheels, after each manifest entry.
+
+    :returns: True if the group was not already claimed.
+    """
+    claimsDir = os.path.join(pipWorkArea, "installed", ".pure")
+    os.makedirs(claimsDir, exist_ok=True)
+    try:
+        os.close(
+            os.open(os.path.join(claimsDir, key), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        )
+    except FileExistsError:
+        return False
+    return True
+
+
+def _runForPythonVersion(
+    args: argparse.Namespace,
+    pipArgs: list[str],
+    pipWorkArea: str,
+    pythonVersion: str,
+    pythonExecutable: str,
+) -> int:
+    """
+    Resolve, download, install and convert the requested packages for a single Python version.
+
+    :returns: Number of rez packages created.
+    """
+    import rez.version
+    import rich.markup
+
+    import rez_pip.pip
+    import rez_pip.rez
+    import rez_pip.patch
+    import rez_pip.utils
+    import rez_pip.plugins
+    import rez_pip.install
+    import rez_pip.pipeline
+
+    _LOG.info(
+        f"[bold underline]Installing requested packages for Python {pythonVersion}"
+    )
+
+    wheelsDir = os.path.join(pipWorkArea, "wheels")
+    os.makedirs(wheelsDir, exist_ok=True)
+
+    # Suffix with the python version because we loop over multiple versions,
+    # and package versions, content, etc can differ for each Python version.
+    installedWheelsDir = os.path.join(pipWorkArea, "installed", pythonVersion)
+    os.makedirs(installedWheelsDir, exist_ok=True)
+
+    resolveCache = None if args.no_resolve_cache else _getResolveCache(args)
+
+    if args.prefer_cached_wheels and not args.no_wheel_cache:
+        pipArgs = ["--find-links", _getWheelCache(args).writeFindLinks(), *pipArgs]
+
+    _reportProgress("resolving dependencies")
+    with rez_pip.utils.CONSOLE.status(
+        f"[bold]Resolving dependencies for {rich.markup.escape(', '.join(args.packages))} (python-{pythonVersion})"
+    ):
+        packages = rez_pip.pip.getPackages(
+            args.packages,
+            args.pip,
+            pythonVersion,
+            pythonExecutable,
+            args.requirement or [],
+            args.constraint or [],
+            pipArgs,
+            resolveCache=resolveCache,
+            timeout=args.pip_timeout,
+        )
+
+    _LOG.info(f"Resolved {len(packages)} dependencies for python {pythonVersion}")
+    _packageGroups: list[rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo]] = list(
+        itertools.chain(*rez_pip.plugins.getHook().groupPackages(packages=packages))  # type: ignore[arg-type]
+    )
+
+    # TODO: Verify that no packages are in two or more groups? It should theorically
+    # not be possible since plugins are called one after the other? But it could happen
+    # if a plugin forgets to pop items from the package list... The problem is that we
+    # can't know which plugin did what, so we could only say "something went wrong"
+    # and can't point to which plugin is at fault.
+
+    # Remove empty groups
+    _packageGroups = [group for group in _packageGroups if group]
+
+    # Add packages that were not grouped.
+    _packageGroups += [
+        rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo](tuple([package]))
+        for package in packages
+    ]
+
+    # Variants that already exist would be skipped when creating the rez packages.
+    # Don't download and install them at all.
+    existingGroups: list[rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo]] = []
+    remainingGroups: list[rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo]] = []
+    for group in _packageGroups:
+        exists = rez_pip.rez.packageGroupExists(
+            group,
+            rez.version.Version(pythonVersion),
+            prefix=args.prefix,
+            release=args.release,
+        )
+        (existingGroups if exists else remainingGroups).append(group)
+
+    if existingGroups:
+        _LOG.info(
+            f"Skipping {len(existingGroups)} packages that already exist: "
+            + ", ".join(
+                f"{package.name}=={package.version}"
+                for group in existingGroups
+                for package in group.packages
+            )
+        )
+        _packageGroups = remainingGroups
+
+    # Pure wheels create the same variant for all python versions. Only the first
+    # python version to get to them installs them, the others skip them. The tags
+    # of the wheels tell which groups might be pure. The WHEEL files, read once the
+    # wheels are downloaded, tell if they really are (see install()).
+    pureKeys: dict[tuple[str, ...], str] = {}
+    for group in _packageGroups:
+        key = rez_pip.rez.getPurePackageGroupKey(
+            group,
+            rez.version.Version(pythonVersion),
+            prefix=args.prefix,
+            release=args.release,
+        )
+        if key is not None:
+            pureKeys[tuple(group.downloadUrls)] = key
+
+    # Groups skipped because another python version installed them.
+    claimedGroups: list[rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]] = []
+
+    groupPositions = {
+        tuple(group.downloadUrls): position
+        for position, group in enumerate(_packageGroups)
+    }
+
+    # Download, install and create the rez packages as a pipeline. A group moves
+    # to the next step as soon as it's ready. For example, small wheels can be installed
+    # while a big wheel is still downloading.
+    _LOG.info("[bold]Downloading...")
+
+    downloadProgress = "downloading"
+    numCreated = 0
+
+    def reportProgress() -> None:
+        _reportProgress(
+            f"{downloadProgress}, created {numCreated}/{len(_packageGroups)} packages",
+            numCreated,
+            len(_packageGroups),
+        )
+
+    def onDownloadProgress(
+        downloadedPackages: int, numPackages: int, downloaded: int, total: int
+    ) -> None:
+        import rich.filesize
+
+        nonlocal downloadProgress
+        downloadProgress = f"downloaded {downloadedPackages}/{numPackages} wheels ({rich.filesize.decimal(downloaded)}/{rich.filesize.decimal(total)})"
+        reportProgress()
+
+    reportProgress()
+
+    def download(
+        emit: typing.Callable[
+            [rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]], None
+        ],
+    ) -> None:
+        rez_pip.download.downloadPackages(
+            _packageGroups,
+            wheelsDir,
+            wheelCache=None if args.no_wheel_cache else _getWheelCache(args),
+            settings=_getDownloadSettings(args),
+            onGroupDownloaded=emit,
+            onProgress=onDownloadProgress,
+        )
+
+    def install(
+        group: rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact],
+    ) -> rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]:
+        wheels = [
+            rez_pip.install.readWheelMetadata(package.path)
+            for package in group.packages
+        ]
+
+        key = pureKeys.get(tuple(group.downloadUrls))
+        if (
+            key is not None
+            and all(wheel.isPure for wheel in wheels)
+            and not _claimPurePackageGroup(pipWorkArea, key)
+        ):
+            _LOG.info(
+                "Skipping pure python package already installed for another python version: "
+                + ", ".join(
+                    f"{package.name}=={package.version}" for package in group.packages
+                )
+            )
+            claimedGroups.append(group)
+            return group
+
+        group.wheels.extend(wheels)
+
+        # Each wheel is installed in its own directory, so multiple groups can
+        # be installed concurrently.
+        for package in group.packages:
+            targetPath = os.path.join(installedWheelsDir, package.name)
+            if args.direct_install:
+                # Only the metadata is needed to create the package. The wheel will
+                # be installed directly into the variant.
+                dist = rez_pip.install.extractMetadata(
+                    package, package.path, targetPath
+                )
+            else:
+                _LOG.info(f"[bold]Installing {package.name!r} {package.path!r}")
+                dist = rez_pip.install.installWheel(package, package.path, targetPath)
+            group.dists.append(dist)
+        return group
+
+    def runHooks(
+        group: rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact],
+    ) -> None:
+        # Plugin hooks run in a single thread, one distribution at a time. Plugins
+        # don't have to be thread safe.
+        if not args.direct_install:
+            for package, dist in zip(group.packages, group.dists):
+                targetPath = os.path.join(installedWheelsDir, package.name)
+                record = rez_pip.install.Record(dist, targetPath)
+                rez_pip.install.cleanup(dist, targetPath, record=record)
+                rez_pip.patch.patch(dist, targetPath, record=record)
+                record.write()
+                group.manifests.append(
+                    rez_pip.install.buildFileManifest(dist, targetPath)
                 )
 
+    def create(
+        group: rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact],
+    ) -> rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]:
+        nonlocal numCreated
+
+        if any(group is claimed for claimed in claimedGroups):
+            numCreated += 1
+            reportProgress()
+            return group
+
+        # Patches (patch_ng) and the creation of the packages (rez) change the
+        # current directory of the process. They must never run concurrently,
+        # so the hooks run in the same thread as the creation of the packages.
+        runHooks(group)
+
+        def installDirectly(root: str) -> None:
+            # The hooks run in place, in the variant. This stage is single
+            # threaded, so they still run one at a time.
+            for package in group.packages:
+                _LOG.info(f"[bold]Installing {package.name!r} {package.path!r}")
+                dist = rez_pip.install.installWheel(package, package.path, root)
+                record = rez_pip.install.Record(dist, root)
+                rez_pip.install.cleanup(dist, root, record=record)
+                rez_pip.patch.patch(dist, root, record=record)
+                record.write()
+
+        with _createPackageLock or contextlib.nullcontext():
+            rez_pip.rez.createPackage(
+                group,
+                rez.version.Version(pythonVersion),
+                installedWheelsDir,
+                prefix=args.prefix,
+                release=args.release,
+                fileTransfer=args.file_transfer,
+                installDirectly=installDirectly if args.direct_install else None,
+            )
+
+        numCreated += 1
+        reportProgress()
+        return group
+
+    packageGroups, stats = rez_pip.pipeline.runPipeline(
+        download,
+        [
+            rez_pip.pipeline.Stage("install", install, workers=args.install_workers),
+            # Installs finish in any order. Plugin hooks and the creation of the
+            # packages see the groups in the order they were resolved in.
+            rez_pip.pipeline.Stage(
+                "create",
+                create,
+                order=lambda group: groupPositions[tuple(group.downloadUrls)],
+            ),
+        ],
+        producerName="download",
+    )
+
+    packageGroups = [
+        group
+        for group in packageGroups
+        if not any(group is claimed for claimed in claimedGroups)
+    ]
+
+    foundLocally = downloaded = 0
+    for group in packageGroups:
+        for package in group.packages:
+            if not package.isDownloadRequired():
+                foundLocally += 1
+            else:
+                downloaded += 1
+
+    message = f"Downloaded {downloaded} wheels"
+    if foundLocally:
+        message += f", skipped {foundLocally} because they resolved to local files"
+    if existingGroups:
+        message += f", skipped {len(existingGroups)} packages that already exist"
+    if claimedGroups:
+        message += f", skipped {len(claimedGroups)} pure python packages already installed for another python version"
+
+    _LOG.info(f"[bold]{message}")
+    _LOG.info(
+        f"[bold]Created {len(packageGroups)} rez packages for python {pythonVersion} in {stats}"
+    )
+    return len(packageGroups)
+
 
 def _debug(
-    args: argparse.Namespace, console: rich.console.Console = rez_pip.utils.CONSOLE
+    args: argparse.Namespace, console: rich.console.Console | None = None
 ) -> None:
     """Print debug information"""
+    import rich
+    import rich.text
+    import rich.panel
+
+    import rez_pip.pip
+    import rez_pip.utils
+    from rez_pip.compat import importlib_metadata
+
+    console = console or rez_pip.utils.CONSOLE
     prefix = "  "
     console.print(
         f"[bold]rez-pip version[/]: {importlib_metadata.version(__package__)}"
@@ -350,9 +1282,7 @@ def _debug(
     )
 
     console.print(f"[bold]rez python packages[/]:", highlight=False)
-    for pythonVersion, pythonExecutable in rez_pip.rez.getPythonExecutables(
-        args.python_version
-    ).items():
+    for pythonVersion, pythonExecutable in _getPythonExecutables(args).items():
         print(textwrap.indent(f"{pythonExecutable} ({pythonVersion})", prefix))
 
     print()
@@ -372,7 +1302,84 @@ def _debug(
     )
 
 
+def _runCacheCommand(args: argparse.Namespace) -> None:
+    """Implements "rez-pip cache [info|prune|clear|export <directory>]"."""
+    import rich.table
+
+    import rez_pip.utils
+
+    action = args.packages[1] if len(args.packages) > 1 else "info"
+    valid = (action in ("info", "prune", "clear") and len(args.packages) <= 2) or (
+        action == "export" and len(args.packages) == 3
+    )
+    if not valid:
+        raise rez_pip.exceptions.RezPipError(
+            "Usage: rez-pip cache [info|prune|clear|export <directory>]. "
+            f"Got {' '.join(args.packages)!r}"
+        )
+
+    wheelCache = _getWheelCache(args)
+    resolveCache = _getResolveCache(args)
+    interpreterCache = _getInterpreterCache(args)
+
+    if action == "export":
+        exported = wheelCache.export(args.packages[2])
+        rez_pip.utils.CONSOLE.print(
+            f"Exported {len(exported)} wheels to {args.packages[2]!r}. Use them with "
+            f"'--no-index --find-links {args.packages[2]}' or serve the directory and use "
+            "'--index-url <url>/simple/'"
+        )
+        return
+
+    if action == "prune":
+        evicted = wheelCache.prune()
+        expired = resolveCache.prune()
+        unused = interpreterCache.prune()
+        rez_pip.utils.CONSOLE.print(
+            f"Evicted {len(evicted)} wheels ({rez_pip.cache.formatSize(sum(entry.size for entry in evicted))}), "
+            f"removed {len(expired)} expired resolves and {len(unused)} unused interpreter lookups"
+        )
+    elif action == "clear":
+        wheelCache.clear()
+        resolveCache.clear()
+        interpreterCache.clear()
+        rez_pip.utils.CONSOLE.print(f"Cleared caches in {_getCacheDir(args)!r}")
+
+    table = rich.table.Table("Cache", "Path", "Entries", "Size", box=None)
+
+    wheels = wheelCache.entries()
+    table.add_row(
+        "wheels",
+        wheelCache.path,
+        str(len(wheels)),
+        f"{rez_pip.cache.formatSize(sum(entry.size for entry in wheels))} / {rez_pip.cache.formatSize(wheelCache.maxSize)}",
+    )
+
+    resolves = resolveCache.entries()
+    table.add_row(
+        "resolve",
+        resolveCache.path,
+        str(len(resolves)),
+        rez_pip.cache.formatSize(sum(entry.size for entry in resolves)),
+    )
+
+    interpreters = interpreterCache.entries()
+    table.add_row(
+        "interpreters",
+        interpreterCache.path,
+        str(len(interpreters)),
+        rez_pip.cache.formatSize(sum(entry.size for entry in interpreters)),
+    )
+
+    rez_pip.utils.CONSOLE.print(table)
+
+
 def _printPlugins() -> None:
+    import rich.table
+
+    import rez_pip.utils
+    import rez_pip.plugins
+
     table = rich.table.Table("Name", "Hooks", box=None)
     for plugin, hooks in rez_pip.plugins._getHookImplementations().items():
         table.add_row(plugin, ", ".join(hooks))
@@ -394,6 +1401,18 @@ def run(
         print("Noop mode enabled")
         return 0
 
+    import rich.logging
+
+    import rez_pip.pip
+    import rez_pip.utils
+    import rez_pip.plugins
+
+    if args.pip is None:
+        args.pip = rez_pip.pip.getBundledPip()
+
+    if args.trace:
+        rez_pip.trace.start()
+
     # Initialize the plugin system
     rez_pip.plugins.getManager()
 
@@ -402,6 +1421,10 @@ def run(
         return 0
 
     try:
+        if args.packages[:1] == ["cache"]:
+            _runCacheCommand(args)
+            return 0
+
         _validateArgs(args)
 
         handler = rich.logging.RichHandler(
@@ -420,12 +1443,27 @@ def run(
             _debug(args)
             return 0
 
-        _run(args, pipArgs, pipWorkArea)
+        if args.manifest:
+            import rez_pip.manifest
+
+            with rez_pip.trace.span("rez-pip", "cli", manifest=args.manifest):
+                results = _runManifest(args, pipArgs, pipWorkArea)
+            _printManifestResults(results)
+            if args.manifest_report:
+                rez_pip.manifest.writeReport(results, args.manifest_report)
+            return 0 if all(result.succeeded for result in results) else 1
+
+        with rez_pip.trace.span("rez-pip", "cli", packages=args.packages):
+            _run(args, pipArgs, pipWorkArea)
         return 0
     except rez_pip.exceptions.RezPipError as exc:
         rez_pip.utils.CONSOLE.print(exc, soft_wrap=True)
         return 1
     finally:
+        if args.trace:
+            rez_pip.trace.write(rez_pip.trace.stop(), args.trace)
+            _LOG.info(f"Trace written to {args.trace!r}")
+
         if not args.keep_tmp_dirs:
             _LOG.debug(f"Removing {pipWorkArea}")
             shutil.rmtree(pipWorkArea)
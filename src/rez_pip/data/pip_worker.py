@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+pip process started ahead of time, see :func:`rez_pip.pip.startPipProcess`.
+
+It's run by the python interpreter packages are resolved for, which can be
+any version supported by pip. Don't use anything newer than Python 3.7 here.
+
+Usage: <python> pip_worker.py <path to pip.pyz>
+
+pip and the modules it needs to resolve are imported right away, and a line
+that says so is written to stdout. Then a single line is read from stdin: the
+arguments of the pip command to run, as a JSON list. The command runs like
+``<python> pip.pyz <args>`` would, and the process exits with pip's exit code.
+A process never runs more than one command, since pip doesn't support being run
+more than once per interpreter.
+
+The process exits without running anything if stdin is closed before a command
+is received.
+"""
+
+import os
+import sys
+import json
+
+
+def main() -> int:
+    if not os.path.isfile(sys.argv[1]):
+        sys.stderr.write(f"pip worker: {sys.argv[1]!r} doesn't exist\n")
+        return 1
+
+    # Don't let anything next to this script shadow pip or its dependencies.
+    del sys.path[0]
+    sys.path.insert(0, sys.argv[1])
+
+    from pip._internal.cli.main import main as pipMain
+
+    # These are imported by pip when the command runs. This is where most of
+    # the import time goes.
+    import pip._internal.commands.install  # noqa: F401
+    import pip._internal.resolution.resolvelib.resolver  # noqa: F401
+
+    # See rez_pip.pip._PIP_PROCESS_READY
+    sys.stdout.write("rez-pip: pip is ready\n")
+    sys.stdout.flush()
+
+    line = sys.stdin.readline()
+    if not line:
+        return 0
+
+    args = json.loads(line)
+    sys.argv = [sys.argv[1], *args]
+    return pipMain(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
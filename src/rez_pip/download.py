@@ -5,83 +5,340 @@
 from __future__ import annotations
 
 import os
+import json
+import time
+import shutil
 import typing
+import random
 import asyncio
 import hashlib
 import logging
-import collections
+import dataclasses
 
-import aiohttp
-import rich.progress
+import rez_pip.trace
+import rez_pip.exceptions
 
-import rez_pip.pip
-import rez_pip.utils
-from rez_pip.compat import importlib_metadata
+if typing.TYPE_CHECKING:
+    # aiohttp and rich are slow to import. They are only imported
+    # once something is downloaded (see _downloadPackages).
+    import aiohttp
+    import rich.progress
+
+    import rez_pip.pip
+    import rez_pip.cache
 
 _LOG = logging.getLogger(__name__)
-_lock = asyncio.Lock()
+
+#: Hash algorithms that pip supports, in order of preference.
+SUPPORTED_HASHES = ("sha256", "sha384", "sha512")
+
+#: HTTP status codes that are retried.
+TRANSIENT_STATUSES = frozenset([408, 425, 429, 500, 502, 503, 504])
+
+
+@dataclasses.dataclass(frozen=True)
+class DownloadSettings:
+    """Settings of the downloader."""
+
+    #: Maximum number of simultaneous connections.
+    maxConnections: int = 16
+
+    #: Maximum number of simultaneous connections to a single host.
+    maxConnectionsPerHost: int = 8
+
+    #: Number of seconds idle connections are kept alive for reuse.
+    keepAlive: float = 30
+
+    #: Number of times a download is retried after a transient failure.
+    retries: int = 5
+
+    #: Base delay (in seconds) of the exponential backoff between retries.
+    backoff: float = 0.5
+
+    #: Maximum delay (in seconds) between retries.
+    maxBackoff: float = 30
+
+    #: Timeout (in seconds) to establish a connection.
+    connectTimeout: float = 30
+
+    #: Timeout (in seconds) between two reads of the response body.
+    readTimeout: float = 60
+
+
+class _DownloadProgress:
+    """
+    Progress of the downloads. The totals are kept in counters, so updating them
+    doesn't depend on the number of packages.
+
+    When the console is a terminal, rich shows a progress bar for each download in
+    flight and one for the total. Otherwise, nothing is created per package and
+    the total is logged from time to time.
+
+    :param onUpdate: Called with the number of packages downloaded, the number of
+        packages to download, the number of bytes downloaded and the number of bytes
+        to download every time the totals change.
+    """
+
+    #: Minimum number of seconds between two logs when the console is not a terminal.
+    LOG_INTERVAL = 10.0
+
+    def __init__(
+        self,
+        live: bool,
+        onUpdate: typing.Callable[[int, int, int, int], None] | None = None,
+    ) -> None:
+        #: Number of packages to download.
+        self.numPackages = 0
+        #: Number of packages downloaded.
+        self.completedPackages = 0
+        #: Number of bytes to download.
+        self.total = 0
+        #: Number of bytes downloaded.
+        self.completed = 0
+
+        self._progress: rich.progress.Progress | None = None
+        self._mainTask: rich.progress.TaskID | None = None
+        self._lastLog = 0.0
+        self._onUpdate = onUpdate
+
+        if live:
+            import rich.progress
+
+            import rez_pip.utils
+
+            self._progress = rich.progress.Progress(
+                "[progress.description]{task.description}",
+                "[progress.percentage]{task.percentage:>3.0f}%",
+                rich.progress.BarColumn(),
+                rich.progress.DownloadColumn(),
+                rich.progress.TransferSpeedColumn(),
+                transient=True,
+                console=rez_pip.utils.CONSOLE,
+            )
+
+    def addPackage(self, name: str) -> _PackageProgress:
+        """Add a package to download. Must be called before entering the context."""
+        self.numPackages += 1
+
+        taskID = None
+        if self._progress is not None:
+            # Hidden until the download starts, so that only the downloads
+            # in flight are rendered.
+            taskID = self._progress.add_task(name, visible=False)
+        return _PackageProgress(self, taskID)
+
+    def __enter__(self) -> _DownloadProgress:
+        self._lastLog = time.monotonic()
+        if self._progress is not None:
+            # Created after the packages, so that the total is at the bottom.
+            self._mainTask = self._progress.add_task(self._getDescription(), total=0)
+            self._progress.start()
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        if self._progress is not None:
+            self._progress.stop()
+
+    def _getDescription(self) -> str:
+        return f"[bold]Total ({self.completedPackages}/{self.numPackages})"
+
+    def _updateTask(
+        self, taskID: rich.progress.TaskID | None, **kwargs: typing.Any
+    ) -> None:
+        if self._progress is not None and taskID is not None:
+            self._progress.update(taskID, **kwargs)
+
+    def _notify(self) -> None:
+        if self._onUpdate is not None:
+            self._onUpdate(
+                self.completedPackages, self.numPackages, self.completed, self.total
+            )
+
+    def _advance(self, total: int = 0, completed: int = 0) -> None:
+        self.total += total
+        self.completed += completed
+        self._updateTask(self._mainTask, total=self.total, completed=self.completed)
+        self._notify()
+
+    def _complete(self, taskID: rich.progress.TaskID | None) -> None:
+        self.completedPackages += 1
+        self._notify()
+
+        if self._progress is not None and self._mainTask is not None:
+            if taskID is not None:
+                self._progress.remove_task(taskID)
+            self._progress.update(self._mainTask, description=self._getDescription())
+            return
+
+        now = time.monotonic()
+        if (
+            self.completedPackages == self.numPackages
+            or now - self._lastLog >= self.LOG_INTERVAL
+        ):
+            import rich.filesize
+
+            self._lastLog = now
+            _LOG.info(
+                f"Downloaded {self.completedPackages}/{self.numPackages} wheels "
+                f"({rich.filesize.decimal(self.completed)})"
+            )
+
+
+class _PackageProgress:
+    """Progress of the download of a single package (see :class:`_DownloadProgress`)."""
+
+    def __init__(
+        self, progress: _DownloadProgress, taskID: rich.progress.TaskID | None
+    ) -> None:
+        self._progress = progress
+        self._taskID = taskID
+
+        # Size that was added to the total. It must only be added once,
+        # even if we have to retry.
+        self._size = 0
+        # Number of bytes of this download accounted for in the total.
+        self.counted = 0
+
+    def start(self, size: int, offset: int) -> None:
+        """
+        Called when a response is received.
+
+        :param size: Size of the whole file.
+        :param offset: Number of bytes already downloaded (when resuming).
+        """
+        self._progress._updateTask(
+            self._taskID, total=size, completed=offset, visible=True
+        )
+
+        if size != self._size:
+            self._progress._advance(total=size - self._size)
+            self._size = size
+        self.count(offset)
+
+    def advance(self, value: int) -> None:
+        """Called when value bytes were written."""
+        self._progress._updateTask(self._taskID, advance=value)
+        self.count(self.counted + value)
+
+    def count(self, value: int) -> None:
+        """Set the number of bytes of this download accounted for in the total."""
+        self._progress._advance(completed=value - self.counted)
+        self.counted = value
+
+    def finish(self) -> None:
+        """Called when the package is downloaded."""
+        self._progress._complete(self._taskID)
 
 
 def downloadPackages(
     packageGroups: list[rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo]],
     dest: str,
+    wheelCache: rez_pip.cache.WheelCache | None = None,
+    settings: DownloadSettings | None = None,
+    onGroupDownloaded: (
+        typing.Callable[
+            [rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]], None
+        ]
+        | None
+    ) = None,
+    onProgress: typing.Callable[[int, int, int, int], None] | None = None,
 ) -> list[rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]]:
-    return asyncio.run(_downloadPackages(packageGroups, dest))
+    """
+    Download the wheels of the given package groups.
+
+    :param packageGroups: Package groups to download.
+    :param dest: Directory where wheels are downloaded to.
+    :param wheelCache: Persistent wheel cache. Wheels found in the cache are not
+        downloaded and downloaded wheels are added to it.
+    :param settings: Settings of the downloader (concurrency, retries, timeouts).
+    :param onGroupDownloaded: Called with each package group as soon as all its
+        artifacts are downloaded, while other downloads continue. It's called from
+        a worker thread and can block (the other downloads are not blocked).
+    :param onProgress: Called with the number of packages downloaded, the number of
+        packages to download, the number of bytes downloaded and the number of bytes
+        to download every time the totals change.
+    :returns: Package groups with their downloaded artifacts, in the same order.
+    """
+    return asyncio.run(
+        _downloadPackages(
+            packageGroups,
+            dest,
+            wheelCache=wheelCache,
+            settings=settings,
+            onGroupDownloaded=onGroupDownloaded,
+            onProgress=onProgress,
+        )
+    )
 
 
 async def _downloadPackages(
     packageGroups: list[rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo]],
     dest: str,
+    wheelCache: rez_pip.cache.WheelCache | None = None,
+    settings: DownloadSettings | None = None,
+    onGroupDownloaded: (
+        typing.Callable[
+            [rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]], None
+        ]
+        | None
+    ) = None,
+    onProgress: typing.Callable[[int, int, int, int], None] | None = None,
 ) -> list[rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]]:
-    newPackageGroups: list[rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]] = (
-        []
+    import aiohttp
+
+    import rez_pip.pip
+    import rez_pip.utils
+
+    settings = settings or DownloadSettings()
+    loop = asyncio.get_running_loop()
+
+    # The connector bounds the number of connections. Downloads that can't get
+    # a connection wait for one to be released.
+    connector = aiohttp.TCPConnector(
+        limit=settings.maxConnections,
+        limit_per_host=settings.maxConnectionsPerHost,
+        keepalive_timeout=settings.keepAlive,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=None,
+        sock_connect=settings.connectTimeout,
+        sock_read=settings.readTimeout,
     )
-    someFailed = False
-
-    async with aiohttp.ClientSession() as session:
-        with rich.progress.Progress(
-            "[progress.description]{task.description}",
-            "[progress.percentage]{task.percentage:>3.0f}%",
-            rich.progress.BarColumn(),
-            rich.progress.DownloadColumn(),
-            rich.progress.TransferSpeedColumn(),
-            transient=True,
-            console=rez_pip.utils.CONSOLE,
-        ) as progress:
-            tasks: dict[str, rich.progress.TaskID] = {}
-
-            # Create all the download tasks first
-            numPackages = 0
-            for group in packageGroups:
-                for package in group.packages:
-                    if not package.isDownloadRequired():
-                        continue
 
-                    numPackages += 1
-                    tasks[package.name] = progress.add_task(package.name)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        progress = _DownloadProgress(
+            live=rez_pip.utils.CONSOLE.is_terminal, onUpdate=onProgress
+        )
+        packageProgresses: dict[str, _PackageProgress] = {}
 
-            # Then create the "total" progress bar. This ensures that total is at the bottom.
-            mainTask = progress.add_task(f"[bold]Total (0/{numPackages})", total=0)
+        # Add all the downloads first.
+        for group in packageGroups:
+            for package in group.packages:
+                if package.isDownloadRequired():
+                    packageProgresses[package.name] = progress.addPackage(package.name)
 
-            futures: list[
+        with progress:
+            groupFutures: list[
                 typing.Coroutine[
                     typing.Any,
                     typing.Any,
-                    rez_pip.pip.DownloadedArtifact | None,
+                    rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact] | None,
                 ]
             ] = []
 
-            groupMapping: collections.defaultdict[int, list[str]] = (
-                collections.defaultdict(list)
-            )
+            for group in packageGroups:
+                futures: list[
+                    typing.Coroutine[
+                        typing.Any,
+                        typing.Any,
+                        rez_pip.pip.DownloadedArtifact | None,
+                    ]
+                ] = []
 
-            for index, group in enumerate(packageGroups):
                 for package in group.packages:
                     wheelName: str = os.path.basename(package.download_info.url)
                     wheelPath = os.path.join(dest, wheelName)
 
-                    groupMapping[index].append(package.name)
-
                     if not package.isDownloadRequired():
 
                         # Note the subtlety of having to pass variables in the function
@@ -99,45 +356,91 @@ async def _downloadPackages(
                             _download(
                                 package,
                                 session,
-                                progress,
-                                tasks[package.name],
-                                mainTask,
+                                packageProgresses[package.name],
                                 wheelName,
                                 wheelPath,
+                                wheelCache,
+                                settings,
                             )
                         )
 
-            artifacts = tuple(await asyncio.gather(*futures))
+                groupFutures.append(_downloadGroup(futures, loop, onGroupDownloaded))
 
-            if not all(artifacts):
+            newPackageGroups = await asyncio.gather(*groupFutures)
+
+            if not all(newPackageGroups):
                 raise RuntimeError("Some wheels failed to be downloaded")
 
-            artifacts = typing.cast(
-                typing.Tuple[rez_pip.pip.DownloadedArtifact], artifacts
-            )
+    # Return artifacts in the same groups as they arrived in.
+    return typing.cast(
+        typing.List[rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]],
+        newPackageGroups,
+    )
 
-            # Return artifacts in the same groups as they arrived in.
-            # TODO: The amount of looping and gymnastic is a big code smell.
-            for packageNames in groupMapping.values():
-                newPackageGroups.append(
-                    rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact](
-                        tuple(
-                            artifact
-                            for artifact in artifacts
-                            if artifact.name in packageNames
-                        )
-                    )
-                )
 
-    return newPackageGroups
+async def _downloadGroup(
+    futures: list[
+        typing.Coroutine[typing.Any, typing.Any, rez_pip.pip.DownloadedArtifact | None]
+    ],
+    loop: asyncio.AbstractEventLoop,
+    onGroupDownloaded: (
+        typing.Callable[
+            [rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]], None
+        ]
+        | None
+    ),
+) -> rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact] | None:
+    """Download the artifacts of a group and hand the group over once they are all there."""
+    import rez_pip.pip
+
+    artifacts = await asyncio.gather(*futures)
+    if not all(artifacts):
+        return None
+
+    group = rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact](
+        tuple(typing.cast(typing.List[rez_pip.pip.DownloadedArtifact], artifacts))
+    )
+
+    if onGroupDownloaded:
+        # In a thread, so that the callback can block without blocking the other downloads.
+        await loop.run_in_executor(None, onGroupDownloaded, group)
 
+    return group
 
-def getSHA256(path: str) -> str:
+
+class HashMismatchError(rez_pip.exceptions.RezPipError):
+    """Raised when a downloaded file doesn't match the digest reported by pip."""
+
+
+def getExpectedHash(archiveInfo: rez_pip.pip.ArchiveInfo) -> tuple[str, str] | None:
+    """
+    Get the hash to verify an archive with. sha256 is preferred since it's also
+    the key of the wheel cache. The legacy "hash" field (``<algorithm>=<digest>``)
+    is used as a last resort.
+
+    :returns: The name of the hash algorithm and the expected hex digest, or None
+        if the archive has no usable hash.
+    """
+    names = [name for name in SUPPORTED_HASHES if name in archiveInfo.hashes]
+    names += sorted(
+        name
+        for name in archiveInfo.hashes
+        if name not in SUPPORTED_HASHES and name in hashlib.algorithms_guaranteed
+    )
+    if names:
+        return names[0], archiveInfo.hashes[names[0]].lower()
+
+    name, _, value = (archiveInfo.hash or "").partition("=")
+    if value and name in hashlib.algorithms_guaranteed:
+        return name, value.lower()
+
+    return None
+
+
+def _updateDigest(digestobj: typing.Any, path: str) -> None:
     buf = bytearray(2**18)  # Reusable buffer to reduce allocations.
     view = memoryview(buf)
 
-    digestobj = hashlib.new("sha256")
-
     with open(path, "rb") as fd:
         while True:
             size = fd.readinto(buf)
@@ -145,75 +448,338 @@ def getSHA256(path: str) -> str:
                 break  # EOF
             digestobj.update(view[:size])
 
+
+def getDigest(path: str, algorithm: str) -> str:
+    digestobj = hashlib.new(algorithm)
+    _updateDigest(digestobj, path)
     return digestobj.hexdigest()
 
 
+def getSHA256(path: str) -> str:
+    return getDigest(path, "sha256")
+
+
 async def _download(
     package: rez_pip.pip.PackageInfo,
     session: aiohttp.ClientSession,
-    progress: rich.progress.Progress,
-    taskID: rich.progress.TaskID,
-    mainTaskID: rich.progress.TaskID,
+    packageProgress: _PackageProgress,
     wheelName: str,
     wheelPath: str,
+    wheelCache: rez_pip.cache.WheelCache | None = None,
+    settings: DownloadSettings = DownloadSettings(),
 ) -> rez_pip.pip.DownloadedArtifact | None:
-    # TODO: Handle case where sha256 doesn't exist. We should also support the other supported
-    # hash types.
-    if (
-        os.path.exists(wheelPath)
-        and getSHA256(wheelPath) == package.download_info.archive_info.hashes["sha256"]
-    ):
-        _LOG.info(f"{wheelName} found in cache at {wheelPath!r}. Skipping download.")
-    else:
-        _LOG.debug(
-            f"Downloading {package.name}-{package.version} from {package.download_info.url}"
+    import rez_pip.pip
+
+    with rez_pip.trace.span(
+        wheelName, "download", url=package.download_info.url
+    ) as spanArgs:
+        expectedHash = getExpectedHash(package.download_info.archive_info)
+
+        # The wheel cache is keyed by sha256. When pip reports a sha256, it's also
+        # what downloads are verified with.
+        sha256 = package.download_info.archive_info.hashes.get("sha256")
+        cachedPath = (
+            wheelCache.get(sha256, wheelName) if wheelCache and sha256 else None
         )
 
-        async with session.get(
-            package.download_info.url,
-            headers={
-                "Content-Type": "application/octet-stream",
-                "User-Agent": f"rez-pip/{importlib_metadata.version('rez-pip')}",
-            },
-        ) as response:
-            size = int(response.headers.get("content-length", 0))
-            progress.update(taskID, total=size)
-
-            async with _lock:
-                mainTask = [task for task in progress.tasks if task.id == mainTaskID][0]
-
-                progress.update(
-                    mainTaskID,
-                    total=typing.cast(int, mainTask.total) + size,
+        if cachedPath:
+            _LOG.info(
+                f"{wheelName} found in the wheel cache at {cachedPath!r}. Skipping download."
+            )
+            wheelPath = cachedPath
+            spanArgs["cache"] = "wheel cache"
+        elif (
+            expectedHash
+            and os.path.exists(wheelPath)
+            and getDigest(wheelPath, expectedHash[0]) == expectedHash[1]
+        ):
+            _LOG.info(
+                f"{wheelName} found in cache at {wheelPath!r}. Skipping download."
+            )
+            spanArgs["cache"] = "download directory"
+        else:
+            if not expectedHash:
+                _LOG.warning(
+                    f"No hash available for {package.download_info.url}. It won't be verified."
                 )
 
-            if response.status != 200:
-                _LOG.error(
-                    f"failed to download {package.download_info.url}: {response.status} - {response.reason}, {response.request_info}"
-                )
-                return None
+            _LOG.debug(
+                f"Downloading {package.name}-{package.version} from {package.download_info.url}"
+            )
+
+            # Keep partial downloads in the wheel cache so that they can
+            # be resumed by the next run.
+            partialPath = (
+                wheelCache.getPartialPath(sha256, wheelName)
+                if wheelCache and sha256
+                else f"{wheelPath}.part"
+            )
+
+            # The wheels directory can be shared by multiple processes (see --jobs).
+            # Wheels that go to the cache are downloaded to a path private to this
+            # process, so that another process downloading the same wheel can't
+            # move it away before it's added to the cache.
+            downloadPath = (
+                f"{wheelPath}.{os.getpid()}" if wheelCache and sha256 else wheelPath
+            )
 
-            with open(wheelPath, "wb") as fd:
-                async for chunk, asd in response.content.iter_chunks():
-                    if not chunk:
-                        break
-                    fd.write(chunk)
-                    progress.update(taskID, advance=len(chunk))
-                    progress.update(mainTaskID, advance=len(chunk))
+            if not await _fetch(
+                package.download_info.url,
+                session,
+                packageProgress,
+                downloadPath,
+                settings,
+                partialPath=partialPath,
+                expectedHash=expectedHash,
+            ):
+                return None
 
+            spanArgs["bytes"] = os.stat(downloadPath).st_size
             _LOG.info(
-                f"Downloaded {package.name}-{package.version} to {wheelPath!r} ({os.stat(wheelPath).st_size} bytes)"
+                f"Downloaded {package.name}-{package.version} to {downloadPath!r} ({spanArgs['bytes']} bytes)"
             )
 
-    progress.update(taskID, visible=False)
+            if wheelCache and sha256:
+                # The download was verified against sha256 while it was written.
+                wheelPath = wheelCache.add(downloadPath, sha256, wheelName=wheelName)
 
-    total = len(progress.tasks) - 1
-    async with _lock:
-        completedItems = [task for task in progress.tasks if not task.visible]
-        progress.update(
-            mainTaskID, description=f"[bold]Total ({len(completedItems)}/{total})"
-        )
+    packageProgress.finish()
 
     return rez_pip.pip.DownloadedArtifact.from_dict(
         {"_localPath": wheelPath, **package.to_dict()}
     )
+
+
+class _TransientError(Exception):
+    """Raised when a download failed in a way that is worth retrying."""
+
+    def __init__(self, message: str, retryAfter: float | None = None) -> None:
+        super().__init__(message)
+        self.retryAfter = retryAfter
+
+
+def _getRetryAfter(response: aiohttp.ClientResponse) -> float | None:
+    """Get the delay requested by the server. Only delays in seconds are supported."""
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _getBackoffDelay(
+    attempt: int, settings: DownloadSettings, retryAfter: float | None = None
+) -> float:
+    """Exponential backoff with full jitter. Honors the server's Retry-After."""
+    delay = random.uniform(0, min(settings.maxBackoff, settings.backoff * 2**attempt))
+    if retryAfter is not None:
+        delay = max(delay, retryAfter)
+    return min(delay, settings.maxBackoff)
+
+
+def _getValidator(response: aiohttp.ClientResponse) -> str | None:
+    """
+    Get the validator to send in If-Range when resuming a download. Weak ETags
+    can't be used with If-Range, so fallback to Last-Modified.
+    """
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def _claimPartial(partialPath: str, url: str, privatePath: str) -> str | None:
+    """
+    Take ownership of a partial download by moving it to privatePath. Renaming is
+    atomic, so only one process can resume a given partial download.
+
+    :returns: The validator to resume the download with, or None if there is nothing to resume.
+    """
+    metadataPath = f"{partialPath}.json"
+    try:
+        with open(metadataPath, encoding="utf-8") as fd:
+            metadata = json.load(fd)
+        os.replace(partialPath, privatePath)
+    except (OSError, ValueError):
+        return None
+
+    if metadata.get("url") != url or not metadata.get("validator"):
+        os.remove(privatePath)
+        return None
+
+    return typing.cast(str, metadata["validator"])
+
+
+def _parkPartial(privatePath: str, partialPath: str, url: str, validator: str) -> None:
+    """Store a partial download so that it can be resumed later."""
+    try:
+        with open(f"{partialPath}.json", "w", encoding="utf-8") as fd:
+            json.dump({"url": url, "validator": validator}, fd)
+        os.replace(privatePath, partialPath)
+    except OSError as exc:
+        _LOG.debug(f"Failed to keep partial download {privatePath!r}: {exc}")
+
+
+async def _fetch(
+    url: str,
+    session: aiohttp.ClientSession,
+    packageProgress: _PackageProgress,
+    wheelPath: str,
+    settings: DownloadSettings,
+    partialPath: str | None = None,
+    expectedHash: tuple[str, str] | None = None,
+) -> bool:
+    """
+    Download url to wheelPath. Transient errors (see :data:`TRANSIENT_STATUSES`,
+    connection resets and timeouts) are retried with an exponential backoff.
+
+    Interrupted downloads are kept at partialPath with their ETag or Last-Modified value
+    and are resumed with a Range request when the server supports it. The server
+    sends the whole file again if it changed in the meantime (If-Range).
+
+    :param partialPath: Where to keep interrupted downloads.
+    :param expectedHash: Hash algorithm and expected digest. The digest is computed
+        while the file is written. A resumed download that doesn't match it is
+        downloaded again from scratch.
+    :raises HashMismatchError: If the downloaded file doesn't match expectedHash.
+    :returns: True if the download succeeded.
+    """
+    import aiohttp
+
+    from rez_pip.compat import importlib_metadata
+
+    partialPath = partialPath or f"{wheelPath}.part"
+
+    # Download to a file private to this process and move it in place once done. The wheels
+    # directory can be shared by multiple processes (see --jobs), and we don't
+    # want another process to see a partially written wheel.
+    privatePath = f"{partialPath}.{os.getpid()}"
+    os.makedirs(os.path.dirname(partialPath), exist_ok=True)
+
+    validator = _claimPartial(partialPath, url, privatePath)
+
+    digestobj = hashlib.new(expectedHash[0]) if expectedHash else None
+    # Number of bytes fed to digestobj.
+    hashed = 0
+
+    attempt = 0
+    while True:
+        retryAfter = None
+        offset = os.path.getsize(privatePath) if validator else 0
+
+        headers = {
+            "Content-Type": "application/octet-stream",
+            "User-Agent": f"rez-pip/{importlib_metadata.version('rez-pip')}",
+        }
+        if offset and validator:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 416:
+                    # Our partial download is not valid anymore. Start from scratch.
+                    validator = None
+                    raise _TransientError("416 - Range Not Satisfiable", retryAfter=0)
+
+                if response.status == 206 and response.headers.get(
+                    "Content-Range", ""
+                ).startswith(f"bytes {offset}-"):
+                    _LOG.debug(f"Resuming download of {url} at byte {offset}")
+                else:
+                    offset = 0
+
+                size = offset + int(response.headers.get("content-length", 0))
+                packageProgress.start(size, offset)
+
+                if response.status in TRANSIENT_STATUSES:
+                    raise _TransientError(
+                        f"{response.status} - {response.reason}",
+                        retryAfter=_getRetryAfter(response),
+                    )
+
+                if response.status not in (200, 206):
+                    _LOG.error(
+                        f"failed to download {url}: {response.status} - {response.reason}, {response.request_info}"
+                    )
+                    if os.path.exists(privatePath):
+                        os.remove(privatePath)
+                    return False
+
+                if response.headers.get("Accept-Ranges") == "bytes" or offset:
+                    validator = validator if offset else _getValidator(response)
+                else:
+                    validator = None
+
+                if expectedHash and hashed != offset:
+                    # Resuming a download from a previous run (or restarting).
+                    digestobj = hashlib.new(expectedHash[0])
+                    if offset:
+                        _updateDigest(digestobj, privatePath)
+                    hashed = offset
+
+                with open(privatePath, "ab" if offset else "wb") as fd:
+                    async for chunk, _ in response.content.iter_chunks():
+                        if not chunk:
+                            break
+                        fd.write(chunk)
+                        if digestobj:
+                            digestobj.update(chunk)
+                            hashed += len(chunk)
+                        packageProgress.advance(len(chunk))
+
+            if expectedHash and digestobj and digestobj.hexdigest() != expectedHash[1]:
+                validator = None
+                if offset:
+                    # Don't trust a resumed download that doesn't match.
+                    _LOG.warning(f"Resumed download of {url} is corrupted. Restarting.")
+                    raise _TransientError("corrupted resumed download", retryAfter=0)
+
+                os.remove(privatePath)
+                raise HashMismatchError(
+                    f"{url} doesn't match its {expectedHash[0]} digest. "
+                    f"Expected {expectedHash[1]}, got {digestobj.hexdigest()}"
+                )
+
+            # The partial download can be in the wheel cache, which might be on another
+            # file system.
+            shutil.move(privatePath, wheelPath)
+            for path in [partialPath, f"{partialPath}.json"]:
+                if os.path.exists(path):
+                    os.remove(path)
+            return True
+        except (
+            _TransientError,
+            aiohttp.ClientConnectionError,
+            aiohttp.ClientPayloadError,
+            asyncio.TimeoutError,
+            ConnectionResetError,
+        ) as exc:
+            error = str(exc) or exc.__class__.__name__
+            if isinstance(exc, _TransientError):
+                retryAfter = exc.retryAfter
+        except BaseException:
+            # Cancelled (Ctrl-C, etc). Keep what we have for the next run.
+            if validator and os.path.exists(privatePath):
+                _parkPartial(privatePath, partialPath, url, validator)
+            raise
+
+        # Rewind what the failed attempt added to the total, except
+        # for what we will be able to resume from.
+        if not validator and os.path.exists(privatePath):
+            os.remove(privatePath)
+        packageProgress.count(os.path.getsize(privatePath) if validator else 0)
+
+        if attempt >= settings.retries:
+            _LOG.error(
+                f"failed to download {url} after {attempt + 1} attempts: {error}"
+            )
+            if validator:
+                _parkPartial(privatePath, partialPath, url, validator)
+            return False
+
+        delay = _getBackoffDelay(attempt, settings, retryAfter)
+        attempt += 1
+        _LOG.warning(
+            f"Failed to download {url} ({error}). Retrying in {delay:.2f}s ({attempt}/{settings.retries})"
+        )
+        await asyncio.sleep(delay)
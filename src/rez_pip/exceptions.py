@@ -4,8 +4,10 @@
 
 from __future__ import annotations
 
-import rich
-import rich.console
+import typing
+
+if typing.TYPE_CHECKING:
+    import rich.console
 
 
 class RezPipError(Exception):
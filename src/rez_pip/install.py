@@ -10,14 +10,18 @@ from __future__ import annotations
 
 import io
 import os
-import re
+import csv
 import sys
+import base64
 import shutil
+import hashlib
 import typing
 import logging
 import pathlib
 import zipfile
 import sysconfig
+import dataclasses
+import configparser
 import collections.abc
 
 import rez_pip.exceptions
@@ -27,12 +31,14 @@ if typing.TYPE_CHECKING:
 
 import installer
 import installer.utils
+import packaging.utils
 import installer.records
 import installer.scripts
 import installer.sources
 import installer.destinations
 
 import rez_pip.pip
+import rez_pip.trace
 import rez_pip.plugins
 import rez_pip.exceptions
 from rez_pip.compat import importlib_metadata
@@ -51,19 +57,132 @@ class CleanupError(rez_pip.exceptions.RezPipError):
 
 
 def isWheelPure(dist: importlib_metadata.Distribution) -> bool:
-    # dist.files should never be empty, but assert to silence mypy.
-    assert dist.files is not None
+    wheel = dist.read_text("WHEEL")
+    if wheel is None:
+        raise rez_pip.exceptions.RezPipError(f"WHEEL file not found for {dist.name!r}")
 
-    path = next(
-        f
-        for f in dist.files
-        if os.fspath(f.locate()).endswith(os.path.join(".dist-info", "WHEEL"))
-    )
-    with open(path.locate()) as fd:
-        metadata = installer.utils.parse_metadata_file(fd.read())
+    metadata = installer.utils.parse_metadata_file(wheel)
     return typing.cast(str, metadata["Root-Is-Purelib"]) == "true"
 
 
+@dataclasses.dataclass(frozen=True)
+class WheelMetadata:
+    """
+    Metadata of a wheel that is needed to install it, convert its requirements
+    and create its rez package. It's read once, straight from the wheel
+    (see :func:`readWheelMetadata`), and stored in :attr:`rez_pip.pip.PackageGroup.wheels`.
+    """
+
+    #: Is the wheel pure python (Root-Is-Purelib)?
+    isPure: bool
+
+    #: Does the wheel have entry points?
+    hasEntryPoints: bool
+
+    #: Names of the console_scripts entry points and of the scripts in the
+    #: ``.data/scripts`` directory.
+    scripts: typing.Tuple[str, ...]
+
+    #: Requirements (Requires-Dist).
+    requires: typing.Tuple[str, ...]
+
+    #: Python versions supported by the wheel (Requires-Python).
+    requiresPython: typing.Optional[str]
+
+    #: First extra provided by the wheel (Provides-Extra), like
+    #: ``metadata["Provides-Extra"]`` returns it.
+    providesExtra: typing.Optional[str]
+
+    @classmethod
+    def fromDistribution(cls, dist: importlib_metadata.Distribution) -> WheelMetadata:
+        """
+        Get the metadata of an installed distribution, or of a distribution whose
+        metadata was extracted (see :func:`extractMetadata`). Prefer
+        :func:`readWheelMetadata`, which doesn't need to go through all the
+        files of the distribution.
+        """
+        scripts = [ep.name for ep in dist.entry_points if ep.group == "console_scripts"]
+        for file_ in dist.files or []:
+            # Installed scripts (../scripts/<name>) or, when only the metadata was
+            # extracted, scripts in the wheel layout (<name>.data/scripts/<name>).
+            # Anything nested under scripts is skipped.
+            if file_.parts[:-1] == ("..", "scripts") or (
+                len(file_.parts) == 3
+                and file_.parts[0].endswith(".data")
+                and file_.parts[1] == "scripts"
+            ):
+                scripts.append(file_.name)
+
+        return cls(
+            isPure=isWheelPure(dist),
+            hasEntryPoints=bool(dist.entry_points),
+            scripts=tuple(dict.fromkeys(scripts)),
+            requires=tuple(dist.requires or []),
+            requiresPython=dist.metadata.get("Requires-Python"),
+            providesExtra=(dist.metadata.get_all("Provides-Extra") or [None])[0],
+        )
+
+
+def readWheelMetadata(wheelPath: str) -> WheelMetadata:
+    """
+    Read the metadata of a wheel from its archive. Only the central directory and
+    the WHEEL, METADATA and entry_points.txt files are read.
+
+    :param wheelPath: Path to the wheel.
+    """
+    with rez_pip.trace.span(os.path.basename(wheelPath), "install", wheelMetadata=True):
+        with zipfile.ZipFile(wheelPath) as archive:
+            names = archive.namelist()
+
+            distInfo = next(
+                (
+                    name.split("/", 1)[0]
+                    for name in names
+                    if name.endswith(".dist-info/WHEEL") and name.count("/") == 1
+                ),
+                None,
+            )
+            if distInfo is None:
+                raise rez_pip.exceptions.RezPipError(
+                    f"{wheelPath!r} is not a valid wheel, it has no .dist-info/WHEEL file"
+                )
+
+            def read(name: str) -> str:
+                try:
+                    return archive.read(f"{distInfo}/{name}").decode("utf-8")
+                except KeyError:
+                    return ""
+
+            wheel = installer.utils.parse_metadata_file(read("WHEEL"))
+            metadata = installer.utils.parse_metadata_file(read("METADATA"))
+
+            entryPoints = configparser.ConfigParser(delimiters="=", interpolation=None)
+            # Entry point names are case sensitive.
+            entryPoints.optionxform = str  # type: ignore[assignment,method-assign]
+            entryPoints.read_string(read("entry_points.txt"))
+
+    scripts = []
+    if entryPoints.has_section("console_scripts"):
+        scripts.extend(entryPoints.options("console_scripts"))
+
+    # Some packages like ruff don't use entry points but put scripts in .data/scripts/.
+    for name in names:
+        parts = name.split("/")
+        if len(parts) == 3 and parts[0].endswith(".data") and parts[1] == "scripts":
+            scripts.append(parts[2])
+
+    return WheelMetadata(
+        isPure=wheel.get("Root-Is-Purelib") == "true",
+        hasEntryPoints=any(
+            entryPoints.options(section) for section in entryPoints.sections()
+        ),
+        scripts=tuple(dict.fromkeys(scripts)),
+        requires=tuple(metadata.get_all("Requires-Dist") or []),
+        requiresPython=metadata.get("Requires-Python"),
+        providesExtra=metadata.get("Provides-Extra"),
+    )
+
+
 # Taken from https://github.com/pypa/installer/blob/main/src/installer/__main__.py#L49
 def getSchemeDict(name: str, target: str) -> dict[str, str]:
     vars = {}
@@ -103,18 +222,52 @@ def installWheel(
     )
 
     _LOG.debug(f"Installing {wheelPath} into {targetPath!r}")
-    with installer.sources.WheelFile.open(pathlib.Path(wheelPath)) as source:
-        installer.install(
-            source=source,
-            destination=destination,
-            # Additional metadata that is generated by the installation tool.
-            additional_metadata={
-                "INSTALLER": f"rez-pip {importlib_metadata.version(__package__)}".encode(
-                    "utf-8"
-                ),
-            },
-        )
+    with rez_pip.trace.span(package.name, "install", wheel=os.path.basename(wheelPath)):
+        with installer.sources.WheelFile.open(pathlib.Path(wheelPath)) as source:
+            installer.install(
+                source=source,
+                destination=destination,
+                # Additional metadata that is generated by the installation tool.
+                additional_metadata={
+                    "INSTALLER": f"rez-pip {importlib_metadata.version(__package__)}".encode(
+                        "utf-8"
+                    ),
+                },
+            )
+
+    return _getDistribution(package, targetPath)
 
+
+def extractMetadata(
+    package: rez_pip.pip.PackageInfo,
+    wheelPath: str,
+    targetPath: str,
+) -> importlib_metadata.Distribution:
+    """
+    Only extract the .dist-info directory of a wheel. This is enough to get the
+    metadata of the distribution without installing it.
+
+    Note that the files listed in the RECORD file are the files of the wheel,
+    not the files of an installation.
+    """
+    _LOG.debug(f"Extracting the metadata of {wheelPath} into {targetPath!r}")
+    targetPathPython = os.path.join(targetPath, "python")
+
+    with rez_pip.trace.span(
+        package.name, "install", wheel=os.path.basename(wheelPath), metadataOnly=True
+    ):
+        with zipfile.ZipFile(wheelPath) as archive:
+            for member in archive.infolist():
+                topLevel = member.filename.split("/", 1)[0]
+                if topLevel.endswith(".dist-info") and "/" in member.filename:
+                    archive.extract(member, targetPathPython)
+
+    return _getDistribution(package, targetPath)
+
+
+def _getDistribution(
+    package: rez_pip.pip.PackageInfo, targetPath: str
+) -> importlib_metadata.Distribution:
     targetPathPython = os.path.join(targetPath, "python")
 
     # That's kind of dirty, but using any other method returns inconsistent results.
@@ -127,6 +280,15 @@ def installWheel(
         and os.path.isdir(os.path.join(targetPathPython, item))
     ]
 
+    if len(items) > 1:
+        # Multiple distributions installed in the same directory (see --direct-install).
+        name = packaging.utils.canonicalize_name(package.name)
+        items = [
+            item
+            for item in items
+            if packaging.utils.canonicalize_name(item.split("-", 1)[0]) == name
+        ] or items
+
     if len(items) == 0:
         raise rez_pip.exceptions.RezPipError(
             f"Could not find a dist-info folder for {package.name!r} in {targetPathPython!r}"
@@ -225,13 +387,224 @@ class Script(installer.scripts.Script):
         return (name, data)
 
 
-def cleanup(dist: importlib_metadata.Distribution, path: str) -> None:
+#: Scheme of the installed files, by top level directory (see :func:`getSchemeDict`).
+#: Files in any other directory are in the "data" scheme.
+_SCHEME_DIRECTORIES = {"python": "purelib", "scripts": "scripts", "headers": "headers"}
+
+
+@dataclasses.dataclass(frozen=True)
+class ManifestFile:
+    """A file of a :class:`FileManifest`."""
+
+    #: Path relative to the root of the installation, with native separators.
+    path: str
+
+    #: Scheme of the file (purelib, scripts, headers or data).
+    scheme: str
+
+    #: Size in bytes.
+    size: int
+
+    #: Mode (see :func:`os.lstat`).
+    mode: int
+
+
+@dataclasses.dataclass(frozen=True)
+class FileManifest:
+    """
+    Files of an installed distribution, as they are after the cleanup and patch hooks.
+    It's built once (see :func:`buildFileManifest`) and stored in
+    :attr:`rez_pip.pip.PackageGroup.manifests`, so that later stages don't have to go
+    through :attr:`importlib.metadata.Distribution.files` again.
+    """
+
+    #: Root of the installation.
+    root: str
+
+    #: Files of the distribution.
+    files: typing.Tuple[ManifestFile, ...]
+
+    @property
+    def size(self) -> int:
+        """Total size in bytes."""
+        return sum(file_.size for file_ in self.files)
+
+
+def buildFileManifest(
+    dist: importlib_metadata.Distribution, path: str | None = None
+) -> FileManifest:
+    """
+    List the files of an installed distribution. RECORD is parsed once and each
+    file is only stat'ed once.
+
+    :param dist: Installed distribution.
+    :param path: Path where the distribution is installed. Defaults to the parent of
+        the directory that contains the .dist-info directory.
+    """
+    files = dist.files
+    if not files:
+        raise rez_pip.exceptions.RezPipError(
+            f"{dist.name} package has no files registered! Something is wrong maybe?"
+        )
+
+    if path is None:
+        path = os.path.dirname(os.path.normpath(str(dist.locate_file(""))))
+
+    root = os.path.normpath(path)
+    prefix = root + os.sep
+
+    manifestFiles = []
+    for file_ in files:
+        # locate() only joins paths, it doesn't touch the file system.
+        absolutePath = os.path.normpath(str(file_.locate()))
+        if not absolutePath.startswith(prefix):
+            raise rez_pip.exceptions.RezPipError(
+                f"{dist.name!r} has a file outside of {root!r}: {os.fspath(file_)!r}"
+            )
+
+        relPath = absolutePath[len(prefix) :]
+        stat = os.lstat(absolutePath)
+        manifestFiles.append(
+            ManifestFile(
+                relPath,
+                _SCHEME_DIRECTORIES.get(relPath.split(os.sep, 1)[0], "data"),
+                stat.st_size,
+                stat.st_mode,
+            )
+        )
+
+    return FileManifest(root, tuple(manifestFiles))
+
+
+class Record:
+    """
+    RECORD file of an installed distribution, indexed by path.
+
+    Cleanups and patches modify the installed files. Instead of reading and writing
+    the RECORD file for each modification, they update a record with :meth:`remove`
+    and :meth:`update`, and :meth:`write` writes the RECORD file once at the end.
+    The RECORD file is only read when the record is first modified.
+
+    :param dist: Installed distribution.
+    :param path: Path where the distribution is installed (the ``path`` passed to
+        the cleanup and patches hooks).
+    """
+
+    def __init__(self, dist: importlib_metadata.Distribution, path: str) -> None:
+        self._dist = dist
+        self._path = path
+
+        # Entries (path, hash, size) keyed by the absolute normalized path of
+        # the file they describe.
+        self._entries: dict[str, tuple[str, str, str]] | None = None
+        self._recordPath = ""
+        self._modified = False
+
+    def _load(self) -> dict[str, tuple[str, str, str]]:
+        if self._entries is not None:
+            return self._entries
+
+        content = self._dist.read_text("RECORD")
+        if content is None:
+            raise CleanupError(f"RECORD file not found for {self._dist.name!r}")
+
+        # Paths are relative to the directory that contains the .dist-info
+        # directory. Files of other schemes are prefixed with "../".
+        root = os.path.join(self._path, "python")
+
+        entries: dict[str, tuple[str, str, str]] = {}
+        for elements in installer.records.parse_record_file(content.splitlines()):
+            entries[os.path.normpath(os.path.join(root, elements[0]))] = elements
+
+            parts = elements[0].split("/")
+            if parts[-1] == "RECORD" and parts[0].endswith(".dist-info"):
+                self._recordPath = os.path.join(root, elements[0])
+
+        if not self._recordPath:
+            raise CleanupError(f"RECORD file not found for {self._dist.name!r}")
+
+        self._entries = entries
+        return entries
+
+    def remove(self, path: str) -> None:
+        """
+        Remove the entry of a file, or the entries of all the files of a directory.
+
+        :param path: Absolute path of the file or directory.
+        """
+        entries = self._load()
+        path = os.path.normpath(path)
+
+        if entries.pop(path, None) is not None:
+            self._modified = True
+            return
+
+        # Directories are not listed in RECORD files.
+        prefix = path + os.sep
+        for key in [key for key in entries if key.startswith(prefix)]:
+            del entries[key]
+            self._modified = True
+
+    def update(self, path: str) -> None:
+        """
+        Update the hash and size of a modified file. The file is added if it's
+        not in the record, and removed if it doesn't exist anymore.
+
+        :param path: Absolute path of the file.
+        """
+        entries = self._load()
+        path = os.path.normpath(path)
+
+        if not os.path.exists(path):
+            self.remove(path)
+            return
+
+        entry = entries.get(path)
+        if entry:
+            recordPath = entry[0]
+        else:
+            recordPath = os.path.relpath(path, os.path.join(self._path, "python"))
+            recordPath = recordPath.replace(os.sep, "/")
+
+        algorithm = entry[1].split("=", 1)[0] if entry and entry[1] else "sha256"
+        with open(path, "rb") as fd:
+            data = fd.read()
+
+        digest = base64.urlsafe_b64encode(hashlib.new(algorithm, data).digest())
+        entries[path] = (
+            recordPath,
+            f"{algorithm}={digest.rstrip(b'=').decode()}",
+            str(len(data)),
+        )
+        self._modified = True
+
+    def write(self) -> None:
+        """Write the RECORD file if the record was modified."""
+        if not self._modified or self._entries is None:
+            return
+
+        _LOG.debug(f"Writing {self._recordPath!r}")
+        with open(self._recordPath, "w", newline="") as fd:
+            writer = csv.writer(fd, delimiter=",", quotechar='"', lineterminator="\n")
+            writer.writerows(self._entries.values())
+        self._modified = False
+
+
+def cleanup(
+    dist: importlib_metadata.Distribution, path: str, record: Record | None = None
+) -> None:
     """
     Run cleanup hooks.
 
     Note that this lives in install because the cleanups
     are made on the installs (the wheel install). We could move this somewhere
     else but it's not clear where.
+
+    :param dist: Installed distribution.
+    :param path: Path where the distribution is installed.
+    :param record: Record of the distribution. If given, removed files are only
+        removed from the record and the caller writes it. Otherwise, the RECORD file
+        is updated before returning.
     """
     actionsGroups: collections.abc.Sequence[
         collections.abc.Sequence[rez_pip.plugins.CleanupAction]
@@ -244,7 +617,12 @@ def cleanup(dist: importlib_metadata.Distribution, path: str) -> None:
         action for group in actionsGroups for action in group
     ]
 
-    recordEntriesToRemove = []
+    if not actions:
+        return
+
+    ownRecord = record is None
+    if record is None:
+        record = Record(dist, path)
 
     for action in actions:
         if not action.path.startswith(path):
@@ -264,62 +642,27 @@ def cleanup(dist: importlib_metadata.Distribution, path: str) -> None:
             else:
                 os.remove(action.path)
 
-            recordEntriesToRemove.append(
-                os.path.normpath(os.path.relpath(action.path, path)).replace("\\", "/")
-            )
+            record.remove(action.path)
         else:
             raise CleanupError(f"Unknown action: {action.op}")
 
-    if recordEntriesToRemove:
-        deleteEntryFromRecord(dist, path, recordEntriesToRemove)
+    if ownRecord:
+        record.write()
 
 
 def deleteEntryFromRecord(
     dist: importlib_metadata.Distribution, path: str, entries: list[str]
 ) -> None:
     """
-    Delete an entry from the record file.
+    Delete entries from the RECORD file. Prefer :class:`Record` to make multiple
+    modifications.
 
-    This code is not great. I feel like updating the RECORD file should
-    be simpler. Which means that we miht need to refactor things a bit.
+    :param dist: Installed distribution.
+    :param path: Path where the distribution is installed.
+    :param entries: Paths, relative to ``path``, of the files or directories to remove
+        from the RECORD file.
     """
-    items = [
-        os.fspath(item)
-        for item in dist.files
-        if re.search(r"[a-zA-Z0-9._+]+\.dist-info/RECORD", os.fspath(item))
-    ]
-
-    if not items:
-        raise CleanupError(f"RECORD file not found for {dist.name!r}")
-
-    recordFilePathRel = items[0]
-    recordFilePath = os.path.join(path, "python", recordFilePathRel)
-
-    with open(recordFilePath) as f:
-        lines = f.readlines()
-
-    schemesRaw = getSchemeDict(dist.name, path)
-    schemes = {
-        key: os.path.relpath(value, path)
-        for key, value in schemesRaw.items()
-        if value.startswith(path)
-    }
-
-    # Format the entries to match the record file. This is important
-    # because when we install the files, we use a custom scheme.
-    # For example, we have to trim "python/" or "scripts/".
-    for index, entry in enumerate(entries):
-        for schemePath in schemes.values():
-            if entry.startswith(schemePath):
-                _LOG.debug(f"Stripping {schemePath!r}/ from {entry!r}")
-                entries[index] = entry.lstrip(schemePath + "/")
-                # Break on first match
-                break
-
-    for index, elements in enumerate(installer.records.parse_record_file(lines)):
-        if elements[0] in entries:
-            lines.pop(index)
-
-    with open(recordFilePath, "w") as f:
-        for line in lines:
-            f.write(line)
+    record = Record(dist, path)
+    for entry in entries:
+        record.remove(os.path.join(path, entry))
+    record.write()
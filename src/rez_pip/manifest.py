@@ -0,0 +1,215 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Manifests list multiple independent requirement sets that are ingested in one invocation
+(see ``--manifest``).
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import typing
+import logging
+import dataclasses
+
+import rez_pip.exceptions
+
+_LOG = logging.getLogger(__name__)
+
+#: Options that can be set on each entry. Options that are not set on an entry are
+#: taken from the command line.
+ENTRY_OPTIONS = (
+    "name",
+    "packages",
+    "requirement",
+    "constraint",
+    "prefix",
+    "release",
+    "python-version",
+    "python-executable",
+    "pip-args",
+)
+
+
+class ManifestError(rez_pip.exceptions.RezPipError):
+    """Raised when a manifest can't be read or is invalid."""
+
+
+@dataclasses.dataclass(frozen=True)
+class ManifestEntry:
+    """A requirement set of a manifest."""
+
+    #: Name of the entry, used in logs and in the report.
+    name: str
+
+    #: Values of the command line options (argparse destinations) set by this entry.
+    options: typing.Dict[str, typing.Any]
+
+    #: Arguments passed to pip, in addition to the ones passed on the command line.
+    pipArgs: typing.List[str] = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass
+class EntryResult:
+    """Outcome of an entry."""
+
+    #: Name of the entry.
+    name: str
+
+    #: Whether all the packages of the entry were created.
+    succeeded: bool
+
+    #: Time it took (in seconds) to process the entry.
+    duration: float
+
+    #: Number of rez packages created for each python version.
+    packages: typing.Dict[str, int] = dataclasses.field(default_factory=dict)
+
+    #: Error that made the entry fail.
+    error: typing.Optional[str] = None
+
+
+def _checkStrings(value: typing.Any, key: str, location: str) -> list[str]:
+    if isinstance(value, str):
+        value = [value]
+
+    if not isinstance(value, list) or not all(isinstance(x, str) for x in value):
+        raise ManifestError(
+            f"{location}: {key!r} must be a string or a list of strings"
+        )
+    return value
+
+
+def _parseEntry(data: typing.Any, location: str, root: str) -> ManifestEntry:
+    if not isinstance(data, dict):
+        raise ManifestError(f"{location}: entries must be tables/objects")
+
+    unknown = sorted(set(data) - set(ENTRY_OPTIONS))
+    if unknown:
+        raise ManifestError(
+            f"{location}: unknown option(s) {', '.join(map(repr, unknown))}. "
+            f"Supported options are {', '.join(ENTRY_OPTIONS)}"
+        )
+
+    options: dict[str, typing.Any] = {}
+    for key in ("packages", "requirement", "constraint"):
+        if key in data:
+            options[key] = _checkStrings(data[key], key, location)
+
+    if not options.get("packages") and not options.get("requirement"):
+        raise ManifestError(
+            f"{location}: at least one of 'packages' or 'requirement' must be set"
+        )
+
+    name = data.get("name")
+    if name is None:
+        name = ", ".join(options.get("packages") or options["requirement"])
+    elif not isinstance(name, str):
+        raise ManifestError(f"{location}: 'name' must be a string")
+
+    # Relative paths are relative to the manifest.
+    for key in ("requirement", "constraint"):
+        if key in options:
+            options[key] = [os.path.join(root, path) for path in options[key]]
+
+    for key in ("prefix", "python-version"):
+        if key in data:
+            if not isinstance(data[key], str):
+                raise ManifestError(f"{location}: {key!r} must be a string")
+            options[key.replace("-", "_")] = data[key]
+
+    if "prefix" in options:
+        options["prefix"] = os.path.join(root, os.path.expanduser(options["prefix"]))
+
+    if "release" in data:
+        if not isinstance(data["release"], bool):
+            raise ManifestError(f"{location}: 'release' must be a boolean")
+        options["release"] = data["release"]
+
+    if "python-executable" in data:
+        executables = data["python-executable"]
+        if not isinstance(executables, dict) or not all(
+            isinstance(x, str) for x in executables.values()
+        ):
+            raise ManifestError(
+                f"{location}: 'python-executable' must map python versions to paths"
+            )
+        options["python_executable"] = [
+            (str(version), path) for version, path in executables.items()
+        ]
+
+    return ManifestEntry(
+        name,
+        options,
+        pipArgs=_checkStrings(data.get("pip-args", []), "pip-args", location),
+    )
+
+
+def loadManifest(path: str) -> list[ManifestEntry]:
+    """
+    Load a manifest. Manifests are TOML files or, if their extension is ``.json``,
+    JSON files. Both have an ``entries`` array that lists the requirement sets.
+    Each entry can set the options listed in :data:`ENTRY_OPTIONS`:
+
+    .. code-block:: toml
+
+       [[entries]]
+       name = "qt"
+       packages = ["PySide6"]
+       python-version = "3.10+"
+       prefix = "/path/to/repo"
+
+       [[entries]]
+       requirement = ["requirements.txt"]
+       constraint = ["constraints.txt"]
+       pip-args = ["--index-url", "https://example.com/simple"]
+
+    :param path: Path to the manifest.
+    :raises ManifestError: If the manifest can't be read or is invalid.
+    """
+    try:
+        if path.endswith(".json"):
+            with open(path, encoding="utf-8") as fd:
+                data = json.load(fd)
+        else:
+            # Only manifests need a TOML parser. Don't import it with rez_pip.compat.
+            if sys.version_info >= (3, 11):
+                import tomllib
+            else:
+                import tomli as tomllib
+
+            with open(path, "rb") as fd:
+                data = tomllib.load(fd)
+    except (OSError, ValueError) as exc:
+        raise ManifestError(f"Failed to read manifest {path!r}: {exc}") from exc
+
+    entries = data.get("entries") if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise ManifestError(
+            f"{path}: an 'entries' array with at least one entry is required"
+        )
+
+    root = os.path.dirname(os.path.abspath(path))
+    manifestEntries = [
+        _parseEntry(entry, f"{path}: entry {index}", root)
+        for index, entry in enumerate(entries)
+    ]
+    _LOG.debug(f"Loaded {len(manifestEntries)} entries from {path!r}")
+    return manifestEntries
+
+
+def writeReport(results: list[EntryResult], path: str) -> None:
+    """Write the results of the entries of a manifest as JSON."""
+    with open(path, "w", encoding="utf-8") as fd:
+        json.dump(
+            {
+                "succeeded": all(result.succeeded for result in results),
+                "entries": [dataclasses.asdict(result) for result in results],
+            },
+            fd,
+            indent=4,
+        )
@@ -14,8 +14,10 @@ import logging.handlers
 
 import patch_ng
 
+import rez_pip.trace
 import rez_pip.utils
 import rez_pip.compat
+import rez_pip.install
 import rez_pip.plugins
 import rez_pip.exceptions
 import rez_pip.data.patches
@@ -67,8 +69,31 @@ def logIfErrorOrRaises() -> typing.Generator[None, None, None]:
         logger.removeHandler(handler)
 
 
-def patch(dist: importlib_metadata.Distribution, path: str) -> None:
-    """Patch an installed package (wheel)"""
+def _getPatchedFiles(patchset: patch_ng.PatchSet, root: str) -> list[str]:
+    """Absolute paths of the files created, modified or deleted by a patch"""
+    paths = []
+    for item in patchset.items:
+        for filename, prefix in ((item.source, "a/"), (item.target, "b/")):
+            filename = patchset.decode_clean(filename, prefix)
+            if "dev/null" not in filename:
+                paths.append(os.path.normpath(os.path.join(root, filename)))
+    return list(dict.fromkeys(paths))
+
+
+def patch(
+    dist: importlib_metadata.Distribution,
+    path: str,
+    record: rez_pip.install.Record | None = None,
+) -> None:
+    """
+    Patch an installed package (wheel)
+
+    :param dist: Installed distribution.
+    :param path: Path where the distribution is installed.
+    :param record: Record of the distribution. If given, the hashes and sizes of the
+        patched files are only updated in the record and the caller writes it.
+        Otherwise, the RECORD file is updated before returning.
+    """
     _LOG.debug(f"[bold]Attempting to patch {dist.name!r} at {path!r}")
     patchesGroups: collections.abc.Sequence[collections.abc.Sequence[str]] = (
         rez_pip.plugins.getHook().patches(dist=dist, path=path)
@@ -83,6 +108,10 @@ def patch(dist: importlib_metadata.Distribution, path: str) -> None:
 
     _LOG.info(f"Applying {len(patches)} patches for {dist.name!r} at {path!r}")
 
+    ownRecord = record is None
+    if record is None:
+        record = rez_pip.install.Record(dist, path)
+
     for patch in patches:
         _LOG.info(f"Applying patch {patch!r} on {path!r}")
 
@@ -93,7 +122,16 @@ def patch(dist: importlib_metadata.Distribution, path: str) -> None:
             raise PatchError(f"Patch at {patch!r} does not exist")
 
         patchset = patch_ng.fromfile(patch)
-        with logIfErrorOrRaises():
-            if not patchset.apply(root=path):
-                # A logger that only gets flushed on demand would be better...
-                raise PatchError(f"Failed to apply patch {patch!r} on {path!r}")
+        # apply() modifies the items of the patch set.
+        patchedFiles = _getPatchedFiles(patchset, path)
+        with rez_pip.trace.span(os.path.basename(patch), "patch", package=dist.name):
+            with logIfErrorOrRaises():
+                if not patchset.apply(root=path):
+                    # A logger that only gets flushed on demand would be better...
+                    raise PatchError(f"Failed to apply patch {patch!r} on {path!r}")
+
+        for patchedFile in patchedFiles:
+            record.update(patchedFile)
+
+    if ownRecord:
+        record.write()
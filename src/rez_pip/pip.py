@@ -4,24 +4,34 @@
 
 from __future__ import annotations
 
+import io
 import os
 import sys
 import json
+import codecs
+import atexit
+import locale
 import typing
+import asyncio
 import logging
 import tempfile
 import itertools
+import threading
 import subprocess
 import dataclasses
+import urllib.parse
 
 import dataclasses_json
 
 import rez_pip.data
+import rez_pip.trace
 import rez_pip.plugins
 import rez_pip.exceptions
 
 if typing.TYPE_CHECKING:
+    import rez_pip.cache
     import rez_pip.compat
+    import rez_pip.install
 
 _LOG = logging.getLogger(__name__)
 
@@ -33,6 +43,24 @@ class Metadata(dataclasses_json.DataClassJsonMixin):
     version: str
     name: str
 
+    # The fields below are only used to guess the rez package that will be created
+    # (see rez_pip.rez.packageGroupExists). They are not compared.
+
+    #: Requirements of the package (Requires-Dist).
+    requires_dist: typing.List[str] = dataclasses.field(
+        default_factory=list, compare=False
+    )
+
+    #: Python versions supported by the package (Requires-Python).
+    requires_python: typing.Optional[str] = dataclasses.field(
+        default=None, compare=False
+    )
+
+    #: Extras provided by the package (Provides-Extra).
+    provides_extra: typing.List[str] = dataclasses.field(
+        default_factory=list, compare=False
+    )
+
 
 @dataclasses.dataclass
 class ArchiveInfo(dataclasses_json.DataClassJsonMixin):
@@ -103,8 +131,13 @@ class DownloadedArtifact(PackageInfo):
     def path(self) -> str:
         """Path to the package on disk."""
         if not self.isDownloadRequired():
-            # It's a local file, so we can return the URL (without file://)
-            return self.download_info.url[7:]
+            # urllib.request is slow to import and only needed here.
+            import urllib.request
+
+            # It's a local file, so we can return the path of the URL.
+            return urllib.request.url2pathname(
+                urllib.parse.urlparse(self.download_info.url).path
+            )
 
         return self._localPath
 
@@ -121,10 +154,20 @@ class PackageGroup(typing.Generic[T]):
     #: List of distributions
     dists: list[rez_pip.compat.importlib_metadata.Distribution]
 
+    #: Metadata read from the wheels, in the same order as the packages. It can be
+    #: empty, in which case it's read from the distributions when needed.
+    wheels: list[rez_pip.install.WheelMetadata]
+
+    #: Files of the installed distributions, in the same order as the packages. It
+    #: can be empty, in which case they are listed from the distributions when needed.
+    manifests: list[rez_pip.install.FileManifest]
+
     # Using a tuple to make it immutable
     def __init__(self, packages: tuple[T, ...]) -> None:
         self.packages = packages
         self.dists = []
+        self.wheels = []
+        self.manifests = []
 
     def __str__(self) -> str:
         return "PackageGroup({})".format(
@@ -156,6 +199,122 @@ def getBundledPip() -> str:
     return os.path.join(os.path.dirname(rez_pip.data.__file__), "pip.pyz")
 
 
+@dataclasses.dataclass
+class _PipProcess:
+    """pip process started ahead of time, see :func:`startPipProcess`."""
+
+    process: subprocess.Popen[bytes]
+    #: Working directory and environment the process was started with.
+    cwd: str
+    environ: dict[str, str]
+
+    def isUsable(self) -> bool:
+        """
+        Whether the process is still waiting for a command, and would run it
+        like a new process would.
+        """
+        # Relative paths and pip's environment variables (PIP_INDEX_URL, etc) must
+        # resolve the same way they would in a new process.
+        return (
+            self.process.poll() is None
+            and self.cwd == os.getcwd()
+            and self.environ == os.environ
+        )
+
+
+#: Line written by pip_worker.py once pip is imported.
+_PIP_PROCESS_READY = b"rez-pip: pip is ready"
+
+#: pip processes waiting for a command, by (python executable, pip zipapp).
+_pipProcesses: dict[tuple[str, str], _PipProcess] = {}
+_pipProcessesLock = threading.Lock()
+
+
+def startPipProcess(pip: str, pythonExecutable: str) -> None:
+    """
+    Start a pip process for a future resolve with the given interpreter, unless one
+    is already waiting. pip is imported out of the zipapp while other work is done,
+    instead of when the resolve starts.
+
+    Each process runs a single pip command and then exits, like a process started
+    by the resolve would. Processes that are not used are stopped when rez-pip exits.
+
+    :param pip: Path to the pip zipapp.
+    :param pythonExecutable: Interpreter the packages will be resolved with.
+    """
+    key = (os.path.abspath(pythonExecutable), os.path.abspath(pip))
+    with _pipProcessesLock:
+        pipProcess = _pipProcesses.pop(key, None)
+        if pipProcess:
+            if pipProcess.isUsable():
+                _pipProcesses[key] = pipProcess
+                return
+            _stopPipProcess(pipProcess.process)
+
+        script = os.path.join(os.path.dirname(rez_pip.data.__file__), "pip_worker.py")
+        try:
+            process = subprocess.Popen(
+                [pythonExecutable, script, pip],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+        except OSError as exc:
+            _LOG.debug(f"Failed to start pip with {pythonExecutable!r}: {exc}")
+            return
+
+        _LOG.debug(f"Started pip with {pythonExecutable!r} (pid {process.pid})")
+        _pipProcesses[key] = _PipProcess(process, os.getcwd(), dict(os.environ))
+
+
+def stopPipProcesses() -> None:
+    """Stop the pip processes started by :func:`startPipProcess` that were not used."""
+    with _pipProcessesLock:
+        pipProcesses = list(_pipProcesses.values())
+        _pipProcesses.clear()
+
+    for pipProcess in pipProcesses:
+        _stopPipProcess(pipProcess.process)
+
+
+atexit.register(stopPipProcesses)
+
+
+def _takePipProcess(pip: str, pythonExecutable: str) -> subprocess.Popen[bytes] | None:
+    """
+    Return the process started for the given interpreter, if any. The process is
+    removed from the started processes, so it's only used once.
+    """
+    key = (os.path.abspath(pythonExecutable), os.path.abspath(pip))
+    with _pipProcessesLock:
+        pipProcess = _pipProcesses.pop(key, None)
+
+    if not pipProcess:
+        return None
+
+    if not pipProcess.isUsable():
+        _stopPipProcess(pipProcess.process)
+        return None
+
+    return pipProcess.process
+
+
+def _stopPipProcess(process: subprocess.Popen[bytes]) -> None:
+    """Terminate a process started ahead of time, and kill it if it doesn't exit in time."""
+    if process.poll() is None:
+        _LOG.debug(f"Stopping pip (pid {process.pid})")
+        process.terminate()
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    for stream in (process.stdin, process.stdout):
+        if stream:
+            stream.close()
+
+
 def getPackages(
     packageNames: list[str],
     pip: str,
@@ -164,11 +323,118 @@ def getPackages(
     requirements: list[str],
     constraints: list[str],
     extraArgs: list[str],
+    resolveCache: rez_pip.cache.ResolveCache | None = None,
+    timeout: float | None = None,
 ) -> list[PackageInfo]:
+    """
+    Resolve the given packages with pip. Blocking version of :func:`getPackagesAsync`.
+    """
+    return asyncio.run(
+        getPackagesAsync(
+            packageNames,
+            pip,
+            pythonVersion,
+            pythonExecutable,
+            requirements,
+            constraints,
+            extraArgs,
+            resolveCache=resolveCache,
+            timeout=timeout,
+        )
+    )
+
+
+async def getPackagesAsync(
+    packageNames: list[str],
+    pip: str,
+    pythonVersion: str,
+    pythonExecutable: str,
+    requirements: list[str],
+    constraints: list[str],
+    extraArgs: list[str],
+    resolveCache: rez_pip.cache.ResolveCache | None = None,
+    timeout: float | None = None,
+) -> list[PackageInfo]:
+    """
+    Resolve the given packages with pip. pip's output is forwarded to stdout as it
+    comes, without blocking the event loop, so multiple resolves (for example for
+    multiple python versions) can run concurrently, along with downloads.
+
+    If the call is cancelled (Ctrl-C, etc), pip is stopped.
+
+    :param timeout: Maximum time (in seconds) pip has to resolve the packages.
+        No limit if None.
+    :raises rez_pip.exceptions.PipError: If pip failed or didn't finish in time.
+    """
     rez_pip.plugins.getHook().prePipResolve(
         packages=tuple(packageNames), requirements=tuple(requirements)
     )
 
+    with rez_pip.trace.span(
+        "resolve",
+        "pip",
+        pythonVersion=pythonVersion,
+        packages=packageNames,
+        requirements=requirements,
+    ) as spanArgs:
+        rawPackages: list[dict[str, typing.Any]] | None = None
+        if resolveCache:
+            cacheKey = resolveCache.getKey(
+                packageNames,
+                pip,
+                pythonVersion,
+                pythonExecutable,
+                requirements,
+                constraints,
+                extraArgs,
+            )
+            rawPackages = resolveCache.get(cacheKey)
+            if rawPackages is not None:
+                _LOG.info(
+                    f"Found resolved packages for python {pythonVersion} in the resolve cache. Skipping pip."
+                )
+                spanArgs["cached"] = True
+
+        if rawPackages is None:
+            reportContent = await _runPip(
+                packageNames,
+                pip,
+                pythonVersion,
+                pythonExecutable,
+                requirements,
+                constraints,
+                extraArgs,
+                timeout=timeout,
+            )
+            rawPackages = typing.cast(
+                typing.List[typing.Dict[str, typing.Any]], reportContent["install"]
+            )
+
+            if resolveCache:
+                resolveCache.set(cacheKey, rawPackages)
+
+    packages: list[PackageInfo] = []
+
+    for rawPackage in rawPackages:
+        packageInfo = PackageInfo.from_dict(rawPackage)
+        packages.append(packageInfo)
+
+    rez_pip.plugins.getHook().postPipResolve(packages=tuple(packages))
+
+    return packages
+
+
+async def _runPip(
+    packageNames: list[str],
+    pip: str,
+    pythonVersion: str,
+    pythonExecutable: str,
+    requirements: list[str],
+    constraints: list[str],
+    extraArgs: list[str],
+    timeout: float | None = None,
+) -> dict[str, typing.Any]:
+    """Run pip and return the report it generated."""
     _fd, tmpFile = tempfile.mkstemp(prefix="pip-install-output", text=True)
     os.close(_fd)
     # We can't with "with" (context manager) because it will fail on Windows.
@@ -199,44 +465,145 @@ def getPackages(
         ]
 
         _LOG.debug(f"Running {' '.join(command)!r}")
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-        )
-
-        pipOutput = []
-        while True:
-            stdout = typing.cast(typing.IO[str], process.stdout).readline()
-            if process.poll() is not None:
-                break
-            if stdout:
-                pipOutput.append(stdout.rstrip())
-                sys.stdout.write(stdout)
+        process = _takePipProcess(pip, pythonExecutable)
+        try:
+            with rez_pip.trace.span(
+                "pip subprocess", "pip", started=process is not None
+            ):
+                if process:
+                    runner = _runStartedPipProcess(process, command)
+                else:
+                    runner = _runPipProcess(command)
+
+                returncode, output = await asyncio.wait_for(runner, timeout)
+        except asyncio.TimeoutError:
+            raise rez_pip.exceptions.PipError(
+                f"[bold red]pip didn't finish within {timeout} seconds[/]: {' '.join(command)!r}"
+            ) from None
 
-        if process.poll() != 0:
-            output = "\n".join(pipOutput)
+        if returncode != 0:
             raise rez_pip.exceptions.PipError(
                 f"[bold red]Failed to run pip command[/]: {' '.join(command)!r}\n\n"
                 "[bold]Pip reported this[/]:\n\n"
-                f"{output}",
+                f"{output.rstrip()}",
             )
-        reportContent = _readPipReport(reportPath=tmpFile)
+        return _readPipReport(reportPath=tmpFile)
     finally:
         os.remove(tmpFile)
 
-    rawPackages = reportContent["install"]
 
-    packages: list[PackageInfo] = []
+async def _runPipProcess(command: list[str]) -> tuple[int, str]:
+    """
+    Run pip in a new process and forward its output as it goes. The process
+    is stopped if the call is cancelled.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
 
-    for rawPackage in rawPackages:
-        packageInfo = PackageInfo.from_dict(rawPackage)
-        packages.append(packageInfo)
+    decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(
+        errors="replace"
+    )
+    pipOutput: list[str] = []
+    try:
+        stdout = typing.cast(asyncio.StreamReader, process.stdout)
+        # Read until EOF, so that nothing written right before pip exits is lost.
+        while True:
+            chunk = await stdout.read(2**16)
+            text = decoder.decode(chunk, final=not chunk)
+            if text:
+                pipOutput.append(text)
+                sys.stdout.write(text)
+            if not chunk:
+                break
 
-    rez_pip.plugins.getHook().postPipResolve(packages=tuple(packages))
+        returncode = await process.wait()
+    except BaseException:
+        await _stopProcess(process)
+        raise
 
-    return packages
+    return returncode, "".join(pipOutput)
+
+
+async def _runStartedPipProcess(
+    process: subprocess.Popen[bytes], command: list[str]
+) -> tuple[int, str]:
+    """
+    Send a command to a process started by :func:`startPipProcess` once pip is
+    imported, and forward its output as it goes. The process is stopped if the
+    call is cancelled.
+
+    If the process exits before it's ready (pip can't be imported by the
+    interpreter, etc), the command is run in a new process instead.
+
+    :param command: Command that would start pip in a new process
+        (``[python, pip, *args]``).
+    """
+    loop = asyncio.get_running_loop()
+    stdin = typing.cast(typing.IO[bytes], process.stdin)
+    stdout = typing.cast(io.BufferedReader, process.stdout)
+
+    decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(
+        errors="replace"
+    )
+    pipOutput: list[str] = []
+    try:
+        # Anything written while pip is imported (warnings, etc) is part of the output.
+        preamble: list[bytes] = []
+        while True:
+            line = await loop.run_in_executor(None, stdout.readline)
+            if not line or line.rstrip(b"\r\n") == _PIP_PROCESS_READY:
+                break
+            preamble.append(line)
+
+        try:
+            if not line:
+                raise EOFError("exited before pip was imported")
+            stdin.write(json.dumps(command[2:]).encode("utf-8") + b"\n")
+            stdin.close()
+        except (OSError, EOFError) as exc:
+            _LOG.debug(
+                f"pip (pid {process.pid}) didn't accept the command: {exc}: {b''.join(preamble)!r}"
+            )
+            _stopPipProcess(process)
+            return await _runPipProcess(command)
+
+        chunk = b"".join(preamble)
+        # Read until EOF, so that nothing written right before pip exits is lost.
+        while True:
+            text = decoder.decode(chunk)
+            if text:
+                pipOutput.append(text)
+                sys.stdout.write(text)
+            chunk = await loop.run_in_executor(None, stdout.read1, 2**16)
+            if not chunk:
+                break
+
+        pipOutput.append(decoder.decode(b"", final=True))
+        returncode = await loop.run_in_executor(None, process.wait)
+    except BaseException:
+        _stopPipProcess(process)
+        raise
+
+    return returncode, "".join(pipOutput)
+
+
+async def _stopProcess(process: asyncio.subprocess.Process) -> None:
+    """Terminate a process, and kill it if it doesn't exit in time."""
+    if process.returncode is not None:
+        return
+
+    _LOG.debug(f"Stopping pip (pid {process.pid})")
+    try:
+        process.terminate()
+        await asyncio.wait_for(process.wait(), 5)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
 
 
 def _readPipReport(reportPath: str) -> dict[str, typing.Any]:
@@ -0,0 +1,261 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Run the steps of rez-pip (download, install, create rez packages) as a pipeline.
+Each stage runs in one or more threads and stages are connected by bounded queues, so
+an item moves to the next stage as soon as it's ready instead of waiting for all
+the other items.
+"""
+
+from __future__ import annotations
+
+import time
+import queue
+import typing
+import logging
+import threading
+import dataclasses
+
+_LOG = logging.getLogger(__name__)
+
+#: Default maximum number of items waiting between two stages.
+DEFAULT_QUEUE_SIZE = 4
+
+#: Marks the end of the items in a queue.
+_END = object()
+
+
+class _Cancelled(Exception):
+    """Raised in stages when another stage failed."""
+
+
+@dataclasses.dataclass
+class StageStats:
+    #: Name of the stage
+    name: str
+
+    #: Time spent (in seconds) processing items.
+    busy: float = 0.0
+
+    #: Number of items processed.
+    items: int = 0
+
+
+@dataclasses.dataclass
+class PipelineStats:
+    #: Statistics of each stage, in order.
+    stages: typing.List[StageStats]
+
+    #: Time (in seconds) it took to run the whole pipeline.
+    wallTime: float = 0.0
+
+    @property
+    def sequentialTime(self) -> float:
+        """Time the stages would have taken if they were run one after the other."""
+        return sum(stage.busy for stage in self.stages)
+
+    @property
+    def overlap(self) -> float:
+        """Time saved by running the stages concurrently."""
+        return max(0.0, self.sequentialTime - self.wallTime)
+
+    def __str__(self) -> str:
+        stages = ", ".join(f"{stage.name} {stage.busy:.2f}s" for stage in self.stages)
+        return (
+            f"{self.wallTime:.2f}s ({stages}; {self.overlap:.2f}s saved by overlapping)"
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class Stage:
+    #: Name of the stage
+    name: str
+
+    #: Function called with each item. It gets the output of the previous stage.
+    func: typing.Callable[[typing.Any], typing.Any]
+
+    #: Number of threads processing items concurrently. Items can come out
+    #: of the stage in a different order when it's greater than 1.
+    workers: int = 1
+
+    #: Function that gives the position (0, 1, 2, etc) of an item. When set, items are
+    #: buffered in front of the stage and processed in that order, whatever the
+    #: order they arrive in. Only supported with a single worker.
+    order: typing.Optional[typing.Callable[[typing.Any], int]] = None
+
+    def __post_init__(self) -> None:
+        if self.order is not None and self.workers != 1:
+            raise ValueError(f"Stage {self.name!r}: order requires a single worker")
+
+
+class _Pipeline:
+    def __init__(self) -> None:
+        self.cancelled = threading.Event()
+        self.error: BaseException | None = None
+        self._lock = threading.Lock()
+
+    def fail(self, exc: BaseException) -> None:
+        with self._lock:
+            if self.error is None:
+                self.error = exc
+        self.cancelled.set()
+
+    def put(self, queue_: queue.Queue[typing.Any], item: typing.Any) -> None:
+        # Don't block forever if the consumer died.
+        while True:
+            if self.cancelled.is_set():
+                raise _Cancelled()
+            try:
+                queue_.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, queue_: queue.Queue[typing.Any]) -> typing.Any:
+        while True:
+            if self.cancelled.is_set():
+                raise _Cancelled()
+            try:
+                return queue_.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+
+T = typing.TypeVar("T")
+
+
+def runPipeline(
+    producer: typing.Callable[[typing.Callable[[T], None]], typing.Any],
+    stages: typing.Sequence[Stage],
+    producerName: str = "produce",
+    queueSize: int = DEFAULT_QUEUE_SIZE,
+) -> tuple[list[typing.Any], PipelineStats]:
+    """
+    Run a pipeline.
+
+    :param producer: Function that produces the items. It's called with an ``emit``
+        function that sends an item to the first stage. ``emit`` blocks when the
+        first stage is lagging behind.
+    :param stages: Stages, in order. A stage receives the output of the previous stage.
+    :param producerName: Name of the producer in the statistics.
+    :param queueSize: Maximum number of items waiting between two stages.
+    :returns: The outputs of the last stage, in the order they were completed, and
+        statistics about the run.
+    :raises: The first exception raised by the producer or a stage. The other
+        stages stop processing items as soon as something fails.
+    """
+    pipeline = _Pipeline()
+    stats = PipelineStats(
+        [StageStats(producerName)] + [StageStats(stage.name) for stage in stages]
+    )
+    queues: list[queue.Queue[typing.Any]] = [
+        queue.Queue(maxsize=queueSize) for _ in stages
+    ]
+    results: list[typing.Any] = []
+
+    start = time.perf_counter()
+
+    def emit(item: T) -> None:
+        stats.stages[0].items += 1
+        pipeline.put(queues[0], item)
+
+    def runProducer() -> None:
+        try:
+            producer(emit)
+            pipeline.put(queues[0], _END)
+        except _Cancelled:
+            pass
+        except BaseException as exc:
+            pipeline.fail(exc)
+        finally:
+            stats.stages[0].busy = time.perf_counter() - start
+
+    # Number of workers of each stage that are still running. The last worker
+    # of a stage to finish tells the next stage that there is nothing left.
+    remaining = [stage.workers for stage in stages]
+    lock = threading.Lock()
+
+    def runStage(index: int, stage: Stage) -> None:
+        stageStats = stats.stages[index + 1]
+
+        def process(item: typing.Any) -> None:
+            itemStart = time.perf_counter()
+            output = stage.func(item)
+            with lock:
+                stageStats.busy += time.perf_counter() - itemStart
+                stageStats.items += 1
+
+                if index + 1 == len(queues):
+                    results.append(output)
+
+            if index + 1 < len(queues):
+                pipeline.put(queues[index + 1], output)
+
+        # Items that arrived before their turn (see Stage.order).
+        pending: dict[int, typing.Any] = {}
+        nextPosition = 0
+
+        try:
+            while True:
+                item = pipeline.get(queues[index])
+                if item is _END:
+                    # Let the other workers of this stage know.
+                    pipeline.put(queues[index], _END)
+                    break
+
+                if stage.order is None:
+                    process(item)
+                    continue
+
+                pending[stage.order(item)] = item
+                while nextPosition in pending:
+                    process(pending.pop(nextPosition))
+                    nextPosition += 1
+
+            # Positions that never arrived don't hold back the others.
+            for position in sorted(pending):
+                process(pending.pop(position))
+
+            with lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+
+            if last and index + 1 < len(queues):
+                pipeline.put(queues[index + 1], _END)
+        except _Cancelled:
+            pass
+        except BaseException as exc:
+            pipeline.fail(exc)
+
+    threads = [threading.Thread(target=runProducer, name=producerName, daemon=True)]
+    threads += [
+        threading.Thread(
+            target=runStage,
+            args=(index, stage),
+            name=f"{stage.name}-{worker}",
+            daemon=True,
+        )
+        for index, stage in enumerate(stages)
+        for worker in range(stage.workers)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        for thread in threads:
+            thread.join()
+    except BaseException as exc:
+        # Ctrl-C, etc
+        pipeline.fail(exc)
+        raise
+
+    stats.wallTime = time.perf_counter() - start
+
+    if pipeline.error is not None:
+        raise pipeline.error
+
+    _LOG.debug(f"Pipeline finished in {stats}")
+    return results, stats
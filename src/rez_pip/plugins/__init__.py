@@ -11,13 +11,17 @@ import logging
 import pkgutil
 import functools
 import importlib
+import threading
 import dataclasses
 import collections.abc
 
 import pluggy
-import rez.package_maker
+
+import rez_pip.trace
 
 if typing.TYPE_CHECKING:
+    import rez.package_maker
+
     import rez_pip.pip
     import rez_pip.compat
 
@@ -151,6 +155,14 @@ def before(
     """Function that will be called before each hook."""
     _LOG.debug("Calling the %r hooks", hookName)
 
+    span = rez_pip.trace.span(
+        hookName,
+        "plugins",
+        plugins=[hookImpl.plugin_name for hookImpl in hookImpls],
+    )
+    span.__enter__()
+    _getHookSpans().append(span)
+
 
 def after(
     outcome: pluggy.Result[typing.Any],
@@ -161,6 +173,21 @@ def after(
     """Function that will be called after each hook."""
     _LOG.debug("Called the %r hooks", hookName)
 
+    exception = outcome.exception
+    _getHookSpans().pop().__exit__(
+        type(exception) if exception else None, exception, None
+    )
+
+
+_hookSpans = threading.local()
+
+
+def _getHookSpans() -> list[typing.ContextManager[typing.Any]]:
+    """Spans of the hooks being called by the current thread (hooks can be nested)."""
+    if not hasattr(_hookSpans, "stack"):
+        _hookSpans.stack = []
+    return typing.cast(typing.List[typing.ContextManager[typing.Any]], _hookSpans.stack)
+
 
 @functools.lru_cache
 def getManager() -> pluggy.PluginManager:
@@ -6,21 +6,32 @@ from __future__ import annotations
 
 import os
 import copy
+import json
+import stat
 import shutil
 import typing
+import hashlib
 import logging
 import pathlib
+import tempfile
 import itertools
 
 import rez.config
 import rez.version
 import rez.packages
+import rez.serialise
 import rez.package_maker
+import rez.package_remove
 import rez.resolved_context
+import rez.package_repository
 
 import rez_pip.pip
+import rez_pip.cache
+import rez_pip.trace
 import rez_pip.utils
+import rez_pip.install
 import rez_pip.plugins
+import rez_pip.transfer
 import rez_pip.exceptions
 from rez_pip.compat import importlib_metadata
 
@@ -38,7 +49,8 @@ def iterDistFiles(
     installedWheelsDir: str,
 ) -> typing.Iterator[tuple[pathlib.Path, str]]:
     """Iterate over the files in the distribution and return their absolute
-    and relative paths.
+    and relative paths. Prefer :func:`rez_pip.install.buildFileManifest`, which
+    doesn't resolve each path.
 
     :param dist: The distribution to iterate over.
     :param installedWheelsDir: The directory where the wheel was install installed to.
@@ -61,7 +73,19 @@ def createPackage(
     installedWheelsDir: str,
     prefix: str | None = None,
     release: bool = False,
+    fileTransfer: str = "auto",
+    installDirectly: typing.Callable[[str], None] | None = None,
 ) -> None:
+    """
+    Create a rez package from installed distributions.
+
+    :param fileTransfer: How files are transferred into the rez package.
+        See :data:`rez_pip.transfer.STRATEGIES`.
+    :param installDirectly: Called with the root of each new variant to install the
+        distributions into it. When set, the distributions of the group only need their
+        metadata (see :func:`rez_pip.install.extractMetadata`) and no files are
+        transferred from installedWheelsDir.
+    """
     _LOG.info(
         "Creating rez package for {0}".format(
             " + ".join(dist.name for dist in packageGroup.dists)
@@ -78,12 +102,19 @@ def createPackage(
         packageGroup.dists[0].version
     )
 
+    wheels = packageGroup.wheels or [
+        rez_pip.install.WheelMetadata.fromDistribution(dist)
+        for dist in packageGroup.dists
+    ]
+
     requires = []
     variant_requires = []
     metadata: dict[str, typing.Any] = {}
     isPure = True
-    for dist in packageGroup.dists:
-        requirements = rez_pip.utils.getRezRequirements(dist, pythonVersion, [])
+    for dist, wheel in zip(packageGroup.dists, wheels):
+        requirements = rez_pip.utils.getRezRequirements(
+            dist, pythonVersion, [], wheel=wheel
+        )
         if not metadata:
             # For now we only use the metadata from the first package. Far from ideal...
             metadata = requirements.metadata
@@ -108,108 +139,332 @@ def createPackage(
         if isPure:
             isPure = metadata["is_pure_python"]
 
-    if prefix:
-        packagesPath = prefix
-    else:
-        packagesPath = (
-            rez.config.config.release_packages_path
-            if release
-            else rez.config.config.local_packages_path
-        )
+    packagesPath = _getPackagesPath(prefix, release)
+
+    # rez writes the package definition before it populates the variant. Keep the
+    # current definition to be able to remove the variant if populating it fails.
+    definition: tuple[str, str] | None = None
+    existingPackage = rez.packages.get_package(name, version, paths=[packagesPath])
+    if existingPackage is not None:
+        definitionPath: str = getattr(existingPackage.resource, "filepath")
+        with open(definitionPath, encoding="utf-8") as fd:
+            definition = (definitionPath, fd.read())
+
+    # Root of the variant being populated.
+    variantRoot: str | None = None
 
     def make_root(variant: rez.packages.Variant, path: str) -> None:
-        """Using distlib to iterate over all installed files of the current
-        distribution to copy files to the target directory of the rez package
-        variant
+        """Populate the root of a variant, either by transferring the installed files
+        of the distributions or by installing them directly into it.
         """
+        nonlocal variantRoot
+        variantRoot = path
+
         formattedRequirements = ", ".join(str(req) for req in variant.variant_requires)
 
         _LOG.info(
             rf"Installing {variant.qualified_package_name} \[{formattedRequirements}]"
         )
-        for dist in packageGroup.dists:
-            if not dist.files:
-                raise RuntimeError(
-                    f"{dist.name} package has no files registered! Something is wrong maybe?"
-                )
 
-            for srcAbsolute, relPath in iterDistFiles(dist, installedWheelsDir):
-                dest = os.path.join(path, relPath)
-
-                if not os.path.exists(os.path.dirname(dest)):
-                    os.makedirs(os.path.dirname(dest))
-
-                _LOG.debug(f"Copying {str(srcAbsolute)!r} to {str(dest)!r}")
-                shutil.copyfile(srcAbsolute, dest)
-                shutil.copystat(srcAbsolute, dest)
-
-    with rez.package_maker.make_package(
-        name, packagesPath, make_root=make_root, skip_existing=True, warn_on_skip=False
-    ) as pkg:
-        pkg.version = version
+        # Populate the variant in a temporary directory next to it, and move it in
+        # place once it's complete. If anything fails, the variant is removed
+        # (see _removeVariant).
+        tmpRoot = tempfile.mkdtemp(
+            prefix=f".{os.path.basename(path)}-", dir=os.path.dirname(path)
+        )
+        # mkdtemp creates private directories. Use the permissions rez gave to the root.
+        shutil.copymode(path, tmpRoot)
+        try:
+            with rez_pip.trace.span(
+                "populate variant",
+                "rez",
+                variant=variant.qualified_name,
+                direct=bool(installDirectly),
+            ):
+                if installDirectly:
+                    installDirectly(tmpRoot)
+                else:
+                    _transferFiles(tmpRoot)
+            _promote(tmpRoot, path)
+        except BaseException:
+            shutil.rmtree(tmpRoot, ignore_errors=True)
+            raise
+
+    def _transferFiles(path: str) -> None:
+        transfer = rez_pip.transfer.FileTransfer(fileTransfer, installedWheelsDir, path)
+        manifests = packageGroup.manifests or [
+            rez_pip.install.buildFileManifest(dist) for dist in packageGroup.dists
+        ]
 
-        # requirements and variants
-        if requires:
-            pkg.requires = requires
+        createdDirs: set[str] = set()
+        for manifest in manifests:
+            for file_ in manifest.files:
+                src = os.path.join(manifest.root, file_.path)
+                dest = os.path.join(path, file_.path)
 
-        if variant_requires:
-            pkg.variants = [variant_requires]
+                destDir = os.path.dirname(dest)
+                if destDir not in createdDirs:
+                    os.makedirs(destDir, exist_ok=True)
+                    createdDirs.add(destDir)
 
-        # commands
-        commands = ["env.PYTHONPATH.append('{root}/python')"]
+                _LOG.debug(f"Copying {src!r} to {dest!r}")
+                transfer(src, dest)
 
-        # Collect console scripts from entry_points
-        console_scripts = set(
-            [ep.name for ep in dist.entry_points if ep.group == "console_scripts"]
+        _LOG.debug(
+            f"Transferred {sum(len(m.files) for m in manifests)} files "
+            f"({sum(m.size for m in manifests)} bytes) using {dict(transfer.counts)} "
+            f"({fileTransfer!r} strategy)"
         )
 
-        # Also check for scripts from dist-info data.
-        # (some packages like ruff don't use entry_points but put scripts in .data/scripts/)
-        if dist.files:
-            for _, relPath in iterDistFiles(dist, installedWheelsDir):
-                # Check if path matches pattern: <name>-<version>.data/scripts/<script_name>
-                # Skip anything that is nested under scripts (.data/scripts/sub/file)
-                if os.path.dirname(
-                    relPath
-                ) == "scripts" and os.path.sep not in os.path.basename(relPath):
-                    console_scripts.add(os.path.basename(relPath))
-
-        if console_scripts:
-            pkg.tools = list(console_scripts)
-            # TODO: Don't hardcode scripts here.
-            commands.append("env.PATH.append('{root}/scripts')")
-
-        pkg.commands = "\n".join(commands)
-
-        # Make the package use hashed variants. This is required because we
-        # can't control what ends up in its variants, and that can easily
-        # include problematic chars (>, +, ! etc).
-        # TODO: #672 (shortlinks for variants)
-        pkg.hashed_variants = True
-
-        pkg.pip = {
-            "name": dist.name,
-            "version": dist.version,
-            "is_pure_python": isPure,
-            "wheel_urls": packageGroup.downloadUrls,
-            "rez_pip_version": importlib_metadata.version("rez-pip"),
-        }
-
-        # Take all the metadata that can be converted and put it
-        # in the rez package definition.
-        convertedMetadata, remainingMetadata = _convertMetadata(dist)
-        for key, values in convertedMetadata.items():
-            setattr(pkg, key, values)
-
-        pkg.pip["metadata"] = remainingMetadata
-
-        rez_pip.plugins.getHook().metadata(package=pkg)
+    try:
+        with rez_pip.trace.span(
+            f"{name}-{version}", "rez", pythonVersion=str(pythonVersion)
+        ):
+            with rez.package_maker.make_package(
+                name,
+                packagesPath,
+                make_root=make_root,
+                skip_existing=True,
+                warn_on_skip=False,
+            ) as pkg:
+                pkg.version = version
+
+                # requirements and variants
+                if requires:
+                    pkg.requires = requires
+
+                if variant_requires:
+                    pkg.variants = [variant_requires]
+
+                # commands
+                commands = ["env.PYTHONPATH.append('{root}/python')"]
+
+                # Console scripts from entry_points and from the .data/scripts directory
+                # (some packages like ruff don't use entry_points).
+                console_scripts = set(wheel.scripts)
+
+                if console_scripts:
+                    pkg.tools = list(console_scripts)
+                    # TODO: Don't hardcode scripts here.
+                    commands.append("env.PATH.append('{root}/scripts')")
+
+                pkg.commands = "\n".join(commands)
+
+                # Make the package use hashed variants. This is required because we
+                # can't control what ends up in its variants, and that can easily
+                # include problematic chars (>, +, ! etc).
+                # TODO: #672 (shortlinks for variants)
+                pkg.hashed_variants = True
+
+                pkg.pip = {
+                    "name": dist.name,
+                    "version": dist.version,
+                    "is_pure_python": isPure,
+                    "wheel_urls": packageGroup.downloadUrls,
+                    "rez_pip_version": importlib_metadata.version("rez-pip"),
+                }
+
+                # Take all the metadata that can be converted and put it
+                # in the rez package definition.
+                convertedMetadata, remainingMetadata = _convertMetadata(dist)
+                for key, values in convertedMetadata.items():
+                    setattr(pkg, key, values)
+
+                pkg.pip["metadata"] = remainingMetadata
+
+                rez_pip.plugins.getHook().metadata(package=pkg)
+    except BaseException:
+        _removeVariant(name, version, packagesPath, definition, variantRoot)
+        raise
 
     _LOG.info(
         f"[bold]Created {len(pkg.installed_variants)} variants and skipped {len(pkg.skipped_variants)}"
     )
 
 
+def _getPackagesPath(prefix: str | None, release: bool) -> str:
+    """Get the repository packages are created in."""
+    if prefix:
+        return prefix
+
+    return typing.cast(
+        str,
+        (
+            rez.config.config.release_packages_path
+            if release
+            else rez.config.config.local_packages_path
+        ),
+    )
+
+
+def packageGroupExists(
+    packageGroup: rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo],
+    pythonVersion: rez.version.Version,
+    prefix: str | None = None,
+    release: bool = False,
+) -> bool:
+    """
+    Check if the variant that :func:`createPackage` would create for a group of
+    resolved packages already exists in the target repository. Used to skip
+    downloading and installing packages that would be skipped anyway.
+
+    The variant is computed from what pip reported, the same way as it will be
+    once the packages are installed (see :func:`rez_pip.utils.getRezRequirementsFromReport`).
+    """
+    packages = packageGroup.packages
+    rezNames = [
+        rez_pip.utils.pythontDistributionNameToRez(package.name) for package in packages
+    ]
+
+    rezPackage = rez.packages.get_package(
+        rezNames[0],
+        rez_pip.utils.pythonDistributionVersionToRez(packages[0].version),
+        paths=[_getPackagesPath(prefix, release)],
+    )
+    if rezPackage is None:
+        return False
+
+    existingVariants = [
+        [str(require) for require in variant.variant_requires]
+        for variant in rezPackage.iter_variants()
+    ]
+
+    # Pip doesn't report entry points, which add platform and arch to the variant
+    # of pure packages. It doesn't report if wheels are purelib either, and some
+    # none-any wheels are not (see rez_pip.utils.isPackagePure). The existing package
+    # was created from the same wheels, so it can only have one of these variants.
+    purities: tuple[bool | None, ...] = (None,)
+    if any(rez_pip.utils.isPackagePure(package) for package in packages):
+        purities = (None, False)
+
+    for isPure, hasEntryPoints in itertools.product(purities, (False, True)):
+        variantRequires: list[str] = []
+        for package in packages:
+            requirements = rez_pip.utils.getRezRequirementsFromReport(
+                package, pythonVersion, hasEntryPoints, isPure=isPure
+            )
+            for require in requirements.variant_requires:
+                requirement = rez.version.Requirement(require)
+                if (
+                    str(requirement) not in variantRequires
+                    and requirement.name not in rezNames[1:]
+                ):
+                    variantRequires.append(str(requirement))
+
+        if variantRequires in existingVariants:
+            _LOG.debug(
+                f"{rezPackage.qualified_name} already has a variant with {variantRequires}"
+            )
+            return True
+
+    return False
+
+
+def getPurePackageGroupKey(
+    packageGroup: rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo],
+    pythonVersion: rez.version.Version,
+    prefix: str | None = None,
+    release: bool = False,
+) -> str | None:
+    """
+    Get a key that identifies the variant :func:`createPackage` would create for
+    a group of pure python packages. Pure wheels usually create the same variant
+    for all python versions, so they only need to be installed once per run.
+
+    The requirements are part of the key since environment markers can still
+    make them different for some python versions.
+
+    Purity is guessed from the wheel tags. The key is only valid if the wheels are
+    really purelib, which must be checked once they are downloaded
+    (see :attr:`rez_pip.install.WheelMetadata.isPure`).
+
+    :returns: The key, or None if one of the packages is not pure python
+        (see :func:`rez_pip.utils.isPackagePure`).
+    """
+    if not all(
+        rez_pip.utils.isPackagePure(package) for package in packageGroup.packages
+    ):
+        return None
+
+    digest = hashlib.sha256(_getPackagesPath(prefix, release).encode("utf-8"))
+    for package in packageGroup.packages:
+        requirements = rez_pip.utils.getRezRequirementsFromReport(
+            package, pythonVersion, hasEntryPoints=False
+        )
+        digest.update(
+            json.dumps(
+                [
+                    package.download_info.url,
+                    requirements.requires,
+                    requirements.variant_requires,
+                ]
+            ).encode("utf-8")
+        )
+    return digest.hexdigest()
+
+
+def _promote(tmpRoot: str, root: str) -> None:
+    """Replace the (empty) variant root with tmpRoot."""
+    if not os.listdir(root):
+        try:
+            # Renaming a directory over an empty directory is atomic on POSIX.
+            os.replace(tmpRoot, root)
+            return
+        except OSError:
+            # Windows can't rename over a directory. rez also made the root the
+            # current directory, which Windows can't remove.
+            pass
+
+    # Packages without variants are populated in their version directory, next
+    # to their package.py. Move the content of tmpRoot instead. This is not atomic,
+    # but the variant is removed if it fails (see _removeVariant).
+    for name in os.listdir(tmpRoot):
+        os.replace(os.path.join(tmpRoot, name), os.path.join(root, name))
+    os.rmdir(tmpRoot)
+
+
+def _removeVariant(
+    name: str,
+    version: str,
+    packagesPath: str,
+    definition: tuple[str, str] | None,
+    root: str | None,
+) -> None:
+    """
+    Remove the variant :func:`createPackage` failed to create. rez writes the
+    package definition before the variant is populated, so the variant would
+    otherwise look installed and be skipped by the next runs.
+
+    :param definition: Path and content of the package definition before the
+        variant was created. None if the package didn't exist.
+    :param root: Root of the variant, if rez created it.
+    """
+    try:
+        if definition is None:
+            rez.package_remove.remove_package(name, version, packagesPath)
+        else:
+            path, content = definition
+            # rez reads the files it wrote from a local copy. Write
+            # the definition back the same way.
+            with rez.serialise.open_file_for_write(
+                path, mode=stat.S_IMODE(os.stat(path).st_mode)
+            ) as fd:
+                fd.write(content)
+
+            # The variants of existing packages have their own (hashed) root.
+            if root and os.path.isdir(root) and root != os.path.dirname(path):
+                shutil.rmtree(root)
+    except Exception as exc:
+        _LOG.error(
+            f"Failed to remove the incomplete variant of {name}-{version}: {exc}"
+        )
+
+    # rez caches the package definitions.
+    rez.package_repository.package_repository_manager.get_repository(
+        packagesPath
+    ).clear_caches()
+
+
 def _convertMetadata(
     dist: importlib_metadata.Distribution,
 ) -> tuple[dict[str, typing.Any], dict[str, typing.Any]]:
@@ -307,17 +562,21 @@ def _convertMetadata(
 
 
 def getPythonExecutables(
-    range_: str | None, packageFamily: str = "python"
+    range_: str | None,
+    packageFamily: str = "python",
+    cache: rez_pip.cache.InterpreterCache | None = None,
 ) -> dict[str, pathlib.Path]:
     """
     Get the available python executable from rez packages.
 
     :param range_: version specifier
     :param packageFamily: Name of the rez package family for the python package. This allows ot support PyPy, etc.
+    :param cache: Cache of the executables found in the python packages. Finding them
+        requires resolving a context for each version, which can be slow.
     :returns: Dict where the keys are the python versions and values are abolute paths to executables.
     """
     for family in rez.packages.iter_package_families():
-        if family.name == "python":
+        if family.name == packageFamily:
             break
     else:
         raise NoPythonFound(f"No package family named {packageFamily!r} found")
@@ -350,15 +609,24 @@ def getPythonExecutables(
         # Note that "pkgs" is already in the right order since all_packages is sorted.
         packages = [pkgs[-1] for pkgs in groups]
 
-    pythons: dict[str, pathlib.Path] = {}
-    for package in packages:
-        resolvedContext = rez.resolved_context.ResolvedContext(
-            [f"{package.name}=={package.version}"]
+    key = None
+    if cache is not None:
+        key = cache.getKey(
+            packageFamily,
+            rez.config.config.packages_path,
+            [_getPackageStamp(package) for package in packages],
         )
+        cached = cache.get(key)
+        if cached is not None:
+            _LOG.debug(f"Found python executables in the cache: {cached}")
+            return {version: pathlib.Path(path) for version, path in cached.items()}
 
-        # Make sure that system PATH doens't interfere with the "which" method.
-        resolvedContext.append_sys_path = False
+    # The rez solver is not thread safe, so the contexts are resolved one after
+    # the other. The cache above is what avoids paying for this on every run.
+    resolvedContexts = [_resolvePythonContext(package) for package in packages]
 
+    pythons: dict[str, pathlib.Path] = {}
+    for package, resolvedContext in zip(packages, resolvedContexts):
         for trimmedVersion in map(package.version.trim, [2, 1, 0]):
             path = resolvedContext.which(f"python{trimmedVersion}", parent_environ={})
             if path:
@@ -369,4 +637,33 @@ def getPythonExecutables(
                 f"Failed to find a Python executable in the {package.qualified_name!r} rez package"
             )
 
+    if cache is not None and key:
+        cache.set(key, {version: os.fspath(path) for version, path in pythons.items()})
+
     return pythons
+
+
+def _resolvePythonContext(
+    package: rez.packages.Package,
+) -> rez.resolved_context.ResolvedContext:
+    resolvedContext = rez.resolved_context.ResolvedContext(
+        [f"{package.name}=={package.version}"]
+    )
+
+    # Make sure that system PATH doens't interfere with the "which" method.
+    resolvedContext.append_sys_path = False
+    return resolvedContext
+
+
+def _getPackageStamp(package: rez.packages.Package) -> str:
+    """
+    Identify a package and its state. If the package changes (re-released,
+    edited, etc), its stamp changes.
+    """
+    stamp = f"{package.qualified_name}:{package.uri}:{package.timestamp}"
+    try:
+        stamp += f":{os.stat(package.uri).st_mtime_ns}"
+    except (OSError, TypeError, ValueError):
+        # Not a file (memory repository, etc).
+        pass
+    return stamp
@@ -0,0 +1,214 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Timing traces in the Chrome trace event format (see ``--trace``). Traces can be
+opened in https://ui.perfetto.dev or chrome://tracing.
+
+Spans are recorded with :func:`span`. When tracing is not enabled, :func:`span`
+returns a no-op context manager, so instrumented code costs almost nothing.
+
+Timestamps are taken from a monotonic clock anchored to the wall clock when tracing
+starts. This way, spans from threads, asyncio tasks and worker processes
+line up on the same timeline.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import typing
+import threading
+
+if typing.TYPE_CHECKING:
+    import types
+
+
+class Tracer:
+    """Collect the trace events of the current process."""
+
+    def __init__(self) -> None:
+        self.events: list[dict[str, typing.Any]] = []
+        self._offset = time.time_ns() - time.perf_counter_ns()
+        self._threads: set[int] = set()
+        self._pid = os.getpid()
+
+        self.events.append(
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": self._pid,
+                "tid": 0,
+                "args": {"name": f"rez-pip ({self._pid})"},
+            }
+        )
+
+    def now(self) -> float:
+        """Current time in microseconds."""
+        return (time.perf_counter_ns() + self._offset) / 1000
+
+    def addEvent(self, event: dict[str, typing.Any]) -> None:
+        event["pid"] = self._pid
+
+        if "tid" not in event:
+            tid = threading.get_ident()
+            if tid not in self._threads:
+                self._threads.add(tid)
+                self.events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": self._pid,
+                        "tid": tid,
+                        "args": {"name": threading.current_thread().name},
+                    }
+                )
+            event["tid"] = tid
+
+        # list.append is atomic, no need for a lock.
+        self.events.append(event)
+
+
+def _getCurrentTask() -> object | None:
+    # Don't import asyncio if it's not already used.
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is None:
+        return None
+
+    try:
+        return typing.cast(typing.Optional[object], asyncio.current_task())
+    except RuntimeError:
+        return None
+
+
+class _Span:
+    def __init__(
+        self, tracer: Tracer, name: str, category: str, args: dict[str, typing.Any]
+    ) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._args = args
+        self._start = 0.0
+        self._task: object | None = None
+
+    def __enter__(self) -> dict[str, typing.Any]:
+        self._task = _getCurrentTask()
+        self._start = self._tracer.now()
+        return self._args
+
+    def __exit__(
+        self,
+        excType: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: types.TracebackType | None,
+    ) -> None:
+        end = self._tracer.now()
+        if excType is not None:
+            self._args["error"] = excType.__name__
+
+        if self._task is None:
+            self._tracer.addEvent(
+                {
+                    "name": self._name,
+                    "cat": self._category,
+                    "ph": "X",
+                    "ts": self._start,
+                    "dur": end - self._start,
+                    "args": self._args,
+                }
+            )
+            return
+
+        # Tasks interleave on the same thread, which would break the nesting of
+        # complete ("X") events. Use async events, one track per task.
+        for phase, ts in (("b", self._start), ("e", end)):
+            self._tracer.addEvent(
+                {
+                    "name": self._name,
+                    "cat": self._category,
+                    "ph": phase,
+                    "ts": ts,
+                    "id": id(self._task),
+                    "args": self._args if phase == "b" else {},
+                }
+            )
+
+
+class _NullSpan:
+    def __enter__(self) -> dict[str, typing.Any]:
+        return {}
+
+    def __exit__(self, *args: typing.Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+_tracer: Tracer | None = None
+
+
+def isEnabled() -> bool:
+    return _tracer is not None
+
+
+def start() -> None:
+    """Start recording spans in this process."""
+    global _tracer
+    _tracer = Tracer()
+
+
+def stop() -> list[dict[str, typing.Any]]:
+    """Stop recording spans.
+
+    :returns: The recorded events.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer.events if tracer else []
+
+
+def collect() -> list[dict[str, typing.Any]]:
+    """Take the events recorded so far, to send them to another process."""
+    if _tracer is None:
+        return []
+
+    events, _tracer.events = _tracer.events, []
+    return events
+
+
+def addEvents(events: list[dict[str, typing.Any]]) -> None:
+    """Add events recorded by another process (see :func:`collect`)."""
+    if _tracer is not None:
+        _tracer.events.extend(events)
+
+
+def span(
+    name: str, category: str = "rez_pip", **args: typing.Any
+) -> typing.ContextManager[dict[str, typing.Any]]:
+    """
+    Record the time spent in a block of code.
+
+    .. code-block:: python
+
+       with rez_pip.trace.span("download", "download", url=url) as spanArgs:
+           ...
+           spanArgs["bytes"] = size
+
+    :param name: Name of the span.
+    :param category: Category of the span. Categories can be filtered in trace viewers.
+    :param args: Values attached to the span. More can be added to the dict
+        returned by the context manager.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, category, args)
+
+
+def write(events: list[dict[str, typing.Any]], path: str) -> None:
+    """Write events as a trace file."""
+    with open(path, "w", encoding="utf-8") as fd:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fd)
@@ -0,0 +1,169 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Strategies to transfer installed files into rez packages.
+"""
+
+from __future__ import annotations
+
+import os
+import errno
+import shutil
+import typing
+import logging
+import collections
+
+import rez_pip.exceptions
+
+_LOG = logging.getLogger(__name__)
+
+#: Available strategies. "auto" picks the fastest one that works.
+STRATEGIES = ("auto", "reflink", "hardlink", "copy_file_range", "copy")
+
+#: ioctl to clone a file (share its extents) on Linux. Supported by btrfs, XFS, etc.
+FICLONE = 0x40049409
+
+#: Errors that mean that a strategy is not supported by the OS or file systems.
+_UNSUPPORTED_ERRORS = frozenset(
+    [
+        errno.EXDEV,
+        errno.EINVAL,
+        errno.ENOSYS,
+        errno.ENOTTY,
+        errno.EPERM,
+        errno.EMLINK,
+        errno.EOPNOTSUPP,
+        getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+    ]
+)
+
+
+class TransferError(rez_pip.exceptions.RezPipError):
+    """
+    Raised when the requested file transfer strategy can't be used.
+    """
+
+
+def reflink(src: str, dest: str) -> None:
+    """Clone src to dest. Both files share their data until one of them is modified."""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.ENOTSUP, "reflinks are not supported on this platform")
+
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    shutil.copystat(src, dest)
+
+
+def hardlink(src: str, dest: str) -> None:
+    """Hard link src to dest. Both paths point to the same file (and metadata)."""
+    os.link(src, dest)
+
+
+def copyFileRange(src: str, dest: str) -> None:
+    """Copy src to dest in the kernel, without going through user space."""
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "copy_file_range is not supported")
+
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+    shutil.copystat(src, dest)
+
+
+def copy(src: str, dest: str) -> None:
+    """Copy src to dest, including its permissions and times."""
+    shutil.copyfile(src, dest)
+    shutil.copystat(src, dest)
+
+
+_FUNCTIONS: dict[str, typing.Callable[[str, str], None]] = {
+    "reflink": reflink,
+    "hardlink": hardlink,
+    "copy_file_range": copyFileRange,
+    "copy": copy,
+}
+
+
+def _getDevice(path: str) -> int | None:
+    # The destination might not exist yet. Use its closest existing parent.
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except FileNotFoundError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+class FileTransfer:
+    """
+    Transfer files from a source directory to a destination directory using a
+    given strategy.
+
+    With "auto", reflinks and hard links are only tried if both directories are on the
+    same file system. Strategies that turn out to not be supported are not tried
+    again, and the next one is used. The last resort is a regular copy.
+
+    :param strategy: One of :data:`STRATEGIES`.
+    :param srcRoot: Directory where files are transferred from.
+    :param destRoot: Directory where files are transferred to.
+    """
+
+    def __init__(self, strategy: str, srcRoot: str, destRoot: str) -> None:
+        if strategy not in STRATEGIES:
+            raise TransferError(
+                f"Unknown file transfer strategy {strategy!r}. Must be one of {', '.join(STRATEGIES)}"
+            )
+
+        self.strategy = strategy
+        #: Number of files transferred with each strategy.
+        self.counts: collections.Counter[str] = collections.Counter()
+
+        if strategy != "auto":
+            self._candidates = [strategy]
+        else:
+            srcDevice = _getDevice(srcRoot)
+            sameFileSystem = srcDevice is not None and srcDevice == _getDevice(destRoot)
+            self._candidates = (["reflink", "hardlink"] if sameFileSystem else []) + [
+                "copy_file_range",
+                "copy",
+            ]
+            _LOG.debug(
+                f"{srcRoot!r} and {destRoot!r} are {'' if sameFileSystem else 'not '}on the same file system. "
+                f"Will try {', '.join(self._candidates)}"
+            )
+
+    def __call__(self, src: str, dest: str) -> None:
+        while True:
+            name = self._candidates[0]
+            try:
+                _FUNCTIONS[name](src, dest)
+            except OSError as exc:
+                if exc.errno not in _UNSUPPORTED_ERRORS or name == "copy":
+                    raise
+
+                if self.strategy != "auto":
+                    raise TransferError(
+                        f"Failed to transfer {src!r} to {dest!r} using {name!r}: {exc}. "
+                        'Use "auto" to automatically fallback to another strategy.'
+                    )
+
+                _LOG.debug(f"{name} is not supported ({exc}). Falling back.")
+                self._candidates.pop(0)
+
+                # Don't leave a half written file behind.
+                if os.path.lexists(dest):
+                    os.remove(dest)
+                continue
+
+            self.counts[name] += 1
+            return
@@ -4,20 +4,23 @@
 
 from __future__ import annotations
 
+import copy
 import typing
 import logging
+import functools
+import urllib.parse
 import dataclasses
 
-import rez.system
 import rez.version
 import rich.console
+import packaging.markers
 import packaging.version
 import packaging.specifiers
 import packaging.requirements
 
-import rez_pip.install
-
 if typing.TYPE_CHECKING:
+    import rez_pip.pip
+    import rez_pip.install
     from rez_pip.compat import importlib_metadata
 
 _LOG = logging.getLogger(__name__)
@@ -25,6 +28,11 @@ _LOG = logging.getLogger(__name__)
 
 CONSOLE = rich.console.Console()
 
+#: Maximum number of entries of each conversion cache. The same versions, specifiers,
+#: requirements and markers are found in many distributions and are converted
+#: for each python version.
+CACHE_SIZE = 8192
+
 
 @dataclasses.dataclass
 class RequirementsDict:
@@ -47,6 +55,13 @@ def pythontDistributionNameToRez(name: str) -> str:
     return name.replace("-", "_")
 
 
+def clearCaches() -> None:
+    """Clear the conversion caches (see :data:`CACHE_SIZE`)."""
+    for function in _CACHED_FUNCTIONS:
+        function.cache_clear()
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
 def pythonDistributionVersionToRez(version: str) -> str:
     """Convert a distribution version to a rez compatible version.
 
@@ -164,6 +179,15 @@ def pythonSpecifierToRezRequirement(
 
     `VersionRange`: Equivalent rez version range.
     """
+    # Cached on the string. Specifier sets like "==1" and "==1.0" compare equal,
+    # but they are not converted to the same range.
+    return _pythonSpecifierToRezRequirement(str(specifier))
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _pythonSpecifierToRezRequirement(specifierString: str) -> rez.version.VersionRange:
+    """See :func:`pythonSpecifierToRezRequirement`."""
+    specifier = packaging.specifiers.SpecifierSet(specifierString)
 
     def is_release(rezVer: str) -> bool:
         parts = rezVer.split(".")
@@ -280,10 +304,18 @@ def pythonReqToRezReq(
             f"Ignoring extras requested on {pythonReq!r} - this is not yet supported"
         )
 
-    req = pythontDistributionNameToRez(pythonReq.name)
+    return _pythonReqToRezReq(pythonReq.name, str(pythonReq.specifier))
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _pythonReqToRezReq(name: str, specifier: str) -> rez.version.Requirement:
+    """See :func:`pythonReqToRezReq`."""
+    req = pythontDistributionNameToRez(name)
 
-    if pythonReq.specifier:
-        range_ = pythonSpecifierToRezRequirement(pythonReq.specifier)
+    if specifier:
+        range_ = pythonSpecifierToRezRequirement(
+            packaging.specifiers.SpecifierSet(specifier)
+        )
         req += "-" + str(range_)
 
     return rez.version.Requirement(req)
@@ -292,6 +324,42 @@ def pythonReqToRezReq(
 class CustomPyPackagingRequirement(packaging.requirements.Requirement):
     conditional_extras: set[str] | None
 
+    def __copy__(self) -> CustomPyPackagingRequirement:
+        # The default implementation parses the requirement again.
+        new = type(self).__new__(type(self))
+        new.name = self.name
+        new.url = self.url
+        new.extras = set(self.extras)
+        new.specifier = self.specifier
+        new.marker = self.marker
+        new.conditional_extras = (
+            set(self.conditional_extras)
+            if self.conditional_extras is not None
+            else None
+        )
+        return new
+
+
+def _reconstructRequirement(
+    req: CustomPyPackagingRequirement,
+    marker_str: str | None = None,
+    conditional_extras: set[str] | None = None,
+) -> CustomPyPackagingRequirement:
+    new_req_str = req.name
+
+    if req.specifier:
+        new_req_str += " (%s)" % str(req.specifier)
+
+    if marker_str is None and req.marker:
+        marker_str = str(req.marker)
+
+    if marker_str:
+        new_req_str += " ; " + marker_str
+
+    new_req = CustomPyPackagingRequirement(new_req_str)
+    new_req.conditional_extras = conditional_extras
+    return new_req
+
 
 def normalizeRequirement(
     requirement: str | dict[typing.Any, typing.Any],
@@ -326,26 +394,6 @@ def normalizeRequirement(
         multiple requirements.
     """
 
-    def reconstruct(
-        req: CustomPyPackagingRequirement,
-        marker_str: str | None = None,
-        conditional_extras: set[str] | None = None,
-    ) -> CustomPyPackagingRequirement:
-        new_req_str = req.name
-
-        if req.specifier:
-            new_req_str += " (%s)" % str(req.specifier)
-
-        if marker_str is None and req.marker:
-            marker_str = str(req.marker)
-
-        if marker_str:
-            new_req_str += " ; " + marker_str
-
-        new_req = CustomPyPackagingRequirement(new_req_str)
-        new_req.conditional_extras = conditional_extras
-        return new_req
-
     # PEP426 dict syntax
     # So only metadata that are of version 2.0 will be in dict. The other versions
     # (1.0, 1.1, 1.2, 2.1) will be strings.
@@ -363,12 +411,21 @@ def normalizeRequirement(
 
         for req_str in requires:
             req = CustomPyPackagingRequirement(req_str)
-            new_req = reconstruct(req, marker_str, conditional_extras1)
+            new_req = _reconstructRequirement(req, marker_str, conditional_extras1)
             result.append(new_req)
 
         return result
 
-    # string-based syntax
+    # string-based syntax. Requirements are cached, so return copies that
+    # can be modified by the caller.
+    return [copy.copy(req) for req in _normalizeRequirementString(requirement)]
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _normalizeRequirementString(
+    requirement: str,
+) -> tuple[CustomPyPackagingRequirement, ...]:
+    """See :func:`normalizeRequirement`."""
     req = CustomPyPackagingRequirement(requirement)
 
     # detect case: "mypkg ; extra == 'dev'"
@@ -379,7 +436,7 @@ def normalizeRequirement(
     # already in PEP508, packaging lib- friendly format
     if "extra" not in marker_parts:
         req.conditional_extras = None
-        return [req]
+        return (req,)
 
     # Parse conditional extras out of marker
     conditional_extras: set[str] = set()
@@ -407,8 +464,8 @@ def normalizeRequirement(
     else:
         new_marker_str = ""
 
-    new_req = reconstruct(req, new_marker_str, conditional_extras)
-    return [new_req]
+    new_req = _reconstructRequirement(req, new_marker_str, conditional_extras)
+    return (new_req,)
 
 
 def convertMarker(marker: str) -> list[str]:
@@ -427,6 +484,12 @@ def convertMarker(marker: str) -> list[str]:
     :param marker: Environment marker string, eg 'python_version == "3"'.
     :returns: System requirements (unversioned).
     """
+    return list(_convertMarker(marker))
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _convertMarker(marker: str) -> tuple[str, ...]:
+    """See :func:`convertMarker`."""
     _py = "python"
     _plat = "platform"
     _arch = "arch"
@@ -469,13 +532,39 @@ def convertMarker(marker: str) -> list[str]:
         if varname in marker_parts:
             sys_requires.update(sys_reqs)
 
-    return list(sys_requires)
+    return tuple(sys_requires)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _evaluateMarker(marker: str, pythonVersion: str) -> bool:
+    """Evaluate a marker for a python version, which may not be the current interpreter version."""
+    version = rez.version.Version(pythonVersion)
+
+    # JC: TODO: Use rez to resolve the ful npython version based on the provided version?
+    return packaging.markers.Marker(marker).evaluate(
+        environment={
+            "python_full_version": str(version),
+            "python_version": str(version.trim(2)),
+            "implementation_version": str(version),
+        }
+    )
+
+
+_CACHED_FUNCTIONS = (
+    pythonDistributionVersionToRez,
+    _pythonSpecifierToRezRequirement,
+    _pythonReqToRezReq,
+    _normalizeRequirementString,
+    _convertMarker,
+    _evaluateMarker,
+)
 
 
 def getRezRequirements(
     installedDist: importlib_metadata.Distribution,
     pythonVersion: rez.version.Version,
     nameCasings: list[str] | None = None,
+    wheel: rez_pip.install.WheelMetadata | None = None,
 ) -> RequirementsDict:
     """Get requirements of the given dist, in rez-compatible format.
 
@@ -509,9 +598,96 @@ def getRezRequirements(
         'foo', when in fact the package that pip has downloaded is called 'Foo'.
         Be sure to provide names in PIP format, not REZ format (the pip package
         'foo-bah' will be converted to 'foo_bah' in rez).
+    :param wheel: Metadata of the wheel of the distribution
+        (see :func:`rez_pip.install.readWheelMetadata`). It's read from the
+        distribution if not given.
     :returns: See example above.
     """
-    _system = rez.system.System()
+    import rez_pip.install
+
+    if wheel is None:
+        wheel = rez_pip.install.WheelMetadata.fromDistribution(installedDist)
+
+    return _convertRequirements(
+        installedDist.name,
+        list(wheel.requires),
+        wheel.providesExtra or [],
+        wheel.requiresPython,
+        wheel.isPure,
+        # entry_points scripts are platform and arch specific executables generated by
+        # python build frontends during install
+        wheel.hasEntryPoints,
+        pythonVersion,
+        nameCasings,
+    )
+
+
+def isPackagePure(package: rez_pip.pip.PackageInfo) -> bool:
+    """
+    Guess from the tags of its wheel if a package resolved by pip is pure python,
+    before it is downloaded. Pure wheels are tagged with the ``none`` ABI and
+    the ``any`` platform (for example ``py3-none-any``).
+
+    This is only a guess. Some ``none-any`` wheels are not purelib (their WHEEL file
+    has ``Root-Is-Purelib: false``), see :attr:`rez_pip.install.WheelMetadata.isPure`.
+    """
+    import packaging.utils
+
+    filename = urllib.parse.unquote(
+        urllib.parse.urlparse(package.download_info.url).path.rsplit("/", 1)[-1]
+    )
+    _, _, _, tags = packaging.utils.parse_wheel_filename(filename)
+    return all(tag.abi == "none" and tag.platform == "any" for tag in tags)
+
+
+def getRezRequirementsFromReport(
+    package: rez_pip.pip.PackageInfo,
+    pythonVersion: rez.version.Version,
+    hasEntryPoints: bool,
+    nameCasings: list[str] | None = None,
+    isPure: bool | None = None,
+) -> RequirementsDict:
+    """Like :func:`getRezRequirements`, but computed from what pip reported for a
+    package, before it is downloaded and installed.
+
+    The report doesn't say whether a wheel is pure or not, so it's guessed from
+    its tags (see :func:`isPackagePure`) unless ``isPure`` is given. It also doesn't
+    list the entry points, hence ``hasEntryPoints``.
+
+    :param package: Package resolved by pip.
+    :param pythonVersion: Python version used to perform the installation.
+    :param hasEntryPoints: Whether the package has entry points.
+    :param nameCasings: See :func:`getRezRequirements`.
+    :param isPure: Whether the wheel is pure python (Root-Is-Purelib).
+    """
+    return _convertRequirements(
+        package.name,
+        package.metadata.requires_dist,
+        # Only the first extra, like getRezRequirements.
+        package.metadata.provides_extra[0] if package.metadata.provides_extra else [],
+        package.metadata.requires_python,
+        isPackagePure(package) if isPure is None else isPure,
+        hasEntryPoints,
+        pythonVersion,
+        nameCasings,
+    )
+
+
+def _convertRequirements(
+    name: str,
+    requires: list[str],
+    providesExtra: typing.Iterable[str],
+    requiresPython: str | None,
+    isPure: bool,
+    hasEntryPoints: bool,
+    pythonVersion: rez.version.Version,
+    nameCasings: list[str] | None,
+) -> RequirementsDict:
+    # rez.system is slow to import and only needed here.
+    import rez.system
+
+    # The shared instance caches what it detects about the system.
+    _system = rez.system.system
     result_requires: list[str] = []
     result_variant_requires: list[str] = []
 
@@ -521,24 +697,10 @@ def getRezRequirements(
     # requirements such as platform, arch, os, and python
     sys_requires: set[str] = set()
 
-    # entry_points scripts are platform and arch specific executables generated by
-    # python build frontends during install
-    has_entry_points_scripts = bool(installedDist.entry_points)
-
-    isPure = rez_pip.install.isWheelPure(installedDist)
     # assume package is platform- and arch- specific if it isn't pure python
-    if not isPure or has_entry_points_scripts:
+    if not isPure or hasEntryPoints:
         sys_requires.update(["platform", "arch"])
 
-    # evaluate wrt python version, which may not be the current interpreter version
-
-    # JC: TODO: Use rez to resolve the ful npython version based on the provided version?
-    marker_env = {
-        "python_full_version": str(pythonVersion),
-        "python_version": str(pythonVersion.trim(2)),
-        "implementation_version": str(pythonVersion),
-    }
-
     # Note: This is supposed to give a requirements list that has already been
     # filtered down based on the extras requested at install time, and on any
     # environment markers present. However, this is not working in distlib. The
@@ -548,21 +710,18 @@ def getRezRequirements(
     #
     # See: vendor/distlib/metadata.py#line-892
     #
-    requires = installedDist.requires
-
     # filter requirements
-    for req_ in requires or []:
+    for req_ in requires:
         reqs = normalizeRequirement(req_)
 
         for req in reqs:
             # skip if env marker is present and doesn't evaluate
-            if req.marker and not req.marker.evaluate(environment=marker_env):
+            if req.marker and not _evaluateMarker(str(req.marker), str(pythonVersion)):
                 continue
 
             # skip if req is conditional on extras that weren't requested
             if req.conditional_extras and not (
-                set(installedDist.metadata["Provides-Extra"] or [])
-                & req.conditional_extras
+                set(providesExtra) & req.conditional_extras
             ):
                 continue
 
@@ -624,7 +783,6 @@ def getRezRequirements(
         #
         sys_variant_requires.append("python-%s" % str(pythonVersion.trim(2)))
     else:
-        requiresPython = installedDist.metadata.get("Requires-Python")
         if requiresPython:
             result_requires.append(
                 f"python-{pythonSpecifierToRezRequirement(packaging.specifiers.SpecifierSet(requiresPython))}"
@@ -643,7 +801,7 @@ def getRezRequirements(
         "python": requires,
         "rez": {"requires": result_requires, "variant": variant_requires},
     }
-    _LOG.debug(f"{installedDist.name} requirements translation: {translation}")
+    _LOG.debug(f"{name} requirements translation: {translation}")
 
     return RequirementsDict(
         requires=result_requires,
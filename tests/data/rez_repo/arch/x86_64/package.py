@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+name = "arch"
+
+version = "x86_64"
+
+timestamp = 1792216530
+
+format_version = 2
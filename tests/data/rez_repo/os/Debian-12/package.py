@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+name = "os"
+
+version = "Debian-12"
+
+requires = ["platform-linux", "arch-x86_64"]
+
+timestamp = 1792216530
+
+format_version = 2
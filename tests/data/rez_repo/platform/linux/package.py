@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+name = "platform"
+
+version = "linux"
+
+timestamp = 1792216530
+
+format_version = 2
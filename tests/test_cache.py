@@ -0,0 +1,320 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+import pathlib
+
+import pytest
+
+import rez_pip.pip
+import rez_pip.cache
+
+
+@pytest.fixture
+def resolveCache(tmp_path: pathlib.Path) -> rez_pip.cache.ResolveCache:
+    return rez_pip.cache.ResolveCache(os.fspath(tmp_path / "resolve"), 60)
+
+
+def getKey(cache: rez_pip.cache.ResolveCache, **kwargs) -> str:
+    arguments = {
+        "packageNames": ["package_a"],
+        "pip": rez_pip.pip.getBundledPip(),
+        "pythonVersion": "3.11",
+        "pythonExecutable": sys.executable,
+        "requirements": [],
+        "constraints": [],
+        "extraArgs": [],
+    }
+    arguments.update(kwargs)
+    return cache.getKey(**arguments)
+
+
+def test_ResolveCache_roundtrip(resolveCache: rez_pip.cache.ResolveCache):
+    key = getKey(resolveCache)
+    assert resolveCache.get(key) is None
+
+    resolveCache.set(key, [{"name": "package_a"}])
+    assert resolveCache.get(key) == [{"name": "package_a"}]
+
+
+def test_ResolveCache_ttl(resolveCache: rez_pip.cache.ResolveCache):
+    key = getKey(resolveCache)
+    resolveCache.set(key, [{"name": "package_a"}])
+
+    resolveCache.ttl = -1
+    assert resolveCache.get(key) is None
+
+
+def test_ResolveCache_corrupted_entry(resolveCache: rez_pip.cache.ResolveCache):
+    key = getKey(resolveCache)
+    resolveCache.set(key, [])
+
+    with open(resolveCache._getEntryPath(key), "w") as fd:
+        fd.write("{not json")
+
+    assert resolveCache.get(key) is None
+
+
+def test_ResolveCache_key_stable(resolveCache: rez_pip.cache.ResolveCache):
+    assert getKey(resolveCache) == getKey(resolveCache)
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {"packageNames": ["package_b"]},
+        {"pythonVersion": "3.9"},
+        {"extraArgs": ["--index-url", "https://example.com"]},
+        {"constraints": ["constraints.txt"]},
+    ],
+)
+def test_ResolveCache_key_inputs(
+    resolveCache: rez_pip.cache.ResolveCache, changes: dict
+):
+    assert getKey(resolveCache) != getKey(resolveCache, **changes)
+
+
+def test_ResolveCache_key_requirements_content(
+    resolveCache: rez_pip.cache.ResolveCache, tmp_path: pathlib.Path
+):
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("package_a==1.0.0\n")
+
+    key1 = getKey(resolveCache, requirements=[os.fspath(requirements)])
+
+    requirements.write_text("package_a==2.0.0\n")
+    key2 = getKey(resolveCache, requirements=[os.fspath(requirements)])
+
+    assert key1 != key2
+
+
+def test_ResolveCache_key_pip_env_vars(
+    resolveCache: rez_pip.cache.ResolveCache, monkeypatch: pytest.MonkeyPatch
+):
+    key1 = getKey(resolveCache)
+
+    monkeypatch.setenv("PIP_INDEX_URL", "https://example.com/simple")
+    assert getKey(resolveCache) != key1
+
+
+def test_ResolveCache_key_pip_config_file(
+    resolveCache: rez_pip.cache.ResolveCache,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: pathlib.Path,
+):
+    config = tmp_path / "pip.conf"
+    monkeypatch.setenv("PIP_CONFIG_FILE", os.fspath(config))
+
+    config.write_text("[global]\nindex-url = https://example.com/simple\n")
+    key1 = getKey(resolveCache)
+
+    config.write_text("[global]\nindex-url = https://example2.com/simple\n")
+    assert getKey(resolveCache) != key1
+
+
+def addWheel(
+    cache: rez_pip.cache.WheelCache, tmp_path: pathlib.Path, name: str, size: int
+) -> str:
+    path = tmp_path / f"{name}-1.0.0-py3-none-any.whl"
+    path.write_bytes(b"0" * size)
+    return cache.add(os.fspath(path), name * 4)
+
+
+def test_WheelCache_add_get(tmp_path: pathlib.Path):
+    cache = rez_pip.cache.WheelCache(os.fspath(tmp_path / "wheels"), 100)
+    wheelName = "package_a-1.0.0-py3-none-any.whl"
+
+    assert cache.get("aaaa", wheelName) is None
+
+    path = addWheel(cache, tmp_path, "a", 10)
+    assert os.path.basename(path) == "a-1.0.0-py3-none-any.whl"
+    assert not os.path.exists(tmp_path / "a-1.0.0-py3-none-any.whl")
+
+    assert cache.get("aaaa", "a-1.0.0-py3-none-any.whl") == path
+    assert [entry.path for entry in cache.entries()] == [path]
+
+
+def test_WheelCache_prune_lru(tmp_path: pathlib.Path):
+    cache = rez_pip.cache.WheelCache(os.fspath(tmp_path / "wheels"), 25)
+
+    paths = {name: addWheel(cache, tmp_path, name, 10) for name in "abc"}
+
+    # Make "a" the oldest, then access it so that "b" becomes the least recently used.
+    now = time.time()
+    for index, name in enumerate("abc"):
+        os.utime(paths[name], (now - 100 + index, now - 100 + index))
+    assert cache.get("aaaa", os.path.basename(paths["a"]))
+
+    evicted = cache.prune()
+
+    assert [entry.path for entry in evicted] == [paths["b"]]
+    assert sorted(entry.path for entry in cache.entries()) == sorted(
+        [paths["a"], paths["c"]]
+    )
+    # Empty directories are removed.
+    assert not os.path.exists(os.path.dirname(paths["b"]))
+
+
+def test_WheelCache_clear(tmp_path: pathlib.Path):
+    cache = rez_pip.cache.WheelCache(os.fspath(tmp_path / "wheels"), 100)
+    addWheel(cache, tmp_path, "a", 10)
+
+    cache.clear()
+    assert cache.entries() == []
+
+
+def test_WheelCache_writeFindLinks(tmp_path: pathlib.Path):
+    cache = rez_pip.cache.WheelCache(os.fspath(tmp_path / "wheels"), 100)
+    path = addWheel(cache, tmp_path, "a", 10)
+
+    page = cache.writeFindLinks()
+    assert (
+        f'href="{pathlib.Path(path).as_uri()}#sha256=aaaa"'
+        in pathlib.Path(page).read_text()
+    )
+
+    # Same content, same page.
+    assert cache.writeFindLinks() == page
+
+    addWheel(cache, tmp_path, "b", 10)
+    newPage = cache.writeFindLinks()
+    assert newPage != page
+    assert "b-1.0.0-py3-none-any.whl" in pathlib.Path(newPage).read_text()
+
+    # Pages are not wheels.
+    assert len(cache.entries()) == 2
+
+    # Old pages are removed.
+    os.utime(page, (time.time() - rez_pip.cache.FIND_LINKS_MAX_AGE - 1,) * 2)
+    cache.writeFindLinks()
+    assert not os.path.exists(page)
+    assert os.path.exists(newPage)
+
+
+def test_WheelCache_writeFindLinks_relative(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+):
+    """Test that the links are absolute file URIs when the cache path is relative"""
+    monkeypatch.chdir(tmp_path)
+    cache = rez_pip.cache.WheelCache("wheels", 100)
+    path = addWheel(cache, tmp_path, "a", 10)
+
+    page = cache.writeFindLinks()
+    assert (
+        f'href="{(tmp_path / path).as_uri()}#sha256=aaaa"'
+        in pathlib.Path(page).read_text()
+    )
+
+
+def test_WheelCache_export(tmp_path: pathlib.Path):
+    cache = rez_pip.cache.WheelCache(os.fspath(tmp_path / "wheels"), 100)
+    addWheel(cache, tmp_path, "a", 10)
+    addWheel(cache, tmp_path, "b", 10)
+    dest = tmp_path / "wheelhouse"
+
+    exported = cache.export(os.fspath(dest))
+
+    assert sorted(os.path.basename(path) for path in exported) == [
+        "a-1.0.0-py3-none-any.whl",
+        "b-1.0.0-py3-none-any.whl",
+    ]
+    assert (dest / "a-1.0.0-py3-none-any.whl").read_bytes() == b"0" * 10
+    assert (
+        'href="a-1.0.0-py3-none-any.whl#sha256=aaaa"'
+        in (dest / "index.html").read_text()
+    )
+    assert 'href="a/"' in (dest / "simple" / "index.html").read_text()
+    assert (
+        'href="../../b-1.0.0-py3-none-any.whl#sha256=bbbb"'
+        in (dest / "simple" / "b" / "index.html").read_text()
+    )
+
+
+def test_WheelCache_prune_partials(tmp_path: pathlib.Path):
+    cache = rez_pip.cache.WheelCache(os.fspath(tmp_path / "wheels"), 100)
+
+    paths = [
+        cache.getPartialPath(name * 4, f"{name}-1.0.0-py3-none-any.whl")
+        for name in "ab"
+    ]
+    for path in paths:
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as fd:
+            fd.write(b"a" * 10)
+
+    old = time.time() - rez_pip.cache.PARTIAL_DOWNLOAD_MAX_AGE - 1
+    os.utime(paths[0], (old, old))
+
+    # Partial downloads are not wheels.
+    assert cache.entries() == []
+
+    cache.prune()
+    assert [entry.path for entry in cache.partialEntries()] == [paths[1]]
+
+    cache.clear()
+    assert cache.partialEntries() == []
+
+
+def test_ResolveCache_prune(resolveCache: rez_pip.cache.ResolveCache):
+    resolveCache.set("a" * 64, [])
+    resolveCache.set("b" * 64, [])
+
+    os.utime(resolveCache._getEntryPath("a" * 64), (0, 0))
+
+    removed = resolveCache.prune()
+    assert [entry.path for entry in removed] == [resolveCache._getEntryPath("a" * 64)]
+    assert resolveCache.get("b" * 64) == []
+
+
+def test_InterpreterCache(tmp_path: pathlib.Path):
+    cache = rez_pip.cache.InterpreterCache(os.fspath(tmp_path / "cache"), maxAge=60)
+    executable = tmp_path / "python"
+    executable.touch()
+
+    key = cache.getKey("python", ["/repo"], ["python-3.9.1:1"])
+    assert key == cache.getKey("python", ["/repo"], ["python-3.9.1:1"])
+    assert key != cache.getKey("python", ["/repo"], ["python-3.9.1:2"])
+    assert key != cache.getKey("python", ["/other"], ["python-3.9.1:1"])
+
+    assert cache.get(key) is None
+    cache.set(key, {"3.9.1": os.fspath(executable)})
+    assert cache.get(key) == {"3.9.1": os.fspath(executable)}
+
+    # Entries that were used recently are kept.
+    os.utime(cache._getEntryPath(key), (0, 0))
+    cache.get(key)
+    assert cache.prune() == []
+
+    os.utime(cache._getEntryPath(key), (0, 0))
+    assert len(cache.prune()) == 1
+    assert cache.entries() == []
+
+    cache.set(key, {"3.9.1": os.fspath(executable)})
+    executable.unlink()
+    assert cache.get(key) is None
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("1024", 1024),
+        ("1K", 1000),
+        ("1KiB", 1024),
+        ("500MB", 500 * 1000**2),
+        ("1.5G", 1500 * 1000**2),
+        ("10gib", 10 * 1024**3),
+    ],
+)
+def test_parseSize(value: str, expected: int):
+    assert rez_pip.cache.parseSize(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", "MB", "10XB", "asd"])
+def test_parseSize_invalid(value: str):
+    with pytest.raises(ValueError):
+        rez_pip.cache.parseSize(value)
@@ -6,11 +6,17 @@ from __future__ import annotations
 
 import os
 import sys
+import json
+import time
 import logging
+import typing
 import pathlib
 import argparse
+import threading
+import contextlib
 import subprocess
 import unittest.mock
+import concurrent.futures
 
 import pytest
 import packaging.version
@@ -18,6 +24,11 @@ import packaging.version
 import rez_pip.cli
 import rez_pip.pip
 import rez_pip.rez
+import rez_pip.cache
+import rez_pip.trace
+import rez_pip.patch
+import rez_pip.install
+import rez_pip.download
 import rez_pip.exceptions
 from rez_pip.compat import importlib_metadata
 
@@ -25,18 +36,39 @@ from rez_pip.compat import importlib_metadata
 def test_parseArgs_empty():
     args, pipArgs = rez_pip.cli._parseArgs([])
     assert vars(args) == {
+        "cache_dir": None,
         "constraint": None,
+        "install_workers": 4,
+        "file_transfer": "auto",
+        "direct_install": False,
+        "jobs": 1,
         "keep_tmp_dirs": False,
         "list_plugins": False,
         "log_level": "info",
+        "manifest": None,
+        "manifest_report": None,
         "packages": [],
-        "pip": rez_pip.pip.getBundledPip(),
+        "pip": None,
+        "pip_timeout": None,
         "prefix": None,
+        "python_executable": None,
         "python_version": "3.7+",
+        "trace": None,
         "release": False,
         "requirement": None,
         "debug_info": False,
+        "download_connect_timeout": 30,
+        "download_read_timeout": 60,
+        "download_retries": 5,
+        "max_connections": 16,
+        "max_connections_per_host": 8,
         "noop": False,
+        "no_interpreter_cache": False,
+        "no_resolve_cache": False,
+        "no_wheel_cache": False,
+        "prefer_cached_wheels": False,
+        "resolve_cache_ttl": 3600,
+        "wheel_cache_max_size": 10 * 1024**3,
     }
 
     assert pipArgs == []
@@ -46,18 +78,39 @@ def test_parseArgs_empty():
 def test_parseArgs_packages(packages):
     args, pipArgs = rez_pip.cli._parseArgs(packages)
     assert vars(args) == {
+        "cache_dir": None,
         "constraint": None,
+        "install_workers": 4,
+        "file_transfer": "auto",
+        "direct_install": False,
+        "jobs": 1,
         "keep_tmp_dirs": False,
         "list_plugins": False,
         "log_level": "info",
+        "manifest": None,
+        "manifest_report": None,
         "packages": packages,
-        "pip": rez_pip.pip.getBundledPip(),
+        "pip": None,
+        "pip_timeout": None,
         "prefix": None,
+        "python_executable": None,
         "python_version": "3.7+",
+        "trace": None,
         "release": False,
         "requirement": None,
         "debug_info": False,
+        "download_connect_timeout": 30,
+        "download_read_timeout": 60,
+        "download_retries": 5,
+        "max_connections": 16,
+        "max_connections_per_host": 8,
         "noop": False,
+        "no_interpreter_cache": False,
+        "no_resolve_cache": False,
+        "no_wheel_cache": False,
+        "prefer_cached_wheels": False,
+        "resolve_cache_ttl": 3600,
+        "wheel_cache_max_size": 10 * 1024**3,
     }
 
     assert pipArgs == []
@@ -67,18 +120,39 @@ def test_parseArgs_packages(packages):
 def test_parseArgs_no_package_with_requirements(files):
     args, pipArgs = rez_pip.cli._parseArgs(files)
     assert vars(args) == {
+        "cache_dir": None,
         "constraint": None,
+        "install_workers": 4,
+        "file_transfer": "auto",
+        "direct_install": False,
+        "jobs": 1,
         "keep_tmp_dirs": False,
         "list_plugins": False,
         "log_level": "info",
+        "manifest": None,
+        "manifest_report": None,
         "packages": [],
-        "pip": rez_pip.pip.getBundledPip(),
+        "pip": None,
+        "pip_timeout": None,
         "prefix": None,
+        "python_executable": None,
         "python_version": "3.7+",
+        "trace": None,
         "release": False,
         "requirement": [req.split("=")[-1] for req in files],
         "debug_info": False,
+        "download_connect_timeout": 30,
+        "download_read_timeout": 60,
+        "download_retries": 5,
+        "max_connections": 16,
+        "max_connections_per_host": 8,
         "noop": False,
+        "no_interpreter_cache": False,
+        "no_resolve_cache": False,
+        "no_wheel_cache": False,
+        "prefer_cached_wheels": False,
+        "resolve_cache_ttl": 3600,
+        "wheel_cache_max_size": 10 * 1024**3,
     }
 
     assert pipArgs == []
@@ -87,18 +161,39 @@ def test_parseArgs_no_package_with_requirements(files):
 def test_parseArgs_constraints():
     args, pipArgs = rez_pip.cli._parseArgs(["-c", "asd", "-c", "adasdasd"])
     assert vars(args) == {
+        "cache_dir": None,
         "constraint": ["asd", "adasdasd"],
+        "install_workers": 4,
+        "file_transfer": "auto",
+        "direct_install": False,
+        "jobs": 1,
         "keep_tmp_dirs": False,
         "list_plugins": False,
         "log_level": "info",
+        "manifest": None,
+        "manifest_report": None,
         "packages": [],
-        "pip": rez_pip.pip.getBundledPip(),
+        "pip": None,
+        "pip_timeout": None,
         "prefix": None,
+        "python_executable": None,
         "python_version": "3.7+",
+        "trace": None,
         "release": False,
         "requirement": None,
         "debug_info": False,
+        "download_connect_timeout": 30,
+        "download_read_timeout": 60,
+        "download_retries": 5,
+        "max_connections": 16,
+        "max_connections_per_host": 8,
         "noop": False,
+        "no_interpreter_cache": False,
+        "no_resolve_cache": False,
+        "no_wheel_cache": False,
+        "prefer_cached_wheels": False,
+        "resolve_cache_ttl": 3600,
+        "wheel_cache_max_size": 10 * 1024**3,
     }
 
     assert pipArgs == []
@@ -109,23 +204,184 @@ def test_parseArgs_pipArgs():
         ["-l", "info", "--", "adasdasd", "--requirement", "asd.txt"]
     )
     assert vars(args) == {
+        "cache_dir": None,
         "constraint": None,
+        "install_workers": 4,
+        "file_transfer": "auto",
+        "direct_install": False,
+        "jobs": 1,
         "keep_tmp_dirs": False,
         "list_plugins": False,
         "log_level": "info",
+        "manifest": None,
+        "manifest_report": None,
         "packages": [],
-        "pip": rez_pip.pip.getBundledPip(),
+        "pip": None,
+        "pip_timeout": None,
         "prefix": None,
+        "python_executable": None,
         "python_version": "3.7+",
+        "trace": None,
         "release": False,
         "requirement": None,
         "debug_info": False,
+        "download_connect_timeout": 30,
+        "download_read_timeout": 60,
+        "download_retries": 5,
+        "max_connections": 16,
+        "max_connections_per_host": 8,
         "noop": False,
+        "no_interpreter_cache": False,
+        "no_resolve_cache": False,
+        "no_wheel_cache": False,
+        "prefer_cached_wheels": False,
+        "resolve_cache_ttl": 3600,
+        "wheel_cache_max_size": 10 * 1024**3,
     }
 
     assert pipArgs == ["adasdasd", "--requirement", "asd.txt"]
 
 
+def test_parseArgs_jobs():
+    args, _ = rez_pip.cli._parseArgs(["--jobs", "3", "example"])
+    assert args.jobs == 3
+
+
+@pytest.mark.parametrize("value", ["0", "-1", "asd"])
+def test_parseArgs_jobs_invalid(value: str):
+    with pytest.raises(SystemExit):
+        rez_pip.cli._parseArgs(["--jobs", value, "example"])
+
+
+@pytest.mark.parametrize("value", ["0", "5"])
+def test_parseArgs_download_retries(value: str):
+    args, _ = rez_pip.cli._parseArgs(["--download-retries", value, "example"])
+    assert args.download_retries == int(value)
+
+
+@pytest.mark.parametrize("value", ["-1", "-3", "asd"])
+def test_parseArgs_download_retries_invalid(value: str):
+    with pytest.raises(SystemExit):
+        rez_pip.cli._parseArgs(["--download-retries", value, "example"])
+
+
+@pytest.mark.parametrize(
+    "option,dest",
+    [
+        ("--pip-timeout", "pip_timeout"),
+        ("--download-connect-timeout", "download_connect_timeout"),
+        ("--download-read-timeout", "download_read_timeout"),
+        ("--resolve-cache-ttl", "resolve_cache_ttl"),
+    ],
+)
+def test_parseArgs_positive_numbers(option: str, dest: str):
+    args, _ = rez_pip.cli._parseArgs([option, "2.5", "example"])
+    assert getattr(args, dest) == 2.5
+
+    for value in ["0", "-1", "nan", "inf", "asd"]:
+        with pytest.raises(SystemExit):
+            rez_pip.cli._parseArgs([option, value, "example"])
+
+
+def test_parseArgs_wheel_cache_max_size():
+    args, _ = rez_pip.cli._parseArgs(["--wheel-cache-max-size", "500MB", "example"])
+    assert args.wheel_cache_max_size == 500 * 1000**2
+
+    with pytest.raises(SystemExit):
+        rez_pip.cli._parseArgs(["--wheel-cache-max-size", "asd", "example"])
+
+
+def test_getCacheDir(monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("HOME", os.fspath(tmp_path / "home"))
+    monkeypatch.setenv("USERPROFILE", os.fspath(tmp_path / "home"))
+
+    assert rez_pip.cli._getCacheDir(argparse.Namespace(cache_dir="cache")) == (
+        os.fspath(tmp_path / "cache")
+    )
+    assert rez_pip.cli._getCacheDir(
+        argparse.Namespace(cache_dir=os.path.join("~", "cache"))
+    ) == os.fspath(tmp_path / "home" / "cache")
+
+
+def test_parseArgs_python_executable():
+    args, _ = rez_pip.cli._parseArgs(
+        [
+            "--python-executable",
+            "3.9.1=/python-3.9.1",
+            "--python-executable",
+            "3.10.2=/python-3.10.2",
+            "example",
+        ]
+    )
+    assert args.python_executable == [
+        ("3.9.1", "/python-3.9.1"),
+        ("3.10.2", "/python-3.10.2"),
+    ]
+
+    with pytest.raises(SystemExit):
+        rez_pip.cli._parseArgs(["--python-executable", "/python", "example"])
+
+
+def test_getPythonExecutables_override(monkeypatch: pytest.MonkeyPatch):
+    """Rez is not used at all when executables are passed"""
+    mocked = unittest.mock.Mock()
+    monkeypatch.setattr(rez_pip.rez, "getPythonExecutables", mocked)
+
+    args, _ = rez_pip.cli._parseArgs(
+        ["--python-executable", "3.9.1=/python-3.9.1", "example"]
+    )
+    assert rez_pip.cli._getPythonExecutables(args) == {
+        "3.9.1": pathlib.Path("/python-3.9.1")
+    }
+    assert not mocked.called
+
+
+@pytest.mark.parametrize(
+    "args", [["--help"], ["--plugin-version"], ["--noop", "example"]]
+)
+def test_lazy_imports(args: list[str], tmp_path: pathlib.Path):
+    """Slow dependencies are not imported when they are not needed"""
+    output = tmp_path / "modules.json"
+    code = f"""
+import sys, json
+import rez_pip.cli
+
+sys.argv = ["rez-pip"] + {args!r}
+try:
+    rez_pip.cli.run()
+except SystemExit:
+    pass
+
+with open({os.fspath(output)!r}, "w") as fd:
+    json.dump(list(sys.modules), fd)
+"""
+    subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.PIPE)
+
+    modules = {name.split(".")[0] for name in json.loads(output.read_text())}
+    assert not modules & {
+        "rez",
+        "rich",
+        "pluggy",
+        "aiohttp",
+        "patch_ng",
+        "installer",
+        "packaging",
+        "dataclasses_json",
+    }
+
+
+def test_lazy_imports_compat():
+    """The TOML parser is only imported by the manifest code"""
+    code = """
+import sys
+import rez_pip.compat
+
+assert not {"tomllib", "tomli"} & set(sys.modules), sys.modules
+"""
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
 def test_run_with_main():
     """Test that __main__ works"""
     result = subprocess.run(
@@ -320,6 +576,645 @@ def test_run_keep_tmp_dirs(
     assert tmppath.exists()
 
 
+class _ThreadPoolExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Stand-in for the process pool. Patches can't be seen by spawned processes."""
+
+    def __init__(self, *args, mp_context=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+@pytest.mark.usefixtures("resetLogger")
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_run_parallel(monkeypatch: pytest.MonkeyPatch, jobs: int):
+    monkeypatch.setattr(
+        rez_pip.rez,
+        "getPythonExecutables",
+        lambda *args, **kwargs: {
+            "3.9.1": pathlib.Path("/python-3.9.1"),
+            "3.10.2": pathlib.Path("/python-3.10.2"),
+        },
+    )
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", _ThreadPoolExecutor)
+    monkeypatch.setattr(rez_pip.cli, "_initWorker", lambda *args: None)
+
+    args = argparse.Namespace(
+        python_version="3+",
+        python_executable=None,
+        no_interpreter_cache=True,
+        jobs=jobs,
+        no_wheel_cache=True,
+        prefer_cached_wheels=False,
+        pip_timeout=None,
+        pip="/pip.pyz",
+        manifest=None,
+    )
+
+    with unittest.mock.patch("rez_pip.pip.startPipProcess") as startPipProcess:
+        with unittest.mock.patch("rez_pip.cli._runForPythonVersion") as mocked:
+            rez_pip.cli._run(args, ["--pip-arg"], "/work-area")
+
+    assert sorted(call.args[3:] for call in mocked.call_args_list) == [
+        ("3.10.2", os.fspath(pathlib.Path("/python-3.10.2"))),
+        ("3.9.1", os.fspath(pathlib.Path("/python-3.9.1"))),
+    ]
+
+    for call in mocked.call_args_list:
+        assert call.args[0].jobs == jobs
+        assert call.args[1:3] == (["--pip-arg"], "/work-area")
+
+    if jobs == 1:
+        # pip is started ahead of time for the second version.
+        startPipProcess.assert_called_once_with(
+            "/pip.pyz", os.fspath(pathlib.Path("/python-3.10.2"))
+        )
+    else:
+        startPipProcess.assert_not_called()
+
+
+def _runWorkerInProcess(
+    args: argparse.Namespace,
+    pipArgs: list[str],
+    pipWorkArea: str,
+    pythonVersion: str,
+    pythonExecutable: str,
+) -> tuple[int, list[dict[str, typing.Any]]]:
+    """
+    Stand-in for rez_pip.cli._runWorker. It runs in a spawned worker process,
+    where the patches of the test are not applied.
+    """
+
+    def run(
+        args: argparse.Namespace,
+        pipArgs: list[str],
+        pipWorkArea: str,
+        pythonVersion: str,
+        pythonExecutable: str,
+    ) -> int:
+        logging.getLogger("rez_pip.cli").info(
+            f"{args.packages} {pipArgs} {pythonExecutable} in {os.getpid()}"
+        )
+        rez_pip.cli._reportProgress("creating packages", 1, 2)
+        return len(pythonVersion)
+
+    rez_pip.cli._runForPythonVersion = run  # type: ignore[assignment]
+    return rez_pip.cli._runWorker(
+        args, pipArgs, pipWorkArea, pythonVersion, pythonExecutable
+    )
+
+
+@pytest.mark.usefixtures("resetLogger")
+def test_runParallel_processes(monkeypatch: pytest.MonkeyPatch):
+    """Test --jobs with real worker processes (spawn, pickling, logs and progress)"""
+    records: list[logging.LogRecord] = []
+
+    handler = logging.Handler()
+    handler.emit = records.append  # type: ignore[method-assign]
+    logger = logging.getLogger("rez_pip")
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+
+    progress: list[tuple[str, str, float, float | None]] = []
+    update = rez_pip.cli._WorkersProgress.update
+
+    def _update(self, *args) -> None:
+        progress.append(args)
+        update(self, *args)
+
+    monkeypatch.setattr(rez_pip.cli._WorkersProgress, "update", _update)
+    monkeypatch.setattr(rez_pip.cli, "_runWorker", _runWorkerInProcess)
+
+    args, pipArgs = rez_pip.cli._parseArgs(["--jobs", "2", "example"])
+
+    created = rez_pip.cli._runParallel(
+        args,
+        ["--pip-arg"],
+        "/work-area",
+        {
+            "3.9.1": pathlib.Path("/python-3.9.1"),
+            "3.10.2": pathlib.Path("/python-3.10.2"),
+        },
+    )
+
+    assert created == {"3.9.1": 5, "3.10.2": 6}
+
+    messages = [
+        record.getMessage() for record in records if " in " in record.getMessage()
+    ]
+    pids = set()
+    for version in ["3.9.1", "3.10.2"]:
+        executable = os.fspath(pathlib.Path(f"/python-{version}"))
+        (message,) = [
+            message
+            for message in messages
+            if message.startswith(f"\\[python-{version}] ")
+        ]
+        assert f"['example'] ['--pip-arg'] {executable} in " in message
+        pids.add(int(message.rsplit(" ", 1)[-1]))
+
+    assert os.getpid() not in pids
+
+    assert ("3.9.1", "creating packages", 1, 2) in progress
+    assert ("3.10.2", "creating packages", 1, 2) in progress
+
+
+@pytest.mark.usefixtures("resetLogger")
+def test_run_parallel_failure(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(
+        rez_pip.rez,
+        "getPythonExecutables",
+        lambda *args, **kwargs: {
+            "3.9.1": pathlib.Path("/python-3.9.1"),
+            "3.10.2": pathlib.Path("/python-3.10.2"),
+        },
+    )
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", _ThreadPoolExecutor)
+    monkeypatch.setattr(rez_pip.cli, "_initWorker", lambda *args: None)
+
+    def run(args, pipArgs, pipWorkArea, pythonVersion, pythonExecutable):
+        if pythonVersion == "3.10.2":
+            raise rez_pip.exceptions.RezPipError("failed")
+
+    monkeypatch.setattr(rez_pip.cli, "_runForPythonVersion", run)
+
+    with pytest.raises(rez_pip.exceptions.RezPipError, match="failed"):
+        rez_pip.cli._run(
+            argparse.Namespace(
+                python_version="3+",
+                python_executable=None,
+                no_interpreter_cache=True,
+                jobs=2,
+                no_wheel_cache=True,
+                prefer_cached_wheels=False,
+                pip_timeout=None,
+            ),
+            [],
+            "/work-area",
+        )
+
+
+@pytest.mark.usefixtures("resetLogger")
+def test_run_manifest(monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path):
+    manifest = tmp_path / "manifest.toml"
+    manifest.write_text("""
+[[entries]]
+packages = ["a"]
+python-version = "3.9"
+
+[[entries]]
+name = "broken"
+packages = ["b"]
+pip-args = ["--pre"]
+
+[[entries]]
+requirement = ["requirements.txt"]
+python-version = "3.9"
+""")
+    report = tmp_path / "report.json"
+
+    lookups: list[str] = []
+
+    def getPythonExecutables(args):
+        lookups.append(args.python_version)
+        return {"3.9.1": pathlib.Path("/python-3.9.1")}
+
+    calls = []
+
+    def run(args, pipArgs, pipWorkArea, pythonVersion, pythonExecutable):
+        # Each entry starts from a clean work area.
+        installed = pathlib.Path(pipWorkArea, "installed")
+        assert not installed.exists()
+        installed.mkdir()
+
+        calls.append((args.packages, args.requirement, pipArgs))
+        if args.packages == ["b"]:
+            raise rez_pip.exceptions.RezPipError("b failed")
+        return 2
+
+    monkeypatch.setattr(rez_pip.cli, "_getPythonExecutables", getPythonExecutables)
+    monkeypatch.setattr(rez_pip.cli, "_runForPythonVersion", run)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "rez-pip",
+            "--manifest",
+            os.fspath(manifest),
+            "--manifest-report",
+            os.fspath(report),
+            "--no-wheel-cache",
+            "--",
+            "--no-cache-dir",
+        ],
+    )
+
+    # One entry failed.
+    assert rez_pip.cli.run() == 1
+
+    assert calls == [
+        (["a"], None, ["--no-cache-dir"]),
+        (["b"], None, ["--no-cache-dir", "--pre"]),
+        ([], [os.fspath(tmp_path / "requirements.txt")], ["--no-cache-dir"]),
+    ]
+
+    # Python executables are looked up once per python version range.
+    assert lookups == ["3.9", "3.7+"]
+
+    results = json.loads(report.read_text())
+    assert not results["succeeded"]
+    assert [
+        (entry["name"], entry["succeeded"], entry["packages"], entry["error"])
+        for entry in results["entries"]
+    ] == [
+        ("a", True, {"3.9.1": 2}, None),
+        ("broken", False, {}, "b failed"),
+        ("requirements.txt", True, {"3.9.1": 2}, None),
+    ]
+
+
+@pytest.mark.usefixtures("resetLogger")
+def test_run_manifest_with_packages(
+    monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture
+):
+    monkeypatch.setattr(
+        sys, "argv", ["rez-pip", "--manifest", "manifest.toml", "example"]
+    )
+    assert rez_pip.cli.run() == 1
+    assert "can't be used with --manifest" in capsys.readouterr().out
+
+
+def _packageInfo(name: str) -> rez_pip.pip.PackageInfo:
+    return rez_pip.pip.PackageInfo(
+        metadata=rez_pip.pip.Metadata(name=name, version="1.0.0"),
+        download_info=rez_pip.pip.DownloadInfo(
+            url=f"https://example.com/{name.replace('-', '_')}-1.0.0-py3-none-any.whl",
+            archive_info=rez_pip.pip.ArchiveInfo("hash", {}),
+        ),
+        is_direct=True,
+        requested=True,
+    )
+
+
+def _wheelMetadata(isPure: bool = True) -> rez_pip.install.WheelMetadata:
+    return rez_pip.install.WheelMetadata(
+        isPure=isPure,
+        hasEntryPoints=False,
+        scripts=(),
+        requires=(),
+        requiresPython=None,
+        providesExtra=None,
+    )
+
+
+def test_runForPythonVersion_pipeline(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: pathlib.Path,
+    caplog: pytest.LogCaptureFixture,
+):
+    """Test that groups are installed while other groups are still downloading"""
+    args, pipArgs = rez_pip.cli._parseArgs(
+        ["package-a", "package-b", "--no-resolve-cache", "--no-wheel-cache"]
+    )
+
+    monkeypatch.setattr(
+        rez_pip.pip,
+        "getPackages",
+        lambda *args, **kwargs: [_packageInfo("package-a"), _packageInfo("package-b")],
+    )
+
+    installed = threading.Event()
+
+    def downloadPackages(packageGroups, dest, onGroupDownloaded, **kwargs):
+        groups = []
+        for group in packageGroups:
+            newGroup = rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact](
+                tuple(
+                    rez_pip.pip.DownloadedArtifact.from_dict(
+                        {"_localPath": "/path", **package.to_dict()}
+                    )
+                    for package in group.packages
+                )
+            )
+            onGroupDownloaded(newGroup)
+            groups.append(newGroup)
+
+            # Don't finish downloading until the first group is installed.
+            assert installed.wait(5)
+        return groups
+
+    def installWheel(package, path, targetPath):
+        installed.set()
+        return package.name
+
+    monkeypatch.setattr(rez_pip.download, "downloadPackages", downloadPackages)
+    monkeypatch.setattr(rez_pip.install, "installWheel", installWheel)
+    monkeypatch.setattr(
+        rez_pip.install, "readWheelMetadata", lambda path: _wheelMetadata()
+    )
+    monkeypatch.setattr(rez_pip.install, "buildFileManifest", lambda *args: None)
+    monkeypatch.setattr(rez_pip.install, "cleanup", lambda *args, **kwargs: None)
+    monkeypatch.setattr(rez_pip.patch, "patch", lambda *args, **kwargs: None)
+
+    with unittest.mock.patch.object(rez_pip.rez, "createPackage") as mocked:
+        with caplog.at_level(logging.INFO, "rez_pip"):
+            rez_pip.cli._runForPythonVersion(
+                args, pipArgs, os.fspath(tmp_path), "3.10.2", "/python"
+            )
+
+    assert [call.args[0].dists for call in mocked.call_args_list] == [
+        ["package-a"],
+        ["package-b"],
+    ]
+    assert "saved by overlapping" in caplog.text
+
+
+@pytest.mark.parametrize("isPurelib", [True, False], ids=["purelib", "platlib"])
+def test_runForPythonVersion_pure_packages(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: pathlib.Path,
+    caplog: pytest.LogCaptureFixture,
+    isPurelib: bool,
+):
+    """
+    Test that pure python packages are only installed for the first python version.
+    none-any wheels that are not purelib (Root-Is-Purelib: false) are installed
+    for each python version.
+    """
+    args, pipArgs = rez_pip.cli._parseArgs(
+        ["package-a", "package-b", "--no-resolve-cache", "--no-wheel-cache"]
+    )
+
+    platformPackage = _packageInfo("package-b")
+    platformPackage.download_info.url = (
+        "https://example.com/package_b-1.0.0-cp39-abi3-manylinux2014_x86_64.whl"
+    )
+    monkeypatch.setattr(
+        rez_pip.pip,
+        "getPackages",
+        lambda *args, **kwargs: [_packageInfo("package-a"), platformPackage],
+    )
+
+    def downloadPackages(packageGroups, dest, onGroupDownloaded, **kwargs):
+        for group in packageGroups:
+            onGroupDownloaded(
+                rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact](
+                    tuple(
+                        rez_pip.pip.DownloadedArtifact.from_dict(
+                            {"_localPath": "/path", **package.to_dict()}
+                        )
+                        for package in group.packages
+                    )
+                )
+            )
+
+    monkeypatch.setattr(rez_pip.download, "downloadPackages", downloadPackages)
+    monkeypatch.setattr(
+        rez_pip.install, "installWheel", lambda package, *args: package.name
+    )
+    monkeypatch.setattr(
+        rez_pip.install,
+        "readWheelMetadata",
+        lambda path: _wheelMetadata(isPure=isPurelib),
+    )
+    monkeypatch.setattr(rez_pip.install, "buildFileManifest", lambda *args: None)
+    monkeypatch.setattr(rez_pip.install, "cleanup", lambda *args, **kwargs: None)
+    monkeypatch.setattr(rez_pip.patch, "patch", lambda *args, **kwargs: None)
+
+    with unittest.mock.patch.object(rez_pip.rez, "createPackage") as mocked:
+        with caplog.at_level(logging.INFO, "rez_pip"):
+            created = [
+                rez_pip.cli._runForPythonVersion(
+                    args, pipArgs, os.fspath(tmp_path), pythonVersion, "/python"
+                )
+                for pythonVersion in ("3.9.0", "3.11.0")
+            ]
+
+    message = "pure python packages already installed for another python version"
+    if isPurelib:
+        assert created == [2, 1]
+        assert [call.args[0].dists for call in mocked.call_args_list] == [
+            ["package-a"],
+            ["package-b"],
+            ["package-b"],
+        ]
+        assert f"skipped 1 {message}" in caplog.text
+    else:
+        assert created == [2, 2]
+        assert [call.args[0].dists for call in mocked.call_args_list] == [
+            ["package-a"],
+            ["package-b"],
+        ] * 2
+        assert message not in caplog.text
+
+
+def test_runForPythonVersion_install_workers(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+):
+    """Test that wheels are installed in parallel but hooks run one at a time"""
+    args, pipArgs = rez_pip.cli._parseArgs(
+        ["--no-resolve-cache", "--no-wheel-cache", "--install-workers", "3"]
+    )
+    names = [f"package-{index}" for index in range(6)]
+
+    monkeypatch.setattr(
+        rez_pip.pip,
+        "getPackages",
+        lambda *args, **kwargs: [_packageInfo(name) for name in names],
+    )
+
+    def downloadPackages(packageGroups, dest, onGroupDownloaded, **kwargs):
+        for group in packageGroups:
+            onGroupDownloaded(
+                rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact](
+                    tuple(
+                        rez_pip.pip.DownloadedArtifact.from_dict(
+                            {"_localPath": "/path", **package.to_dict()}
+                        )
+                        for package in group.packages
+                    )
+                )
+            )
+
+    lock = threading.Lock()
+    active = {"install": 0, "hooks": 0}
+    maxActive = {"install": 0, "hooks": 0}
+
+    @contextlib.contextmanager
+    def track(name: str):
+        with lock:
+            active[name] += 1
+            maxActive[name] = max(maxActive[name], active[name])
+        time.sleep(0.05)
+        yield
+        with lock:
+            active[name] -= 1
+
+    def installWheel(package, path, targetPath):
+        with track("install"):
+            return f"dist-{package.name}"
+
+    def cleanup(dist, path, record=None):
+        with track("hooks"):
+            assert path.endswith(dist[len("dist-") :])
+
+    monkeypatch.setattr(rez_pip.download, "downloadPackages", downloadPackages)
+    monkeypatch.setattr(rez_pip.install, "installWheel", installWheel)
+    monkeypatch.setattr(
+        rez_pip.install, "readWheelMetadata", lambda path: _wheelMetadata()
+    )
+    monkeypatch.setattr(rez_pip.install, "buildFileManifest", lambda *args: None)
+    monkeypatch.setattr(rez_pip.install, "cleanup", cleanup)
+    monkeypatch.setattr(rez_pip.patch, "patch", lambda *args, **kwargs: None)
+
+    with unittest.mock.patch.object(rez_pip.rez, "createPackage") as mocked:
+        rez_pip.cli._runForPythonVersion(
+            args, pipArgs, os.fspath(tmp_path), "3.10.2", "/python"
+        )
+
+    assert maxActive == {"install": 3, "hooks": 1}
+    assert sorted(call.args[0].dists for call in mocked.call_args_list) == [
+        [f"dist-{name}"] for name in names
+    ]
+
+
+def test_runForPythonVersion_hooks_order(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+):
+    """Test that hooks see the groups in resolve order when installs finish out of order"""
+    args, pipArgs = rez_pip.cli._parseArgs(
+        ["--no-resolve-cache", "--no-wheel-cache", "--install-workers", "6"]
+    )
+    names = [f"package-{index}" for index in range(6)]
+
+    monkeypatch.setattr(
+        rez_pip.pip,
+        "getPackages",
+        lambda *args, **kwargs: [_packageInfo(name) for name in names],
+    )
+
+    def downloadPackages(packageGroups, dest, onGroupDownloaded, **kwargs):
+        for group in packageGroups:
+            onGroupDownloaded(
+                rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact](
+                    tuple(
+                        rez_pip.pip.DownloadedArtifact.from_dict(
+                            {"_localPath": "/path", **package.to_dict()}
+                        )
+                        for package in group.packages
+                    )
+                )
+            )
+
+    installed: list[str] = []
+
+    def installWheel(package, path, targetPath):
+        # The first packages take the longest to install.
+        time.sleep(0.02 * (len(names) - names.index(package.name)))
+        installed.append(package.name)
+        return package.name
+
+    hooks: list[str] = []
+
+    monkeypatch.setattr(rez_pip.download, "downloadPackages", downloadPackages)
+    monkeypatch.setattr(rez_pip.install, "installWheel", installWheel)
+    monkeypatch.setattr(
+        rez_pip.install, "readWheelMetadata", lambda path: _wheelMetadata()
+    )
+    monkeypatch.setattr(rez_pip.install, "buildFileManifest", lambda *args: None)
+    monkeypatch.setattr(
+        rez_pip.install, "cleanup", lambda dist, *args, **kwargs: hooks.append(dist)
+    )
+    monkeypatch.setattr(rez_pip.patch, "patch", lambda *args, **kwargs: None)
+
+    with unittest.mock.patch.object(rez_pip.rez, "createPackage") as mocked:
+        rez_pip.cli._runForPythonVersion(
+            args, pipArgs, os.fspath(tmp_path), "3.10.2", "/python"
+        )
+
+    assert installed != names
+    assert hooks == names
+    assert [call.args[0].dists[0] for call in mocked.call_args_list] == names
+
+
+def test_runForPythonVersion_patch_and_create(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+):
+    """Test that patches never run while packages are created (both change the cwd)"""
+    args, pipArgs = rez_pip.cli._parseArgs(
+        ["--no-resolve-cache", "--no-wheel-cache", "--install-workers", "3"]
+    )
+    names = [f"package-{index}" for index in range(6)]
+
+    monkeypatch.setattr(
+        rez_pip.pip,
+        "getPackages",
+        lambda *args, **kwargs: [_packageInfo(name) for name in names],
+    )
+
+    def downloadPackages(packageGroups, dest, onGroupDownloaded, **kwargs):
+        for group in packageGroups:
+            onGroupDownloaded(
+                rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact](
+                    tuple(
+                        rez_pip.pip.DownloadedArtifact.from_dict(
+                            {"_localPath": "/path", **package.to_dict()}
+                        )
+                        for package in group.packages
+                    )
+                )
+            )
+
+    lock = threading.Lock()
+    active: list[str] = []
+    overlaps: list[list[str]] = []
+
+    def track(name: str) -> None:
+        with lock:
+            active.append(name)
+            if len(active) > 1:
+                overlaps.append(list(active))
+        time.sleep(0.02)
+        with lock:
+            active.remove(name)
+
+    monkeypatch.setattr(rez_pip.download, "downloadPackages", downloadPackages)
+    monkeypatch.setattr(
+        rez_pip.install, "installWheel", lambda package, *args: package.name
+    )
+    monkeypatch.setattr(
+        rez_pip.install, "readWheelMetadata", lambda path: _wheelMetadata()
+    )
+    monkeypatch.setattr(rez_pip.install, "buildFileManifest", lambda *args: None)
+    monkeypatch.setattr(rez_pip.install, "cleanup", lambda *args, **kwargs: None)
+    monkeypatch.setattr(
+        rez_pip.patch, "patch", lambda dist, *args, **kwargs: track(f"patch {dist}")
+    )
+    monkeypatch.setattr(
+        rez_pip.rez,
+        "createPackage",
+        lambda group, *args, **kwargs: track(f"create {group.dists[0]}"),
+    )
+
+    rez_pip.cli._runForPythonVersion(
+        args, pipArgs, os.fspath(tmp_path), "3.10.2", "/python"
+    )
+
+    assert overlaps == []
+
+
+def test_PythonVersionFilter():
+    record = logging.LogRecord(
+        "rez_pip", logging.INFO, __file__, 1, "Installing %r", ("asd",), None
+    )
+
+    versionFilter = rez_pip.cli._PythonVersionFilter()
+    assert versionFilter.filter(record)
+    assert record.getMessage() == "Installing 'asd'"
+
+    versionFilter.pythonVersion = "3.9.1"
+    assert versionFilter.filter(record)
+    assert record.getMessage() == "\\[python-3.9.1] Installing 'asd'"
+
+
 @pytest.mark.usefixtures("resetLogger")
 def test_run_with_debug_info(monkeypatch: pytest.MonkeyPatch):
     monkeypatch.setattr(sys, "argv", ["rez-pip", "example", "--debug-info"])
@@ -409,3 +1304,112 @@ def test_list_plugins(monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFix
 rez_pip.PySide6    cleanup, groupPackages, patches, postPipResolve, prePipResolve
 rez_pip.shiboken6  cleanup
 """
+
+
+@pytest.mark.usefixtures("resetLogger")
+def test_cache_command(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: pathlib.Path,
+    capsys: pytest.CaptureFixture,
+):
+    cacheDir = tmp_path / "cache"
+
+    wheelCache = rez_pip.cache.WheelCache(os.fspath(cacheDir / "wheels"), 0)
+    for name in [
+        "package_a-1.0.0-py3-none-any.whl",
+        "package_b-1.0.0-py3-none-any.whl",
+    ]:
+        (tmp_path / name).write_bytes(b"content")
+        wheelCache.add(os.fspath(tmp_path / name), name.split("-")[0] * 10)
+
+    monkeypatch.setattr(
+        sys, "argv", ["rez-pip", "cache", "--cache-dir", os.fspath(cacheDir)]
+    )
+    assert rez_pip.cli.run() == 0
+    output = capsys.readouterr().out
+    assert "wheels" in output
+    assert "14 B / 10.0 GiB" in output
+
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "rez-pip",
+            "cache",
+            "prune",
+            "--cache-dir",
+            os.fspath(cacheDir),
+            "--wheel-cache-max-size",
+            "7",
+        ],
+    )
+    assert rez_pip.cli.run() == 0
+    assert "Evicted 1 wheels (7 B)" in capsys.readouterr().out
+    assert len(wheelCache.entries()) == 1
+
+    monkeypatch.setattr(
+        sys, "argv", ["rez-pip", "cache", "clear", "--cache-dir", os.fspath(cacheDir)]
+    )
+    assert rez_pip.cli.run() == 0
+    assert not wheelCache.entries()
+
+
+@pytest.mark.usefixtures("resetLogger")
+def test_cache_command_export(
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: pathlib.Path,
+    capsys: pytest.CaptureFixture,
+):
+    cacheDir = tmp_path / "cache"
+
+    wheelCache = rez_pip.cache.WheelCache(os.fspath(cacheDir / "wheels"), 0)
+    (tmp_path / "package_a-1.0.0-py3-none-any.whl").write_bytes(b"content")
+    wheelCache.add(os.fspath(tmp_path / "package_a-1.0.0-py3-none-any.whl"), "a" * 64)
+
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "rez-pip",
+            "cache",
+            "export",
+            os.fspath(tmp_path / "wheelhouse"),
+            "--cache-dir",
+            os.fspath(cacheDir),
+        ],
+    )
+    assert rez_pip.cli.run() == 0
+    assert "Exported 1 wheels" in capsys.readouterr().out
+    assert (tmp_path / "wheelhouse" / "package_a-1.0.0-py3-none-any.whl").exists()
+
+    # The directory is required.
+    monkeypatch.setattr(sys, "argv", ["rez-pip", "cache", "export"])
+    assert rez_pip.cli.run() == 1
+
+
+@pytest.mark.usefixtures("resetLogger")
+def test_cache_command_invalid_action(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(sys, "argv", ["rez-pip", "cache", "asd"])
+    assert rez_pip.cli.run() == 1
+
+
+@pytest.mark.usefixtures("resetLogger")
+def test_run_trace(monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path):
+    trace = tmp_path / "trace.json"
+
+    def run(args, pipArgs, pipWorkArea):
+        with rez_pip.trace.span("resolve", "pip"):
+            pass
+
+    monkeypatch.setattr(rez_pip.cli, "_run", run)
+    monkeypatch.setattr(
+        sys, "argv", ["rez-pip", "example", "--trace", os.fspath(trace)]
+    )
+
+    assert rez_pip.cli.run() == 0
+    assert not rez_pip.trace.isEnabled()
+
+    events = json.loads(trace.read_text())["traceEvents"]
+    spans = {event["name"]: event for event in events if event["ph"] == "X"}
+    assert sorted(spans) == ["resolve", "rez-pip"]
+    assert spans["rez-pip"]["args"] == {"packages": ["example"]}
@@ -4,16 +4,24 @@
 
 from __future__ import annotations
 
+import io
 import os
+import json
 import typing
+import asyncio
 import hashlib
+import logging
 import pathlib
+import threading
+import collections
 import unittest.mock
 
 import pytest
 import aiohttp
+import aiohttp.web
 
 import rez_pip.pip
+import rez_pip.cache
 import rez_pip.download
 from rez_pip.compat import importlib_metadata
 
@@ -329,6 +337,7 @@ def test_download_reuse_if_same_hash(tmp_path: pathlib.Path):
         ]
 
     groups = []
+    sideEffects = tuple()
     # package-b will be re-used
     for package in ["package-c", "package-b"]:
         content = f"{package} data".encode("utf-8")
@@ -464,8 +473,9 @@ def test_download_redownload_if_hash_changes(tmp_path: pathlib.Path):
         ]
 
     groups = []
+    sideEffects = tuple()
     for package in ["package-a", "package-b"]:
-        content = f"{package} data".encode("utf-8")
+        content = f"{package} new data".encode("utf-8")
 
         groups.append(
             rez_pip.pip.PackageGroup(
@@ -476,10 +486,10 @@ def test_download_redownload_if_hash_changes(tmp_path: pathlib.Path):
                             url=f"https://example.com/{package}.whl",
                             archive_info=rez_pip.pip.ArchiveInfo(
                                 #
-                                # Bad sha256. This will trigger a new download
+                                # New sha256. This will trigger a new download
                                 #
                                 "hash-a",
-                                {"sha256": "asd"},
+                                {"sha256": hashlib.sha256(content).hexdigest()},
                             ),
                         ),
                         is_direct=True,
@@ -533,3 +543,589 @@ def test_download_redownload_if_hash_changes(tmp_path: pathlib.Path):
     assert len(wheels) == 2
     assert len(wheels[0].packages) == 1
     assert len(wheels[1].packages) == 1
+
+
+def test_download_wheel_cache(tmp_path: pathlib.Path):
+    """Test that downloaded wheels are added to the wheel cache and re-used"""
+    wheelCache = rez_pip.cache.WheelCache(os.fspath(tmp_path / "cache"), 1000)
+
+    content = b"package-a data"
+    digest = hashlib.sha256(content).hexdigest()
+
+    groups = [
+        rez_pip.pip.PackageGroup(
+            [
+                rez_pip.pip.PackageInfo(
+                    metadata=rez_pip.pip.Metadata(name="package-a", version="1.0.0"),
+                    download_info=rez_pip.pip.DownloadInfo(
+                        url="https://example.com/package_a-1.0.0-py3-none-any.whl",
+                        archive_info=rez_pip.pip.ArchiveInfo(
+                            f"sha256={digest}", {"sha256": digest}
+                        ),
+                    ),
+                    is_direct=True,
+                    requested=True,
+                )
+            ]
+        )
+    ]
+
+    mockedContent = unittest.mock.MagicMock()
+    mockedContent.return_value.__aiter__.return_value = [[content, None]]
+
+    mockedGet = unittest.mock.AsyncMock()
+    mockedGet.__aenter__.return_value = unittest.mock.Mock(
+        headers={"content-length": len(content)},
+        status=200,
+        content=unittest.mock.Mock(iter_chunks=mockedContent),
+    )
+
+    for index in range(2):
+        # Use a new download directory each time, like rez-pip does.
+        dest = tmp_path / f"dest{index}"
+        dest.mkdir()
+
+        with unittest.mock.patch.object(aiohttp.ClientSession, "get") as mocked:
+            mocked.return_value = mockedGet
+            wheels = rez_pip.download.downloadPackages(
+                groups, os.fspath(dest), wheelCache=wheelCache
+            )
+
+        assert mocked.call_count == (1 if index == 0 else 0)
+
+        path = wheels[0].packages[0].path
+        assert path == wheelCache.get(digest, "package_a-1.0.0-py3-none-any.whl")
+        with open(path, "rb") as fd:
+            assert fd.read() == content
+
+        assert os.listdir(dest) == []
+
+
+class FaultyServer:
+    """
+    Local HTTP server that serves files and injects faults. Faults are consumed
+    in order, one per request.
+
+    Supported faults:
+    * An HTTP status code: respond with that status.
+    * "reset": send half of the body and close the connection.
+    * "stall": wait before sending the body, to trigger read timeouts.
+
+    Range requests are honored when ranges is "honor" (only if If-Range matches the ETag)
+    and are advertised but ignored when ranges is "ignore".
+    """
+
+    def __init__(self) -> None:
+        self.files: dict[str, bytes] = {}
+        self.faults: dict[str, list[typing.Union[int, str]]] = {}
+        self.requests: collections.Counter[str] = collections.Counter()
+        self.delay = 0.0
+        self.inFlight = 0
+        self.maxInFlight = 0
+        self.ranges: typing.Optional[str] = None
+        self.rangeRequests: list[str] = []
+        self.bytesSent = 0
+        self.url = ""
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    async def _handler(
+        self, request: aiohttp.web.Request
+    ) -> aiohttp.web.StreamResponse:
+        name = request.match_info["name"]
+        self.requests[name] += 1
+        self.inFlight += 1
+        self.maxInFlight = max(self.maxInFlight, self.inFlight)
+        try:
+            await asyncio.sleep(self.delay)
+
+            faults = self.faults.get(name, [])
+            fault = faults.pop(0) if faults else None
+            data = self.files[name]
+
+            if isinstance(fault, int):
+                return aiohttp.web.Response(status=fault, headers={"Retry-After": "0"})
+
+            if fault == "stall":
+                await asyncio.sleep(1)
+
+            headers = {}
+            status = 200
+            etag = f'"{hashlib.sha256(data).hexdigest()}"'
+            if self.ranges:
+                headers = {"Accept-Ranges": "bytes", "ETag": etag}
+
+            rangeHeader = request.headers.get("Range")
+            if rangeHeader:
+                self.rangeRequests.append(rangeHeader)
+                if self.ranges == "honor" and request.headers.get("If-Range") == etag:
+                    start = int(rangeHeader[len("bytes=") : -1])
+                    if start >= len(data):
+                        return aiohttp.web.Response(status=416)
+                    headers["Content-Range"] = (
+                        f"bytes {start}-{len(data) - 1}/{len(data)}"
+                    )
+                    status = 206
+                    data = data[start:]
+
+            headers["Content-Length"] = str(len(data))
+            response = aiohttp.web.StreamResponse(status=status, headers=headers)
+            await response.prepare(request)
+
+            if fault == "reset":
+                await response.write(data[: len(data) // 2])
+                self.bytesSent += len(data) // 2
+                assert request.transport
+                request.transport.close()
+                return response
+
+            await response.write(data)
+            self.bytesSent += len(data)
+            await response.write_eof()
+            return response
+        finally:
+            self.inFlight -= 1
+
+    async def _start(self) -> None:
+        app = aiohttp.web.Application()
+        app.router.add_get("/{name}", self._handler)
+        self._runner = aiohttp.web.AppRunner(app)
+        await self._runner.setup()
+        site = aiohttp.web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    def start(self) -> None:
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def addFile(self, name: str, data: bytes) -> rez_pip.pip.PackageGroup:
+        self.files[name] = data
+        digest = hashlib.sha256(data).hexdigest()
+        return rez_pip.pip.PackageGroup(
+            [
+                rez_pip.pip.PackageInfo(
+                    metadata=rez_pip.pip.Metadata(name=name, version="1.0.0"),
+                    download_info=rez_pip.pip.DownloadInfo(
+                        url=f"{self.url}/{name}",
+                        archive_info=rez_pip.pip.ArchiveInfo(
+                            f"sha256={digest}", {"sha256": digest}
+                        ),
+                    ),
+                    is_direct=True,
+                    requested=True,
+                )
+            ]
+        )
+
+
+@pytest.fixture
+def faultyServer() -> typing.Generator[FaultyServer, None, None]:
+    server = FaultyServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+FAST_RETRIES = rez_pip.download.DownloadSettings(
+    retries=3, backoff=0.01, maxBackoff=0.05, readTimeout=0.5
+)
+
+
+@pytest.mark.parametrize(
+    "faults",
+    [[503], [429, 500], ["reset"], ["stall"], [502, "reset", 504]],
+    ids=["503", "429+500", "reset", "stall", "502+reset+504"],
+)
+def test_download_retries(
+    faultyServer: FaultyServer, tmp_path: pathlib.Path, faults: list
+):
+    data = os.urandom(2**20)
+    group = faultyServer.addFile("package-a", data)
+    faultyServer.faults["package-a"] = list(faults)
+
+    groups = rez_pip.download.downloadPackages(
+        [group], os.fspath(tmp_path), settings=FAST_RETRIES
+    )
+
+    assert faultyServer.requests["package-a"] == len(faults) + 1
+    with open(groups[0].packages[0].path, "rb") as fd:
+        assert fd.read() == data
+
+    # No leftover partial downloads
+    assert os.listdir(tmp_path) == ["package-a"]
+
+
+def test_download_retries_exhausted(faultyServer: FaultyServer, tmp_path: pathlib.Path):
+    group = faultyServer.addFile("package-a", b"data")
+    faultyServer.faults["package-a"] = [503] * 4
+
+    with pytest.raises(RuntimeError):
+        rez_pip.download.downloadPackages(
+            [group], os.fspath(tmp_path), settings=FAST_RETRIES
+        )
+
+    assert faultyServer.requests["package-a"] == 4
+    assert os.listdir(tmp_path) == []
+
+
+def test_download_no_retry_on_client_error(
+    faultyServer: FaultyServer, tmp_path: pathlib.Path
+):
+    group = faultyServer.addFile("package-a", b"data")
+    faultyServer.faults["package-a"] = [404]
+
+    with pytest.raises(RuntimeError):
+        rez_pip.download.downloadPackages(
+            [group], os.fspath(tmp_path), settings=FAST_RETRIES
+        )
+
+    assert faultyServer.requests["package-a"] == 1
+
+
+def test_download_connection_limits(faultyServer: FaultyServer, tmp_path: pathlib.Path):
+    faultyServer.delay = 0.05
+    groups = [
+        faultyServer.addFile(f"package-{index}", f"data {index}".encode("utf-8"))
+        for index in range(12)
+    ]
+
+    newGroups = rez_pip.download.downloadPackages(
+        groups,
+        os.fspath(tmp_path),
+        settings=rez_pip.download.DownloadSettings(
+            maxConnections=8, maxConnectionsPerHost=3
+        ),
+    )
+
+    assert len(newGroups) == 12
+    assert faultyServer.maxInFlight == 3
+
+
+@pytest.mark.parametrize(
+    "attempt,retryAfter,expectedMax",
+    [(0, None, 0.5), (3, None, 4.0), (10, None, 30), (0, 10, 10), (0, 100, 30)],
+)
+def test_getBackoffDelay(attempt: int, retryAfter, expectedMax: float):
+    settings = rez_pip.download.DownloadSettings()
+    for _ in range(20):
+        delay = rez_pip.download._getBackoffDelay(attempt, settings, retryAfter)
+        assert 0 <= delay <= expectedMax
+        if retryAfter is not None:
+            assert delay == min(retryAfter, settings.maxBackoff)
+
+
+def test_download_resume(faultyServer: FaultyServer, tmp_path: pathlib.Path):
+    faultyServer.ranges = "honor"
+    data = os.urandom(2**20)
+    group = faultyServer.addFile("package-a", data)
+    faultyServer.faults["package-a"] = ["reset"]
+
+    groups = rez_pip.download.downloadPackages(
+        [group], os.fspath(tmp_path), settings=FAST_RETRIES
+    )
+
+    with open(groups[0].packages[0].path, "rb") as fd:
+        assert fd.read() == data
+
+    assert len(faultyServer.rangeRequests) == 1
+    assert faultyServer.bytesSent < len(data) * 1.5
+    assert os.listdir(tmp_path) == ["package-a"]
+
+
+def test_download_resume_range_ignored(
+    faultyServer: FaultyServer, tmp_path: pathlib.Path
+):
+    faultyServer.ranges = "ignore"
+    data = os.urandom(2**20)
+    group = faultyServer.addFile("package-a", data)
+    faultyServer.faults["package-a"] = ["reset"]
+
+    groups = rez_pip.download.downloadPackages(
+        [group], os.fspath(tmp_path), settings=FAST_RETRIES
+    )
+
+    with open(groups[0].packages[0].path, "rb") as fd:
+        assert fd.read() == data
+
+    # The server sent the whole file again.
+    assert len(faultyServer.rangeRequests) == 1
+    assert faultyServer.bytesSent == len(data) * 1.5
+    assert os.listdir(tmp_path) == ["package-a"]
+
+
+@pytest.mark.parametrize("validatorChanged", [False, True])
+def test_download_resume_across_runs(
+    faultyServer: FaultyServer, tmp_path: pathlib.Path, validatorChanged: bool
+):
+    faultyServer.ranges = "honor"
+    data = os.urandom(2**20)
+    group = faultyServer.addFile("package-a", data)
+    faultyServer.faults["package-a"] = ["reset"] * 4
+    wheelCache = rez_pip.cache.WheelCache(os.fspath(tmp_path / "cache"), 2**30)
+    (tmp_path / "dest").mkdir()
+
+    with pytest.raises(RuntimeError):
+        rez_pip.download.downloadPackages(
+            [group],
+            os.fspath(tmp_path / "dest"),
+            wheelCache=wheelCache,
+            settings=FAST_RETRIES,
+        )
+
+    partialPath = wheelCache.getPartialPath(
+        group.packages[0].download_info.archive_info.hashes["sha256"], "package-a"
+    )
+    assert os.path.getsize(partialPath) < len(data)
+    assert sorted(entry.path for entry in wheelCache.partialEntries()) == [
+        partialPath,
+        f"{partialPath}.json",
+    ]
+
+    if validatorChanged:
+        with open(f"{partialPath}.json", "w") as fd:
+            json.dump({"url": f"{faultyServer.url}/package-a", "validator": '"a"'}, fd)
+
+    faultyServer.bytesSent = 0
+    groups = rez_pip.download.downloadPackages(
+        [group],
+        os.fspath(tmp_path / "dest"),
+        wheelCache=wheelCache,
+        settings=FAST_RETRIES,
+    )
+
+    with open(groups[0].packages[0].path, "rb") as fd:
+        assert fd.read() == data
+
+    if validatorChanged:
+        assert faultyServer.bytesSent == len(data)
+    else:
+        assert faultyServer.bytesSent < len(data)
+    assert wheelCache.partialEntries() == []
+    assert groups[0].packages[0].path == wheelCache.get(
+        group.packages[0].download_info.archive_info.hashes["sha256"], "package-a"
+    )
+
+
+@pytest.mark.parametrize(
+    "hash,hashes,expected",
+    [
+        ["sha256=abc", {"sha256": "abc"}, ("sha256", "abc")],
+        ["sha512=abc", {"sha384": "def", "sha512": "abc"}, ("sha384", "def")],
+        ["sha512=ABC", {}, ("sha512", "abc")],
+        ["md5=abc", {"md5": "abc", "sha512": "def"}, ("sha512", "def")],
+        ["hash", {}, None],
+        ["unknown=abc", {"unknown": "def"}, None],
+    ],
+)
+def test_getExpectedHash(hash: str, hashes: dict, expected):
+    archiveInfo = rez_pip.pip.ArchiveInfo(hash, hashes)
+    assert rez_pip.download.getExpectedHash(archiveInfo) == expected
+
+
+@pytest.mark.parametrize("algorithm", ["sha384", "sha512", "legacy"])
+def test_download_verify_other_hashes(
+    faultyServer: FaultyServer, tmp_path: pathlib.Path, algorithm: str
+):
+    data = os.urandom(1024)
+    group = faultyServer.addFile("package-a", data)
+    archiveInfo = group.packages[0].download_info.archive_info
+    if algorithm == "legacy":
+        archiveInfo.hash = f"sha512={hashlib.sha512(data).hexdigest()}"
+        archiveInfo.hashes = {}
+    else:
+        archiveInfo.hashes = {algorithm: hashlib.new(algorithm, data).hexdigest()}
+
+    groups = rez_pip.download.downloadPackages([group], os.fspath(tmp_path))
+    with open(groups[0].packages[0].path, "rb") as fd:
+        assert fd.read() == data
+
+    archiveInfo.hashes = {"sha512": hashlib.sha512(b"other").hexdigest()}
+    archiveInfo.hash = ""
+    os.remove(groups[0].packages[0].path)
+
+    with pytest.raises(rez_pip.download.HashMismatchError, match="sha512"):
+        rez_pip.download.downloadPackages([group], os.fspath(tmp_path))
+
+
+def test_download_hash_mismatch(faultyServer: FaultyServer, tmp_path: pathlib.Path):
+    faultyServer.delay = 0.2
+    groups = [
+        faultyServer.addFile("package-a", b"package-a data"),
+        faultyServer.addFile("package-b", b"package-b data"),
+    ]
+    faultyServer.files["package-a"] = b"corrupted"
+
+    with pytest.raises(
+        rez_pip.download.HashMismatchError, match="package-a doesn't match"
+    ):
+        rez_pip.download.downloadPackages(
+            groups, os.fspath(tmp_path), settings=FAST_RETRIES
+        )
+
+    # Not retried, and the corrupted file is not kept.
+    assert faultyServer.requests["package-a"] == 1
+    assert "package-a" not in os.listdir(tmp_path)
+
+
+def test_download_no_reread(faultyServer: FaultyServer, tmp_path: pathlib.Path):
+    """Test that downloaded wheels are hashed while they are written"""
+    wheelCache = rez_pip.cache.WheelCache(os.fspath(tmp_path / "cache"), 2**30)
+    group = faultyServer.addFile("package-a", os.urandom(1024))
+
+    with unittest.mock.patch.object(
+        rez_pip.download, "_updateDigest", side_effect=AssertionError
+    ):
+        groups = rez_pip.download.downloadPackages(
+            [group], os.fspath(tmp_path), wheelCache=wheelCache
+        )
+
+    assert groups[0].packages[0].path == wheelCache.get(
+        group.packages[0].download_info.archive_info.hashes["sha256"], "package-a"
+    )
+
+
+def test_download_wheel_cache_shared_dest(
+    faultyServer: FaultyServer, tmp_path: pathlib.Path
+):
+    """
+    Test that wheels going to the wheel cache don't go through the shared wheels
+    directory, where another process (see --jobs) can move them away.
+    """
+    wheelCache = rez_pip.cache.WheelCache(os.fspath(tmp_path / "cache"), 2**30)
+    group = faultyServer.addFile("package-a", b"package-a data")
+
+    dest = tmp_path / "wheels"
+    dest.mkdir()
+    # Downloaded by another process at the same time.
+    (dest / "package-a").write_bytes(b"other process")
+
+    with unittest.mock.patch.object(
+        rez_pip.cache.WheelCache, "add", wraps=wheelCache.add
+    ) as mocked:
+        groups = rez_pip.download.downloadPackages(
+            [group], os.fspath(dest), wheelCache=wheelCache
+        )
+
+    assert mocked.call_args.args[0] == os.fspath(dest / f"package-a.{os.getpid()}")
+    assert groups[0].packages[0].path == wheelCache.get(
+        group.packages[0].download_info.archive_info.hashes["sha256"], "package-a"
+    )
+    assert (dest / "package-a").read_bytes() == b"other process"
+    assert os.listdir(dest) == ["package-a"]
+
+
+def test_download_onGroupDownloaded(faultyServer: FaultyServer, tmp_path: pathlib.Path):
+    """Test that groups are handed over as soon as they are downloaded"""
+    groups = [
+        faultyServer.addFile("package-a", b"package-a data"),
+        faultyServer.addFile("package-b", b"package-b data"),
+    ]
+    faultyServer.faults["package-a"] = ["stall"]
+
+    downloaded: list[tuple[str, int]] = []
+
+    def onGroupDownloaded(group: rez_pip.pip.PackageGroup) -> None:
+        downloaded.append((group.packages[0].name, faultyServer.requests["package-a"]))
+
+    newGroups = rez_pip.download.downloadPackages(
+        groups, os.fspath(tmp_path), onGroupDownloaded=onGroupDownloaded
+    )
+
+    # package-b was handed over while package-a was still downloading.
+    assert sorted(downloaded) == [("package-a", 1), ("package-b", 1)]
+    assert downloaded[0][0] == "package-b"
+
+    # The returned groups are still in order.
+    assert [group.packages[0].name for group in newGroups] == [
+        "package-a",
+        "package-b",
+    ]
+
+
+def test_download_many_packages(
+    faultyServer: FaultyServer,
+    tmp_path: pathlib.Path,
+    caplog: pytest.LogCaptureFixture,
+):
+    """Test that thousands of wheels can be downloaded without a progress bar per wheel"""
+    import rich.progress
+
+    numPackages = 2000
+    groups = [
+        faultyServer.addFile(f"package-{index}", f"data {index}".encode("utf-8"))
+        for index in range(numPackages)
+    ]
+    size = sum(len(data) for data in faultyServer.files.values())
+
+    with unittest.mock.patch.object(
+        rich.progress, "Progress", side_effect=AssertionError("not a terminal")
+    ):
+        with caplog.at_level(logging.INFO, "rez_pip.download"):
+            newGroups = rez_pip.download.downloadPackages(
+                groups,
+                os.fspath(tmp_path),
+                settings=rez_pip.download.DownloadSettings(
+                    maxConnections=64, maxConnectionsPerHost=64
+                ),
+            )
+
+    assert [group.packages[0].name for group in newGroups] == [
+        f"package-{index}" for index in range(numPackages)
+    ]
+    assert faultyServer.bytesSent == size
+    assert f"Downloaded {numPackages}/{numPackages} wheels" in caplog.text
+
+
+def test_DownloadProgress_live(monkeypatch: pytest.MonkeyPatch):
+    """Test that only the downloads in flight are shown in a terminal"""
+    import rich.console
+
+    import rez_pip.utils
+
+    monkeypatch.setattr(
+        rez_pip.utils,
+        "CONSOLE",
+        rich.console.Console(file=io.StringIO(), force_terminal=True),
+    )
+
+    progress = rez_pip.download._DownloadProgress(live=True)
+    packages = [progress.addPackage(f"package-{index}") for index in range(3)]
+
+    with progress:
+        assert progress._progress is not None
+        assert [task.visible for task in progress._progress.tasks] == [
+            False,
+            False,
+            False,
+            True,
+        ]
+
+        packages[0].start(100, 0)
+        packages[0].advance(60)
+        packages[1].start(50, 10)
+        assert [task.visible for task in progress._progress.tasks] == [
+            True,
+            True,
+            False,
+            True,
+        ]
+
+        # Retried from scratch.
+        packages[0].count(0)
+        packages[0].start(100, 0)
+        packages[0].advance(100)
+        packages[0].finish()
+
+        mainTask = progress._progress.tasks[-1]
+        assert mainTask.description == "[bold]Total (1/3)"
+        assert (mainTask.total, mainTask.completed) == (150, 110)
+        assert len(progress._progress.tasks) == 3
@@ -5,16 +5,21 @@
 from __future__ import annotations
 
 import os
+import base64
+import hashlib
 import pathlib
+import zipfile
 import platform
 import subprocess
 
 import pytest
 import rez.rex
 import installer.utils
+import installer.records
 
 import rez_pip.pip
 import rez_pip.install
+import rez_pip.exceptions
 from rez_pip.compat import importlib_metadata
 
 from . import utils
@@ -83,3 +88,217 @@ def test_console_scripts(
     assert os.path.dirname(stdout) == os.path.dirname(
         executable
     ), f"stdout is {stdout!r} and executable is {executable!r}"
+
+
+def _packageInfo(name: str) -> rez_pip.pip.PackageInfo:
+    return rez_pip.pip.PackageInfo(
+        metadata=rez_pip.pip.Metadata(name=name, version="1.0.0"),
+        download_info=rez_pip.pip.DownloadInfo(
+            url=f"http://localhost/{name}-1.0.0-py3-none-any.whl",
+            archive_info=rez_pip.pip.ArchiveInfo("hash", {}),
+        ),
+        is_direct=True,
+        requested=True,
+    )
+
+
+def test_extractMetadata(index: utils.PyPIIndex, tmp_path: pathlib.Path):
+    dist = rez_pip.install.extractMetadata(
+        _packageInfo("console_scripts"),
+        os.fspath(index.getWheel("console_scripts")),
+        os.fspath(tmp_path),
+    )
+
+    assert dist.name == "console_scripts"
+    assert [ep.name for ep in dist.entry_points] == ["console_scripts_cmd"]
+
+    # Only the metadata is extracted.
+    assert os.listdir(tmp_path / "python") == ["console_scripts-0.1.0.dist-info"]
+
+
+def test_installWheel_shared_target(index: utils.PyPIIndex, tmp_path: pathlib.Path):
+    """Test that multiple wheels can be installed in the same directory"""
+    dists = [
+        rez_pip.install.installWheel(
+            _packageInfo(name), os.fspath(index.getWheel(name)), os.fspath(tmp_path)
+        )
+        for name in ["package_a", "package_b"]
+    ]
+
+    assert [dist.name for dist in dists] == ["package_a", "package_b"]
+
+
+def _readRecord(dist: importlib_metadata.Distribution) -> dict[str, tuple[str, str]]:
+    content = dist.read_text("RECORD")
+    assert content is not None
+    return {
+        path: (hash_, size)
+        for path, hash_, size in installer.records.parse_record_file(
+            content.splitlines()
+        )
+    }
+
+
+def test_Record(index: utils.PyPIIndex, tmp_path: pathlib.Path):
+    dist = rez_pip.install.installWheel(
+        _packageInfo("console_scripts"),
+        os.fspath(index.getWheel("console_scripts")),
+        os.fspath(tmp_path),
+    )
+    initial = _readRecord(dist)
+
+    script = [path for path in initial if path.startswith("../scripts/")][0]
+    init = "console_scripts/__init__.py"
+    newFile = "console_scripts/new.py"
+
+    record = rez_pip.install.Record(dist, os.fspath(tmp_path))
+
+    os.remove(tmp_path / "python" / script)
+    record.remove(os.fspath(tmp_path / "python" / script))
+
+    (tmp_path / "python" / init).write_bytes(b"patched = True\n")
+    record.update(os.fspath(tmp_path / "python" / init))
+
+    (tmp_path / "python" / newFile).write_bytes(b"")
+    record.update(os.fspath(tmp_path / "python" / newFile))
+
+    # Nothing is written until write() is called.
+    assert _readRecord(dist) == initial
+
+    record.write()
+
+    digest = base64.urlsafe_b64encode(hashlib.sha256(b"patched = True\n").digest())
+    expected = {path: value for path, value in initial.items() if path != script}
+    expected[init] = (f"sha256={digest.rstrip(b'=').decode()}", "15")
+    expected[newFile] = (
+        "sha256=47DEQpj8HBSa-_TImW-5JCeuQeRkm5NMpJWZG3hSuFU",
+        "0",
+    )
+    assert _readRecord(dist) == expected
+
+
+def test_Record_remove_directory(index: utils.PyPIIndex, tmp_path: pathlib.Path):
+    dist = rez_pip.install.installWheel(
+        _packageInfo("console_scripts"),
+        os.fspath(index.getWheel("console_scripts")),
+        os.fspath(tmp_path),
+    )
+    initial = _readRecord(dist)
+
+    record = rez_pip.install.Record(dist, os.fspath(tmp_path))
+    record.remove(os.fspath(tmp_path / "python" / "console_scripts"))
+    record.write()
+
+    assert _readRecord(dist) == {
+        path: value
+        for path, value in initial.items()
+        if not path.startswith("console_scripts/")
+    }
+
+
+def test_deleteEntryFromRecord(index: utils.PyPIIndex, tmp_path: pathlib.Path):
+    dist = rez_pip.install.installWheel(
+        _packageInfo("console_scripts"),
+        os.fspath(index.getWheel("console_scripts")),
+        os.fspath(tmp_path),
+    )
+    initial = _readRecord(dist)
+
+    # Multiple consecutive entries.
+    entries = [
+        path for path in initial if path.endswith(("/METADATA", "/WHEEL", "/INSTALLER"))
+    ]
+    assert len(entries) == 3
+
+    rez_pip.install.deleteEntryFromRecord(
+        dist, os.fspath(tmp_path), [f"python/{entry}" for entry in entries]
+    )
+
+    assert _readRecord(dist) == {
+        path: value for path, value in initial.items() if path not in entries
+    }
+
+
+@pytest.mark.parametrize("name", ["package_a", "console_scripts"])
+def test_readWheelMetadata(index: utils.PyPIIndex, tmp_path: pathlib.Path, name: str):
+    wheel = os.fspath(index.getWheel(name))
+    wheelMetadata = rez_pip.install.readWheelMetadata(wheel)
+
+    # Same as what is read from the installed distribution and from the extracted
+    # metadata.
+    installed = rez_pip.install.installWheel(
+        _packageInfo(name), wheel, os.fspath(tmp_path / "installed")
+    )
+    assert rez_pip.install.WheelMetadata.fromDistribution(installed) == wheelMetadata
+
+    extracted = rez_pip.install.extractMetadata(
+        _packageInfo(name), wheel, os.fspath(tmp_path / "extracted")
+    )
+    assert rez_pip.install.WheelMetadata.fromDistribution(extracted) == wheelMetadata
+
+
+def test_readWheelMetadata_data_scripts(tmp_path: pathlib.Path):
+    wheel = os.fspath(tmp_path / "mypkg-1.0.0-py3-none-linux_x86_64.whl")
+    with zipfile.ZipFile(wheel, "w") as archive:
+        archive.writestr(
+            "mypkg-1.0.0.dist-info/METADATA",
+            "Metadata-Version: 2.1\nName: mypkg\nVersion: 1.0.0\n"
+            "Requires-Python: >=3.7\nRequires-Dist: six\n"
+            "Requires-Dist: pytest ; extra == 'test'\n"
+            "Provides-Extra: test\nProvides-Extra: doc\n",
+        )
+        archive.writestr(
+            "mypkg-1.0.0.dist-info/WHEEL",
+            "Wheel-Version: 1.0\nRoot-Is-Purelib: false\nTag: py3-none-linux_x86_64\n",
+        )
+        archive.writestr("mypkg-1.0.0.dist-info/RECORD", "")
+        archive.writestr("mypkg-1.0.0.data/scripts/mypkg", "")
+        archive.writestr("mypkg-1.0.0.data/scripts/sub/nested", "")
+
+    assert rez_pip.install.readWheelMetadata(wheel) == rez_pip.install.WheelMetadata(
+        isPure=False,
+        hasEntryPoints=False,
+        scripts=("mypkg",),
+        requires=("six", "pytest ; extra == 'test'"),
+        requiresPython=">=3.7",
+        providesExtra="test",
+    )
+
+
+def test_readWheelMetadata_invalid(tmp_path: pathlib.Path):
+    wheel = os.fspath(tmp_path / "mypkg-1.0.0-py3-none-any.whl")
+    with zipfile.ZipFile(wheel, "w") as archive:
+        archive.writestr("mypkg/__init__.py", "")
+
+    with pytest.raises(rez_pip.exceptions.RezPipError, match="no .dist-info/WHEEL"):
+        rez_pip.install.readWheelMetadata(wheel)
+
+
+def test_buildFileManifest(index: utils.PyPIIndex, tmp_path: pathlib.Path):
+    dist = rez_pip.install.installWheel(
+        _packageInfo("console_scripts"),
+        os.fspath(index.getWheel("console_scripts")),
+        os.fspath(tmp_path),
+    )
+
+    manifest = rez_pip.install.buildFileManifest(dist, os.fspath(tmp_path))
+    assert manifest == rez_pip.install.buildFileManifest(dist)
+    assert manifest.root == os.fspath(tmp_path)
+
+    files = {file_.path.replace(os.sep, "/"): file_ for file_ in manifest.files}
+    assert sorted(files) == sorted(
+        os.path.relpath(os.path.join(dirpath, filename), tmp_path).replace(os.sep, "/")
+        for dirpath, _, filenames in os.walk(tmp_path)
+        for filename in filenames
+    )
+
+    init = files["python/console_scripts/__init__.py"]
+    assert init.scheme == "purelib"
+    assert init.size == os.path.getsize(
+        tmp_path / "python" / "console_scripts" / "__init__.py"
+    )
+
+    scripts = [file_ for path, file_ in files.items() if path.startswith("scripts/")]
+    assert len(scripts) == 1
+    assert scripts[0].scheme == "scripts"
+    assert manifest.size == sum(file_.size for file_ in manifest.files)
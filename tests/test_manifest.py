@@ -0,0 +1,128 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import os
+import json
+import pathlib
+
+import pytest
+
+import rez_pip.manifest
+
+TOML_MANIFEST = """
+[[entries]]
+name = "qt"
+packages = ["PySide6", "shiboken6"]
+python-version = "3.10+"
+prefix = "repo"
+release = true
+pip-args = ["--index-url", "https://example.com/simple"]
+
+[[entries]]
+requirement = "requirements.txt"
+constraint = ["constraints.txt"]
+
+[entries.python-executable]
+"3.9.1" = "/python-3.9.1"
+"""
+
+
+def test_loadManifest_toml(tmp_path: pathlib.Path):
+    path = tmp_path / "manifest.toml"
+    path.write_text(TOML_MANIFEST)
+
+    entries = rez_pip.manifest.loadManifest(os.fspath(path))
+
+    assert entries == [
+        rez_pip.manifest.ManifestEntry(
+            "qt",
+            {
+                "packages": ["PySide6", "shiboken6"],
+                "python_version": "3.10+",
+                "prefix": os.fspath(tmp_path / "repo"),
+                "release": True,
+            },
+            pipArgs=["--index-url", "https://example.com/simple"],
+        ),
+        rez_pip.manifest.ManifestEntry(
+            "requirements.txt",
+            {
+                "requirement": [os.fspath(tmp_path / "requirements.txt")],
+                "constraint": [os.fspath(tmp_path / "constraints.txt")],
+                "python_executable": [("3.9.1", "/python-3.9.1")],
+            },
+        ),
+    ]
+
+
+def test_loadManifest_json(tmp_path: pathlib.Path):
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps({"entries": [{"packages": ["six"]}]}))
+
+    assert rez_pip.manifest.loadManifest(os.fspath(path)) == [
+        rez_pip.manifest.ManifestEntry("six", {"packages": ["six"]})
+    ]
+
+
+@pytest.mark.parametrize(
+    "content,match",
+    [
+        ("asd = [", "Failed to read manifest"),
+        ("", "an 'entries' array"),
+        ("entries = []", "an 'entries' array"),
+        ("entries = [1]", "entry 0: entries must be tables"),
+        ("[[entries]]\nname = 'a'", "entry 0: at least one of 'packages'"),
+        ("[[entries]]\npackages = ['a']\nasd = 1", "unknown option\\(s\\) 'asd'"),
+        ("[[entries]]\npackages = [1]", "'packages' must be a string or a list"),
+        ("[[entries]]\npackages = 'a'\nrelease = 'yes'", "'release' must be a boolean"),
+        (
+            "[[entries]]\npackages = 'a'\npython-executable = 'python'",
+            "'python-executable' must map",
+        ),
+    ],
+)
+def test_loadManifest_invalid(tmp_path: pathlib.Path, content: str, match: str):
+    path = tmp_path / "manifest.toml"
+    path.write_text(content)
+
+    with pytest.raises(rez_pip.manifest.ManifestError, match=match):
+        rez_pip.manifest.loadManifest(os.fspath(path))
+
+
+def test_loadManifest_missing(tmp_path: pathlib.Path):
+    with pytest.raises(rez_pip.manifest.ManifestError, match="Failed to read"):
+        rez_pip.manifest.loadManifest(os.fspath(tmp_path / "manifest.toml"))
+
+
+def test_writeReport(tmp_path: pathlib.Path):
+    path = tmp_path / "report.json"
+    rez_pip.manifest.writeReport(
+        [
+            rez_pip.manifest.EntryResult("a", True, 1.5, packages={"3.9.1": 2}),
+            rez_pip.manifest.EntryResult("b", False, 0.5, error="failed"),
+        ],
+        os.fspath(path),
+    )
+
+    assert json.loads(path.read_text()) == {
+        "succeeded": False,
+        "entries": [
+            {
+                "name": "a",
+                "succeeded": True,
+                "duration": 1.5,
+                "packages": {"3.9.1": 2},
+                "error": None,
+            },
+            {
+                "name": "b",
+                "succeeded": False,
+                "duration": 0.5,
+                "packages": {},
+                "error": "failed",
+            },
+        ],
+    }
@@ -8,12 +8,17 @@ import os
 import re
 import sys
 import uuid
+import typing
+import shutil
+import asyncio
 import pathlib
 import subprocess
+import unittest.mock
 
 import pytest
 
 import rez_pip.pip
+import rez_pip.cache
 import rez_pip.utils
 import rez_pip.exceptions
 
@@ -257,6 +262,45 @@ ERROR: Could not find a version that satisfies the requirement {packageName} (fr
 ERROR: No matching distribution found for {packageName}""".lower()
 
 
+def test_getPackages_resolve_cache(tmp_path: pathlib.Path):
+    """Test that a cache hit doesn't run pip"""
+    resolveCache = rez_pip.cache.ResolveCache(os.fspath(tmp_path), 60)
+
+    rawPackage = {
+        "download_info": {
+            "url": "https://example.com/package_a-1.0.0-py2.py3-none-any.whl",
+            "archive_info": {"hash": "sha256=<val>", "hashes": {"sha256": "<val>"}},
+        },
+        "is_direct": False,
+        "requested": True,
+        "metadata": {"name": "package_a", "version": "1.0.0"},
+    }
+
+    arguments = (
+        ["package_a"],
+        rez_pip.pip.getBundledPip(),
+        "3.11",
+        sys.executable,
+        [],
+        [],
+        [],
+    )
+
+    with unittest.mock.patch.object(
+        rez_pip.pip, "_runPip", return_value={"install": [rawPackage]}
+    ) as mocked:
+        packages = rez_pip.pip.getPackages(*arguments, resolveCache=resolveCache)
+        assert mocked.call_count == 1
+
+        cachedPackages = rez_pip.pip.getPackages(*arguments, resolveCache=resolveCache)
+        assert mocked.call_count == 1
+
+        rez_pip.pip.getPackages(*arguments)
+        assert mocked.call_count == 2
+
+    assert packages == cachedPackages == [rez_pip.pip.PackageInfo.from_dict(rawPackage)]
+
+
 def test__readPipReport(tmp_path: pathlib.Path):
     # check for unicode encoding errors
     reportSrcContent = '{\n"description": "'
@@ -280,3 +324,222 @@ def test__readPipReport(tmp_path: pathlib.Path):
 
     reportContent = rez_pip.pip._readPipReport(reportPath=str(reportPath))
     assert reportContent
+
+
+def test_getPackages_wheel_cache(index: utils.PyPIIndex, tmp_path: pathlib.Path):
+    """Test that wheels linked from the wheel cache are reported as local files"""
+    wheelCache = rez_pip.cache.WheelCache(os.fspath(tmp_path / "wheels"), 1024**3)
+    wheel = tmp_path / index.getWheel("package_b").name
+    shutil.copyfile(index.getWheel("package_b"), wheel)
+    cachedWheel = wheelCache.add(os.fspath(wheel), index.getWheelHash("package_b"))
+
+    packages = rez_pip.pip.getPackages(
+        ["package_a"],
+        rez_pip.pip.getBundledPip(),
+        ".".join(str(i) for i in sys.version_info[:2]),
+        sys.executable,
+        [],
+        [],
+        [
+            "--find-links",
+            wheelCache.writeFindLinks(),
+            "--no-index",
+            "--find-links",
+            os.fspath(index.path / "package_a"),
+            "--find-links",
+            os.fspath(index.path / "package_b"),
+        ],
+    )
+
+    package = next(package for package in packages if package.name == "package_b")
+    assert not package.isDownloadRequired()
+
+    artifact = rez_pip.pip.DownloadedArtifact.from_dict(
+        {"_localPath": "", **package.to_dict()}
+    )
+    assert os.path.samefile(artifact.path, cachedWheel)
+
+
+def test_runPipProcess_trailing_output(capsys: pytest.CaptureFixture):
+    """Test that what pip writes right before exiting is not lost"""
+    returncode, output = asyncio.run(
+        rez_pip.pip._runPipProcess(
+            [
+                sys.executable,
+                "-c",
+                "import sys; print('line 1'); sys.stdout.write('last words'); sys.exit(3)",
+            ]
+        )
+    )
+
+    assert returncode == 3
+    assert output.splitlines() == ["line 1", "last words"]
+    assert capsys.readouterr().out == output
+
+
+def _writeSlowPip(tmp_path: pathlib.Path) -> tuple[str, pathlib.Path]:
+    """Write a fake pip that records its pid and hangs."""
+    pidFile = tmp_path / "pid"
+    pip = tmp_path / "pip.py"
+    pip.write_text(
+        "import os, time\n"
+        f"open({os.fspath(pidFile)!r}, 'w').write(str(os.getpid()))\n"
+        "time.sleep(60)\n"
+    )
+    return os.fspath(pip), pidFile
+
+
+def _isRunning(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_getPackages_timeout(tmp_path: pathlib.Path):
+    pip, pidFile = _writeSlowPip(tmp_path)
+
+    with pytest.raises(rez_pip.exceptions.PipError, match="didn't finish within 1"):
+        rez_pip.pip.getPackages(
+            ["package_a"], pip, "3.11", sys.executable, [], [], [], timeout=1
+        )
+
+    assert not _isRunning(int(pidFile.read_text()))
+
+
+def test_getPackagesAsync_cancel(tmp_path: pathlib.Path):
+    """Test that pip is stopped when the resolve is cancelled"""
+    pip, pidFile = _writeSlowPip(tmp_path)
+
+    async def run() -> None:
+        task = asyncio.ensure_future(
+            rez_pip.pip.getPackagesAsync(
+                ["package_a"], pip, "3.11", sys.executable, [], [], []
+            )
+        )
+        while not pidFile.exists() or not pidFile.read_text():
+            await asyncio.sleep(0.05)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(asyncio.wait_for(run(), 30))
+
+    assert not _isRunning(int(pidFile.read_text()))
+
+
+@pytest.fixture
+def pipProcesses() -> typing.Generator[None, None, None]:
+    yield
+    rez_pip.pip.stopPipProcesses()
+
+
+def test_getPackages_started_process(
+    index: utils.PyPIIndex, tmp_path: pathlib.Path, pipProcesses: None
+):
+    """Test that each resolve runs in its own pip process started ahead of time"""
+    pip = rez_pip.pip.getBundledPip()
+    arguments = (
+        ["package_a"],
+        pip,
+        ".".join(str(i) for i in sys.version_info[:2]),
+        sys.executable,
+        [],
+        [],
+        [
+            "--no-index",
+            "--find-links",
+            os.fspath(index.path / "package_a"),
+            "--find-links",
+            os.fspath(index.path / "package_b"),
+        ],
+    )
+
+    processes: list[subprocess.Popen[bytes] | None] = []
+    takePipProcess = rez_pip.pip._takePipProcess
+
+    def _takePipProcess(*args: str) -> subprocess.Popen[bytes] | None:
+        processes.append(takePipProcess(*args))
+        return processes[-1]
+
+    with unittest.mock.patch.object(
+        rez_pip.pip, "_takePipProcess", side_effect=_takePipProcess
+    ):
+        rez_pip.pip.startPipProcess(pip, sys.executable)
+        packages = rez_pip.pip.getPackages(*arguments)
+        assert sorted(package.name for package in packages) == [
+            "package_a",
+            "package_b",
+        ]
+
+        rez_pip.pip.startPipProcess(pip, sys.executable)
+        assert rez_pip.pip.getPackages(*arguments) == packages
+
+        # Processes are not reused.
+        assert rez_pip.pip.getPackages(*arguments) == packages
+
+    first, second, third = processes
+    assert first is not None and second is not None
+    assert first.pid != second.pid
+    assert first.returncode == 0 and second.returncode == 0
+    assert third is None
+
+
+def test_runStartedPipProcess_not_ready(capsys: pytest.CaptureFixture):
+    """Test that pip runs in a new process if the started process exits early"""
+    process = subprocess.Popen(
+        [sys.executable, "-c", "print('no pip here')"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+
+    returncode, output = asyncio.run(
+        rez_pip.pip._runStartedPipProcess(
+            process, [sys.executable, "-c", "print('new process')"]
+        )
+    )
+
+    assert returncode == 0
+    assert output == "new process\n"
+    assert capsys.readouterr().out == output
+
+
+def test_runStartedPipProcess_timeout():
+    """Test that a started process is stopped when the resolve times out"""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import sys, time; print('rez-pip: pip is ready', flush=True); sys.stdin.readline(); time.sleep(60)",
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(
+            asyncio.wait_for(
+                rez_pip.pip._runStartedPipProcess(
+                    process, [sys.executable, "pip.pyz", "install"]
+                ),
+                1,
+            )
+        )
+
+    assert process.returncode is not None
+
+
+def test_takePipProcess_environment_changed(
+    monkeypatch: pytest.MonkeyPatch, pipProcesses: None
+):
+    """Test that processes started with another environment are not used"""
+    pip = rez_pip.pip.getBundledPip()
+    rez_pip.pip.startPipProcess(pip, sys.executable)
+    process = rez_pip.pip._pipProcesses[(sys.executable, pip)].process
+
+    monkeypatch.setenv("PIP_INDEX_URL", "https://example.com/simple")
+
+    assert rez_pip.pip._takePipProcess(pip, sys.executable) is None
+    assert process.returncode is not None
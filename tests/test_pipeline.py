@@ -0,0 +1,170 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import time
+import typing
+import threading
+
+import pytest
+
+import rez_pip.pipeline
+
+
+def test_runPipeline():
+    def produce(emit: typing.Callable[[int], None]) -> None:
+        for item in range(5):
+            emit(item)
+
+    results, stats = rez_pip.pipeline.runPipeline(
+        produce,
+        [
+            rez_pip.pipeline.Stage("double", lambda item: item * 2),
+            rez_pip.pipeline.Stage("str", str),
+        ],
+        producerName="produce",
+    )
+
+    assert results == ["0", "2", "4", "6", "8"]
+    assert [(stage.name, stage.items) for stage in stats.stages] == [
+        ("produce", 5),
+        ("double", 5),
+        ("str", 5),
+    ]
+
+
+def test_runPipeline_overlap():
+    """Items are processed while the producer is still producing"""
+    processed: list[int] = []
+
+    def produce(emit: typing.Callable[[int], None]) -> None:
+        for item in range(4):
+            time.sleep(0.05)
+            emit(item)
+
+    def process(item: int) -> int:
+        time.sleep(0.05)
+        processed.append(item)
+        return item
+
+    results, stats = rez_pip.pipeline.runPipeline(
+        produce, [rez_pip.pipeline.Stage("process", process)]
+    )
+
+    assert results == [0, 1, 2, 3]
+    assert stats.wallTime < stats.sequentialTime
+    assert stats.overlap > 0.1
+    assert "saved by overlapping" in str(stats)
+
+
+def test_runPipeline_backpressure():
+    produced: list[int] = []
+    release = threading.Event()
+
+    def produce(emit: typing.Callable[[int], None]) -> None:
+        for item in range(10):
+            emit(item)
+            produced.append(item)
+
+    def process(item: int) -> int:
+        release.wait()
+        return item
+
+    thread = threading.Thread(
+        target=rez_pip.pipeline.runPipeline,
+        args=(produce, [rez_pip.pipeline.Stage("process", process)]),
+        kwargs={"queueSize": 2},
+    )
+    thread.start()
+    time.sleep(0.3)
+
+    # One item is being processed and two are waiting in the queue.
+    assert len(produced) == 3
+
+    release.set()
+    thread.join()
+    assert len(produced) == 10
+
+
+@pytest.mark.parametrize("failIn", ["produce", "process"])
+def test_runPipeline_error(failIn: str):
+    processed: list[int] = []
+
+    def produce(emit: typing.Callable[[int], None]) -> None:
+        for item in range(100):
+            if failIn == "produce" and item == 3:
+                raise ValueError("produce failed")
+            emit(item)
+
+    def process(item: int) -> int:
+        if failIn == "process" and item == 3:
+            raise ValueError("process failed")
+        processed.append(item)
+        return item
+
+    with pytest.raises(ValueError, match=f"{failIn} failed"):
+        rez_pip.pipeline.runPipeline(
+            produce, [rez_pip.pipeline.Stage("process", process)], queueSize=1
+        )
+
+    # The other items are not processed.
+    assert processed == [0, 1, 2]
+
+
+def test_runPipeline_workers():
+    """Items are processed concurrently by the workers of a stage"""
+    barrier = threading.Barrier(3, timeout=5)
+
+    def produce(emit: typing.Callable[[int], None]) -> None:
+        for item in range(9):
+            emit(item)
+
+    def process(item: int) -> int:
+        # Only passes if 3 workers are waiting at the same time.
+        barrier.wait()
+        return item
+
+    results, stats = rez_pip.pipeline.runPipeline(
+        produce,
+        [
+            rez_pip.pipeline.Stage("process", process, workers=3),
+            rez_pip.pipeline.Stage("double", lambda item: item * 2),
+        ],
+    )
+
+    assert sorted(results) == [item * 2 for item in range(9)]
+    assert [stage.items for stage in stats.stages] == [9, 9, 9]
+
+
+def test_runPipeline_order():
+    """Test that an ordered stage processes items in order, whatever the order they arrive in"""
+
+    def produce(emit: typing.Callable[[int], None]) -> None:
+        for item in range(6):
+            emit(item)
+
+    def process(item: int) -> int:
+        # The first items finish last.
+        time.sleep(0.01 * (6 - item))
+        return item
+
+    processed: list[int] = []
+
+    results, _ = rez_pip.pipeline.runPipeline(
+        produce,
+        [
+            rez_pip.pipeline.Stage("process", process, workers=6),
+            rez_pip.pipeline.Stage(
+                "ordered", processed.append, order=lambda item: item
+            ),
+        ],
+    )
+
+    assert processed == list(range(6))
+
+
+def test_Stage_order_workers():
+    with pytest.raises(ValueError, match="single worker"):
+        rez_pip.pipeline.Stage("ordered", str, workers=2, order=int)
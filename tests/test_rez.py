@@ -6,6 +6,7 @@ from __future__ import annotations
 
 import os
 import stat
+import threading
 import typing
 import pathlib
 import platform
@@ -19,9 +20,13 @@ import rez.package_repository
 
 import rez_pip.pip
 import rez_pip.rez
+import rez_pip.cache
 import rez_pip.utils
+import rez_pip.install
 from rez_pip.compat import importlib_metadata
 
+from . import utils
+
 
 def test_createPackage(monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path):
     source = tmp_path / "source"
@@ -116,6 +121,188 @@ def test_createPackage(monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path):
     assert package.tools == ["package-a-cli"]
 
 
+def _installedFiles(root: str) -> list[str]:
+    return sorted(
+        os.path.relpath(os.path.join(dirpath, filename), root).replace("\\", "/")
+        for dirpath, _, filenames in os.walk(root)
+        for filename in filenames
+    )
+
+
+@pytest.mark.parametrize("directInstall", [False, True], ids=["staged", "direct"])
+def test_createPackage_install_modes(
+    index: utils.PyPIIndex, tmp_path: pathlib.Path, directInstall: bool
+):
+    """Test that installing directly into the variant gives the same result"""
+    wheel = os.fspath(index.getWheel("console_scripts"))
+    staging = tmp_path / "staging"
+    repo = os.fspath(tmp_path / "repo")
+
+    package = rez_pip.pip.DownloadedArtifact.from_dict(
+        {
+            "_localPath": wheel,
+            **rez_pip.pip.PackageInfo(
+                metadata=rez_pip.pip.Metadata(name="console_scripts", version="0.1.0"),
+                download_info=rez_pip.pip.DownloadInfo(
+                    url="http://localhost/console_scripts-0.1.0-py3-none-any.whl",
+                    archive_info=rez_pip.pip.ArchiveInfo("hash", {}),
+                ),
+                is_direct=True,
+                requested=True,
+            ).to_dict(),
+        }
+    )
+    packageGroup = rez_pip.pip.PackageGroup([package])
+    targetPath = os.fspath(staging / package.name)
+
+    installDirectly = None
+    if directInstall:
+        dist = rez_pip.install.extractMetadata(package, wheel, targetPath)
+
+        def installDirectly(root: str) -> None:
+            rez_pip.install.installWheel(package, wheel, root)
+
+    else:
+        dist = rez_pip.install.installWheel(package, wheel, targetPath)
+    packageGroup.dists.append(dist)
+
+    rez_pip.rez.createPackage(
+        packageGroup,
+        rez.version.Version("3.7.0"),
+        os.fspath(staging),
+        prefix=repo,
+        installDirectly=installDirectly,
+    )
+
+    rezPackage = rez.packages.get_package("console_scripts", "0.1.0", paths=[repo])
+    assert rezPackage is not None
+    assert rezPackage.tools == ["console_scripts_cmd"]
+
+    variant = rezPackage.get_variant(0)
+    files = _installedFiles(variant.root)
+    assert "python/console_scripts/__init__.py" in files
+    assert any(path.startswith("scripts/console_scripts_cmd") for path in files)
+
+    # No temporary directories are left behind.
+    assert sorted(os.listdir(os.path.dirname(variant.root))) == sorted(
+        [os.path.basename(variant.root), "package.py"]
+    )
+
+
+def _consoleScriptsGroup(
+    index: utils.PyPIIndex, staging: pathlib.Path
+) -> rez_pip.pip.PackageGroup[rez_pip.pip.DownloadedArtifact]:
+    """Group of the console_scripts wheel, ready to be installed directly"""
+    wheel = os.fspath(index.getWheel("console_scripts"))
+    package = rez_pip.pip.DownloadedArtifact.from_dict(
+        {
+            "_localPath": wheel,
+            **rez_pip.pip.PackageInfo(
+                metadata=rez_pip.pip.Metadata(name="console_scripts", version="0.1.0"),
+                download_info=rez_pip.pip.DownloadInfo(
+                    url="http://localhost/console_scripts-0.1.0-py3-none-any.whl",
+                    archive_info=rez_pip.pip.ArchiveInfo("hash", {}),
+                ),
+                is_direct=True,
+                requested=True,
+            ).to_dict(),
+        }
+    )
+    packageGroup = rez_pip.pip.PackageGroup([package])
+    packageGroup.dists.append(
+        rez_pip.install.extractMetadata(
+            package, wheel, os.fspath(staging / package.name)
+        )
+    )
+    return packageGroup
+
+
+def test_createPackage_atomic(index: utils.PyPIIndex, tmp_path: pathlib.Path):
+    """Test that a failure doesn't leave a half populated variant"""
+    staging = tmp_path / "staging"
+    repo = tmp_path / "repo"
+    packageGroup = _consoleScriptsGroup(index, staging)
+    package = packageGroup.packages[0]
+
+    def installDirectly(root: str) -> None:
+        rez_pip.install.installWheel(package, package.path, root)
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError, match="failed"):
+        rez_pip.rez.createPackage(
+            packageGroup,
+            rez.version.Version("3.7.0"),
+            os.fspath(staging),
+            prefix=os.fspath(repo),
+            installDirectly=installDirectly,
+        )
+
+    # The package is removed, so that the next run doesn't skip it.
+    assert (
+        rez.packages.get_package("console_scripts", "0.1.0", paths=[os.fspath(repo)])
+        is None
+    )
+    assert not (repo / "console_scripts" / "0.1.0").exists()
+
+
+def test_createPackage_atomic_existing_package(
+    index: utils.PyPIIndex, tmp_path: pathlib.Path
+):
+    """Test that a failure only removes the new variant of an existing package"""
+    staging = tmp_path / "staging"
+    repo = os.fspath(tmp_path / "repo")
+    packageGroup = _consoleScriptsGroup(index, staging)
+    package = packageGroup.packages[0]
+
+    def createPackage(pythonVersion: str, fail: bool) -> None:
+        def installDirectly(root: str) -> None:
+            rez_pip.install.installWheel(package, package.path, root)
+            if fail:
+                raise RuntimeError("failed")
+
+        with unittest.mock.patch.object(
+            rez_pip.utils,
+            "getRezRequirements",
+            return_value=rez_pip.utils.RequirementsDict(
+                requires=[],
+                variant_requires=[f"python-{pythonVersion}"],
+                metadata={"is_pure_python": False},
+            ),
+        ):
+            rez_pip.rez.createPackage(
+                packageGroup,
+                rez.version.Version(pythonVersion),
+                os.fspath(staging),
+                prefix=repo,
+                installDirectly=installDirectly,
+            )
+
+    def getVariants() -> list[list[str]]:
+        rezPackage = rez.packages.get_package("console_scripts", "0.1.0", paths=[repo])
+        assert rezPackage is not None
+        return [
+            [str(require) for require in variant.variant_requires]
+            for variant in rezPackage.iter_variants()
+        ]
+
+    createPackage("3.7", fail=False)
+    definition = (
+        tmp_path / "repo" / "console_scripts" / "0.1.0" / "package.py"
+    ).read_text()
+
+    with pytest.raises(RuntimeError, match="failed"):
+        createPackage("3.8", fail=True)
+
+    assert getVariants() == [["python-3.7"]]
+    versionDir = tmp_path / "repo" / "console_scripts" / "0.1.0"
+    assert (versionDir / "package.py").read_text() == definition
+    assert len([path for path in versionDir.iterdir() if path.is_dir()]) == 1
+
+    # The variant is not skipped by the next run.
+    createPackage("3.8", fail=False)
+    assert getVariants() == [["python-3.7"], ["python-3.8"]]
+
+
 def test_convertMetadata_nothing_to_convert(monkeypatch: pytest.MonkeyPatch):
     dist = importlib_metadata.Distribution.at("asd")
     monkeypatch.setattr(
@@ -400,6 +587,49 @@ def test_getPythonExecutables(
             )
 
 
+def test_getPythonExecutables_package_family(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that a custom package family is used and resolved in the calling thread"""
+    repoData: dict[str, dict[str, dict[str, str]]] = {
+        "pypy": {"3.9.0": {"version": "3.9.0"}, "3.10.0": {"version": "3.10.0"}}
+    }
+
+    repo = typing.cast(
+        rez.package_repository.PackageRepository,
+        rez.package_repository.create_memory_package_repository(repoData),
+    )
+
+    threads: list[threading.Thread] = []
+    resolvePythonContext = rez_pip.rez._resolvePythonContext
+
+    def _resolve(package: rez.packages.Package) -> rez.resolved_context.ResolvedContext:
+        threads.append(threading.current_thread())
+        return resolvePythonContext(package)
+
+    with monkeypatch.context() as context:
+        context.setitem(
+            rez.package_repository.package_repository_manager.repositories,
+            f"memory@{repo.location}",
+            repo,
+        )
+
+        context.setattr(rez.config.config, "packages_path", [f"memory@{repo.location}"])
+        context.setattr(rez_pip.rez, "_resolvePythonContext", _resolve)
+
+        with unittest.mock.patch(
+            "rez.resolved_context.ResolvedContext.which"
+        ) as mocked:
+            mocked.side_effect = ["/path/python3.9.0", "/path/python3.10.0"]
+
+            assert rez_pip.rez.getPythonExecutables(None, "pypy") == {
+                "3.9.0": pathlib.Path("/path/python3.9.0"),
+                "3.10.0": pathlib.Path("/path/python3.10.0"),
+            }
+
+    assert threads == [threading.current_thread()] * 2
+
+
 def test_getPythonExecutables_package_family_missing(
     monkeypatch: pytest.MonkeyPatch,
 ) -> None:
@@ -531,3 +761,223 @@ def test_getPythonExecutables_isolation(
             assert rez_pip.rez.getPythonExecutables("1.0.0", "python") == {
                 "1.0.0": packagePath / f"python1{ext}"
             }
+
+
+def test_getPythonExecutables_cache(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+) -> None:
+    executable = tmp_path / "python1.0"
+    executable.write_text("#FAKE EXECUTABLE")
+
+    cache = rez_pip.cache.InterpreterCache(os.fspath(tmp_path / "cache"))
+
+    def getExecutables(repoData: dict[str, dict[str, dict[str, typing.Any]]]):
+        repo = typing.cast(
+            rez.package_repository.PackageRepository,
+            rez.package_repository.create_memory_package_repository(repoData),
+        )
+
+        with monkeypatch.context() as context:
+            context.setitem(
+                rez.package_repository.package_repository_manager.repositories,
+                f"memory@{repo.location}",
+                repo,
+            )
+            context.setattr(
+                rez.config.config, "packages_path", [f"memory@{repo.location}"]
+            )
+
+            with unittest.mock.patch(
+                "rez.resolved_context.ResolvedContext.which",
+                return_value=os.fspath(executable),
+            ) as mocked:
+                executables = rez_pip.rez.getPythonExecutables(
+                    "1", "python", cache=cache
+                )
+            return executables, mocked.call_count
+
+    repoData: dict[str, dict[str, dict[str, typing.Any]]] = {
+        "python": {"1.0.0": {"version": "1.0.0", "timestamp": 1}}
+    }
+
+    assert getExecutables(repoData) == ({"1.0.0": executable}, 1)
+    assert len(cache.entries()) == 1
+
+    # Cache hit, nothing is resolved.
+    with unittest.mock.patch("rez.resolved_context.ResolvedContext") as mocked:
+        assert getExecutables(repoData) == ({"1.0.0": executable}, 0)
+    assert not mocked.called
+
+    # The package was re-released.
+    repoData["python"]["1.0.0"]["timestamp"] = 2
+    assert getExecutables(repoData) == ({"1.0.0": executable}, 1)
+    assert len(cache.entries()) == 2
+
+    # The executable doesn't exist anymore.
+    executable.unlink()
+    assert getExecutables(repoData) == ({"1.0.0": executable}, 1)
+
+
+@pytest.mark.parametrize(
+    "name,version", [("package_a", "1.0.0"), ("console_scripts", "0.1.0")]
+)
+def test_packageGroupExists(
+    index: utils.PyPIIndex, tmp_path: pathlib.Path, name: str, version: str
+):
+    """Test that the variant computed from pip's report matches the created one"""
+    wheel = index.getWheel(name)
+    staging = tmp_path / "staging"
+    repo = os.fspath(tmp_path / "repo")
+
+    def makePackage(
+        url: str = wheel.as_uri(), requiresDist: list[str] | None = None
+    ) -> rez_pip.pip.DownloadedArtifact:
+        return rez_pip.pip.DownloadedArtifact.from_dict(
+            {
+                "_localPath": os.fspath(wheel),
+                **rez_pip.pip.PackageInfo(
+                    metadata=rez_pip.pip.Metadata(
+                        name=name, version=version, requires_dist=requiresDist or []
+                    ),
+                    download_info=rez_pip.pip.DownloadInfo(
+                        url=url, archive_info=rez_pip.pip.ArchiveInfo("hash", {})
+                    ),
+                    is_direct=True,
+                    requested=True,
+                ).to_dict(),
+            }
+        )
+
+    package = makePackage()
+    packageGroup = rez_pip.pip.PackageGroup([package])
+    pythonVersion = rez.version.Version("3.7.0")
+
+    assert not rez_pip.rez.packageGroupExists(packageGroup, pythonVersion, prefix=repo)
+
+    packageGroup.dists.append(
+        rez_pip.install.installWheel(
+            package, os.fspath(wheel), os.fspath(staging / name)
+        )
+    )
+    rez_pip.rez.createPackage(
+        packageGroup, pythonVersion, os.fspath(staging), prefix=repo
+    )
+
+    rezPackage = rez.packages.get_package(name, version, paths=[repo])
+    assert rezPackage is not None
+    assert os.path.isdir(os.path.join(next(rezPackage.iter_variants()).root, "python"))
+
+    assert rez_pip.rez.packageGroupExists(
+        rez_pip.pip.PackageGroup([package]), pythonVersion, prefix=repo
+    )
+
+    # Requirements with markers end up in the variant.
+    assert not rez_pip.rez.packageGroupExists(
+        rez_pip.pip.PackageGroup(
+            [makePackage(requiresDist=["package_b; python_version >= '3'"])]
+        ),
+        pythonVersion,
+        prefix=repo,
+    )
+
+    # Non pure wheels are varianted on the python version.
+    assert not rez_pip.rez.packageGroupExists(
+        rez_pip.pip.PackageGroup(
+            [
+                makePackage(
+                    url=f"https://example.com/{name}-{version}-cp37-cp37m-manylinux2014_x86_64.whl"
+                )
+            ]
+        ),
+        pythonVersion,
+        prefix=repo,
+    )
+
+
+def test_getPurePackageGroupKey():
+    def makeGroup(
+        url: str = "https://example.com/package_a-1.0.0-py3-none-any.whl",
+        requiresDist: list[str] | None = None,
+    ) -> rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo]:
+        return rez_pip.pip.PackageGroup(
+            [
+                rez_pip.pip.PackageInfo(
+                    metadata=rez_pip.pip.Metadata(
+                        name="package_a",
+                        version="1.0.0",
+                        requires_dist=requiresDist or [],
+                    ),
+                    download_info=rez_pip.pip.DownloadInfo(
+                        url=url, archive_info=rez_pip.pip.ArchiveInfo("hash", {})
+                    ),
+                    is_direct=True,
+                    requested=True,
+                )
+            ]
+        )
+
+    def getKey(
+        group: rez_pip.pip.PackageGroup[rez_pip.pip.PackageInfo],
+        pythonVersion: str,
+        prefix: str = "/repo",
+    ) -> str | None:
+        return rez_pip.rez.getPurePackageGroupKey(
+            group, rez.version.Version(pythonVersion), prefix=prefix
+        )
+
+    key = getKey(makeGroup(), "3.9.0")
+    assert key is not None
+    assert getKey(makeGroup(), "3.11.0") == key
+    assert getKey(makeGroup(), "3.11.0", prefix="/other") != key
+
+    # Markers can make the requirements different for some python versions.
+    group = makeGroup(requiresDist=["package_b; python_version >= '3.10'"])
+    assert getKey(group, "3.9.0") != getKey(group, "3.11.0")
+    assert getKey(group, "3.10.0") == getKey(group, "3.11.0")
+
+    assert (
+        getKey(
+            makeGroup(
+                url="https://example.com/package_a-1.0.0-cp39-cp39-manylinux2014_x86_64.whl"
+            ),
+            "3.9.0",
+        )
+        is None
+    )
+
+
+def test_packageGroupExists_platlib_none_any():
+    """Test that none-any wheels that are not purelib are found with their python variant"""
+    package = rez_pip.pip.PackageInfo(
+        metadata=rez_pip.pip.Metadata(name="package_a", version="1.0.0"),
+        download_info=rez_pip.pip.DownloadInfo(
+            url="https://example.com/package_a-1.0.0-py3-none-any.whl",
+            archive_info=rez_pip.pip.ArchiveInfo("hash", {}),
+        ),
+        is_direct=True,
+        requested=True,
+    )
+    pythonVersion = rez.version.Version("3.9.0")
+
+    pureVariant = rez_pip.utils.getRezRequirementsFromReport(
+        package, pythonVersion, hasEntryPoints=False
+    ).variant_requires
+    platlibVariant = rez_pip.utils.getRezRequirementsFromReport(
+        package, pythonVersion, hasEntryPoints=False, isPure=False
+    ).variant_requires
+    assert pureVariant != platlibVariant
+    assert "python-3.9" in platlibVariant
+
+    rezPackage = unittest.mock.Mock()
+    rezPackage.iter_variants.return_value = [
+        unittest.mock.Mock(
+            variant_requires=[rez.version.Requirement(req) for req in platlibVariant]
+        )
+    ]
+
+    with unittest.mock.patch.object(
+        rez.packages, "get_package", return_value=rezPackage
+    ):
+        assert rez_pip.rez.packageGroupExists(
+            rez_pip.pip.PackageGroup([package]), pythonVersion, prefix="/repo"
+        )
@@ -0,0 +1,130 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import json
+import typing
+import asyncio
+import pathlib
+import threading
+
+import pytest
+
+import rez_pip.trace
+
+
+@pytest.fixture
+def tracing() -> typing.Generator[None, None, None]:
+    rez_pip.trace.start()
+    yield
+    rez_pip.trace.stop()
+
+
+def _spans(events: list[dict[str, typing.Any]]) -> list[dict[str, typing.Any]]:
+    return [event for event in events if event["ph"] != "M"]
+
+
+def test_span_disabled():
+    assert not rez_pip.trace.isEnabled()
+
+    with rez_pip.trace.span("name", key="value") as spanArgs:
+        spanArgs["other"] = 1
+
+    assert rez_pip.trace.stop() == []
+
+
+@pytest.mark.usefixtures("tracing")
+def test_span():
+    with rez_pip.trace.span("parent", "test", key="value") as spanArgs:
+        with rez_pip.trace.span("child", "test"):
+            pass
+        spanArgs["other"] = 1
+
+    with pytest.raises(ValueError):
+        with rez_pip.trace.span("failure", "test"):
+            raise ValueError("failure")
+
+    child, parent, failure = _spans(rez_pip.trace.stop())
+
+    assert [child["name"], parent["name"], failure["name"]] == [
+        "child",
+        "parent",
+        "failure",
+    ]
+    assert child["ph"] == parent["ph"] == "X"
+    assert parent["args"] == {"key": "value", "other": 1}
+    assert failure["args"] == {"error": "ValueError"}
+
+    # The child is nested in the parent.
+    assert parent["ts"] <= child["ts"]
+    assert child["ts"] + child["dur"] <= parent["ts"] + parent["dur"]
+
+
+@pytest.mark.usefixtures("tracing")
+def test_span_threads():
+    def run() -> None:
+        with rez_pip.trace.span("thread"):
+            pass
+
+    thread = threading.Thread(target=run, name="my-thread")
+    thread.start()
+    thread.join()
+
+    with rez_pip.trace.span("main"):
+        pass
+
+    events = rez_pip.trace.stop()
+    threadSpan, mainSpan = _spans(events)
+    assert threadSpan["tid"] != mainSpan["tid"]
+    assert threadSpan["pid"] == mainSpan["pid"]
+
+    threadNames = {
+        event["tid"]: event["args"]["name"]
+        for event in events
+        if event["name"] == "thread_name"
+    }
+    assert threadNames[threadSpan["tid"]] == "my-thread"
+
+
+@pytest.mark.usefixtures("tracing")
+def test_span_asyncio():
+    """Spans of concurrent tasks are async events, one track per task"""
+
+    async def task(name: str) -> None:
+        with rez_pip.trace.span(name, "download"):
+            await asyncio.sleep(0.01)
+
+    async def main() -> None:
+        await asyncio.gather(task("a"), task("b"))
+
+    asyncio.run(main())
+
+    events = _spans(rez_pip.trace.stop())
+    assert sorted((event["name"], event["ph"]) for event in events) == [
+        ("a", "b"),
+        ("a", "e"),
+        ("b", "b"),
+        ("b", "e"),
+    ]
+
+    ids = {event["name"]: event["id"] for event in events}
+    assert ids["a"] != ids["b"]
+
+
+@pytest.mark.usefixtures("tracing")
+def test_collect_addEvents(tmp_path: pathlib.Path):
+    with rez_pip.trace.span("worker"):
+        pass
+
+    events = rez_pip.trace.collect()
+    assert [event["name"] for event in _spans(events)] == ["worker"]
+    assert rez_pip.trace.collect() == []
+
+    rez_pip.trace.addEvents(events)
+    path = tmp_path / "trace.json"
+    rez_pip.trace.write(rez_pip.trace.stop(), str(path))
+
+    data = json.loads(path.read_text())
+    assert [event["name"] for event in _spans(data["traceEvents"])] == ["worker"]
@@ -0,0 +1,114 @@
+# SPDX-FileCopyrightText: 2022 Contributors to the rez project
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from __future__ import annotations
+
+import os
+import sys
+import errno
+import pathlib
+import unittest.mock
+
+import pytest
+
+import rez_pip.transfer
+
+
+@pytest.fixture
+def source(tmp_path: pathlib.Path) -> pathlib.Path:
+    path = tmp_path / "src" / "file.py"
+    path.parent.mkdir()
+    path.write_bytes(b"print('hello')\n" * 1000)
+    path.chmod(0o755)
+    os.utime(path, (1000000, 1000000))
+    return path
+
+
+@pytest.mark.parametrize("strategy", ["hardlink", "copy_file_range", "copy"])
+def test_FileTransfer(source: pathlib.Path, tmp_path: pathlib.Path, strategy: str):
+    if strategy == "copy_file_range" and not hasattr(os, "copy_file_range"):
+        pytest.skip("copy_file_range is not available")
+
+    dest = tmp_path / "dest" / "file.py"
+    dest.parent.mkdir()
+
+    transfer = rez_pip.transfer.FileTransfer(
+        strategy, os.fspath(source.parent), os.fspath(dest.parent)
+    )
+    transfer(os.fspath(source), os.fspath(dest))
+
+    assert dest.read_bytes() == source.read_bytes()
+    assert dest.stat().st_mtime == 1000000
+    if sys.platform != "win32":
+        assert dest.stat().st_mode == source.stat().st_mode
+    assert os.path.samefile(source, dest) == (strategy == "hardlink")
+    assert transfer.counts == {strategy: 1}
+
+
+def test_FileTransfer_auto_fallback(
+    source: pathlib.Path, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Unsupported strategies are skipped and not tried again"""
+    reflink = unittest.mock.Mock(side_effect=OSError(errno.EOPNOTSUPP, "Not supported"))
+    monkeypatch.setitem(rez_pip.transfer._FUNCTIONS, "reflink", reflink)
+
+    dest = tmp_path / "dest"
+    dest.mkdir()
+
+    transfer = rez_pip.transfer.FileTransfer(
+        "auto", os.fspath(source.parent), os.fspath(dest)
+    )
+    for index in range(3):
+        transfer(os.fspath(source), os.fspath(dest / f"file{index}.py"))
+
+    assert reflink.call_count == 1
+    assert transfer.counts == {"hardlink": 3}
+
+
+def test_FileTransfer_auto_other_file_system(
+    source: pathlib.Path, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    """Reflinks and hard links are not used across file systems"""
+    monkeypatch.setattr(rez_pip.transfer, "_getDevice", lambda path: hash(path))
+
+    # Destination doesn't exist yet.
+    dest = tmp_path / "dest" / "sub"
+
+    transfer = rez_pip.transfer.FileTransfer(
+        "auto", os.fspath(source.parent), os.fspath(dest)
+    )
+    dest.mkdir(parents=True)
+    transfer(os.fspath(source), os.fspath(dest / "file.py"))
+
+    assert not os.path.samefile(source, dest / "file.py")
+    assert set(transfer.counts) <= {"copy_file_range", "copy"}
+
+
+def test_FileTransfer_explicit_unsupported(
+    source: pathlib.Path, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setitem(
+        rez_pip.transfer._FUNCTIONS,
+        "reflink",
+        unittest.mock.Mock(side_effect=OSError(errno.EXDEV, "Cross-device link")),
+    )
+
+    transfer = rez_pip.transfer.FileTransfer(
+        "reflink", os.fspath(source.parent), os.fspath(tmp_path)
+    )
+    with pytest.raises(rez_pip.transfer.TransferError, match="Cross-device link"):
+        transfer(os.fspath(source), os.fspath(tmp_path / "file.py"))
+
+
+def test_FileTransfer_other_errors(source: pathlib.Path, tmp_path: pathlib.Path):
+    transfer = rez_pip.transfer.FileTransfer(
+        "auto", os.fspath(source.parent), os.fspath(tmp_path)
+    )
+    with pytest.raises(FileNotFoundError):
+        transfer(os.fspath(tmp_path / "missing.py"), os.fspath(tmp_path / "file.py"))
+
+
+def test_FileTransfer_unknown_strategy(tmp_path: pathlib.Path):
+    with pytest.raises(rez_pip.transfer.TransferError, match="Unknown"):
+        rez_pip.transfer.FileTransfer("asd", os.fspath(tmp_path), os.fspath(tmp_path))
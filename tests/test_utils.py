@@ -5,6 +5,8 @@
 from __future__ import annotations
 
 import typing
+import logging
+import unittest.mock
 
 import pytest
 import rez.version
@@ -12,7 +14,9 @@ import packaging.version
 import packaging.specifiers
 import packaging.requirements
 
+import rez_pip.pip
 import rez_pip.utils
+import rez_pip.install
 
 # @pytest.fixture
 # def distPath():
@@ -80,6 +84,31 @@ def test_pythonSpecifierToRezRequirement_raises():
         )
 
 
+@pytest.mark.parametrize(
+    "first,second",
+    [
+        [("==1.0", "1.0+<1.0.1"), ("==1", "1+<1.1")],
+        [(">=1.21.0", "1.21.0+"), (">=1.21", "1.21+")],
+    ],
+)
+def test_pythonSpecifierToRezRequirement_cached(
+    first: tuple[str, str], second: tuple[str, str]
+):
+    """Test that specifier sets that compare equal don't share a cache entry"""
+    rez_pip.utils.clearCaches()
+    assert packaging.specifiers.SpecifierSet(
+        first[0]
+    ) == packaging.specifiers.SpecifierSet(second[0])
+
+    for pythonSpec, rezReq in (first, second):
+        assert rez_pip.utils.pythonSpecifierToRezRequirement(
+            packaging.specifiers.SpecifierSet(pythonSpec)
+        ) == rez.version.VersionRange(rezReq)
+        assert rez_pip.utils.pythonReqToRezReq(
+            packaging.requirements.Requirement(f"package{pythonSpec}")
+        ) == rez.version.Requirement(f"package-{rezReq}")
+
+
 @pytest.mark.parametrize(
     "pythonReq,rezReq",
     [
@@ -242,3 +271,70 @@ def test_normalizeRequirement(
     assert [str(req) for req in result] == [str(req) for req in expected]
     for index, req in enumerate(result):
         assert req.conditional_extras == conditional_extras[index]
+
+
+def test_normalizeRequirement_cached():
+    rez_pip.utils.clearCaches()
+
+    result = rez_pip.utils.normalizeRequirement("mypkg>=1 ; extra == 'dev'")
+    result[0].name = "renamed"
+    result[0].conditional_extras.add("doc")
+
+    # Cached requirements are not modified by the callers.
+    result = rez_pip.utils.normalizeRequirement("mypkg>=1 ; extra == 'dev'")
+    assert result[0].name == "mypkg"
+    assert result[0].conditional_extras == {"dev"}
+    assert rez_pip.utils._normalizeRequirementString.cache_info().hits == 1
+
+
+@pytest.mark.parametrize(
+    "marker,pythonVersion,expected",
+    [
+        ['python_version < "3.10"', "3.9.18", True],
+        ['python_version < "3.10"', "3.10.13", False],
+        ['python_full_version >= "3.10.10"', "3.10.13", True],
+        ['python_full_version >= "3.10.10"', "3.10.2", False],
+    ],
+)
+def test_evaluateMarker(marker: str, pythonVersion: str, expected: bool):
+    assert rez_pip.utils._evaluateMarker(marker, pythonVersion) == expected
+
+
+def test_getRezRequirements_extras(caplog: pytest.LogCaptureFixture):
+    """Test that requirements conditional on extras are skipped without warnings"""
+    requires = ["six", "pytest ; extra == 'test'", "sphinx ; extra == 'doc'"]
+    dist = unittest.mock.Mock()
+    dist.name = "mypkg"
+    wheel = rez_pip.install.WheelMetadata(
+        isPure=True,
+        hasEntryPoints=False,
+        scripts=(),
+        requires=tuple(requires),
+        requiresPython=None,
+        providesExtra="test",
+    )
+    package = rez_pip.pip.PackageInfo(
+        metadata=rez_pip.pip.Metadata(
+            name="mypkg",
+            version="1.0.0",
+            requires_dist=requires,
+            provides_extra=["test", "doc"],
+        ),
+        download_info=rez_pip.pip.DownloadInfo(
+            url="https://example.com/mypkg-1.0.0-py3-none-any.whl",
+            archive_info=rez_pip.pip.ArchiveInfo("hash", {}),
+        ),
+        is_direct=True,
+        requested=True,
+    )
+    pythonVersion = rez.version.Version("3.9.0")
+
+    with caplog.at_level(logging.WARNING, "rez_pip.utils"):
+        fromWheel = rez_pip.utils.getRezRequirements(dist, pythonVersion, wheel=wheel)
+        fromReport = rez_pip.utils.getRezRequirementsFromReport(
+            package, pythonVersion, hasEntryPoints=False
+        )
+
+    assert fromWheel.requires == ["six", "python"]
+    assert fromReport == fromWheel
+    assert not caplog.records